@@ -8,6 +8,7 @@ What it does
    - Optionally: user-entered accomplishments
 2) Appends a daily summary block to memory/YYYY-MM-DD.md
 3) Updates/creates a small overnight queue file: state/overnight_queue.json
+   (through overnight_queue_store.py, so it is safe while a build is running)
 4) Sends the summary to Telegram via the `openclaw` CLI (if available)
 
 No external deps.
@@ -30,8 +31,11 @@ import shutil
 import subprocess
 import sys
 from datetime import date, datetime
+from pathlib import Path
 from typing import Any, Optional
 
+import overnight_queue_store
+
 WORKSPACE = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
 STATE_CURRENT_WORK = os.path.join(WORKSPACE, 'state', 'current_work.json')
 STATE_OVERNIGHT_QUEUE = os.path.join(WORKSPACE, 'state', 'overnight_queue.json')
@@ -51,13 +55,6 @@ def _read_json(path: str) -> Optional[dict[str, Any]]:
     return None
 
 
-def _write_json(path: str, data: Any) -> None:
-  os.makedirs(os.path.dirname(path), exist_ok=True)
-  with open(path, 'w', encoding='utf-8') as f:
-    json.dump(data, f, indent=2, sort_keys=False)
-    f.write('\n')
-
-
 def memory_path_for_day(d: date) -> str:
   os.makedirs(MEMORY_DIR, exist_ok=True)
   return os.path.join(MEMORY_DIR, f"{d.isoformat()}.md")
@@ -124,35 +121,36 @@ def prompt_list(prompt: str) -> list[str]:
   return items
 
 
-def load_overnight_queue() -> dict[str, Any]:
-  data = _read_json(STATE_OVERNIGHT_QUEUE)
-  if data and isinstance(data, dict):
-    return data
-  # Default structure
+def _empty_overnight_queue() -> dict[str, Any]:
   return {
     'updated': None,
     'items': [],
   }
 
 
+def load_overnight_queue() -> dict[str, Any]:
+  try:
+    return overnight_queue_store.QueueStore(Path(STATE_OVERNIGHT_QUEUE)).read()
+  except RuntimeError as e:
+    # An unreadable queue must not take the rest of the review down.
+    print(f'daily_review: {e}; using an empty overnight queue', file=sys.stderr)
+    return _empty_overnight_queue()
+
+
 def update_overnight_queue(items: list[str]) -> dict[str, Any]:
-  q = load_overnight_queue()
-  cur_items = q.get('items')
-  if not isinstance(cur_items, list):
-    cur_items = []
-
-  # Append new items as simple dicts.
-  for it in items:
-    cur_items.append({
+  # Append new items as simple dicts; the store locks against a running build.
+  store = overnight_queue_store.QueueStore(Path(STATE_OVERNIGHT_QUEUE))
+  try:
+    store.enqueue({
       'text': it,
       'added': datetime.now().astimezone().isoformat(),
       'status': 'QUEUED',
-    })
-
-  q['items'] = cur_items
-  q['updated'] = datetime.now().astimezone().isoformat()
-  _write_json(STATE_OVERNIGHT_QUEUE, q)
-  return q
+    } for it in items)
+    return store.read()
+  except RuntimeError as e:
+    # Never overwrite a queue we cannot read; report what was not queued.
+    print(f'daily_review: {e}; not queued: ' + '; '.join(items), file=sys.stderr)
+    return _empty_overnight_queue()
 
 
 def get_usage_pace() -> str:
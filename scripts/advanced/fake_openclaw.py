@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+"""fake_openclaw.py — stand-in for the `openclaw` CLI when exercising overnight_builder.py.
+
+Implements just what the builder calls (`agents list`, `agents add`, `agent
+--agent A --session-id S --message M --json`) with configurable latencies, so
+turn-start overhead can be measured without real models:
+
+  - every invocation pays FAKE_OPENCLAW_CLI_MS (CLI startup)
+  - a turn on a session it has not seen pays FAKE_OPENCLAW_BOOTSTRAP_MS
+    (system prompt, workspace bootstrap); a warm session FAKE_OPENCLAW_WARM_MS
+  - FAKE_OPENCLAW_WORK_MS is the "work" itself; with FAKE_OPENCLAW_COMMIT=1 the
+    turn also commits a file named after the task id in its cwd
+
+Sessions and agents live under FAKE_OPENCLAW_STATE (default /tmp/fake_openclaw).
+The reply's usage grows with the session's context (characters / 4), so session
+recycling can be exercised too. `overnight_builder.py --bench-sessions N`
+uses this script.
+
+Usage:
+  ln -s $PWD/scripts/advanced/fake_openclaw.py /tmp/bin/openclaw
+  PATH=/tmp/bin:$PATH python3 scripts/advanced/overnight_builder.py --dry-run
+"""
+
+from __future__ import annotations
+
+import json
+import os
+import re
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+STATE = Path(os.environ.get("FAKE_OPENCLAW_STATE", "/tmp/fake_openclaw"))
+
+
+def _ms(name: str, default: float) -> float:
+    return float(os.environ.get(f"FAKE_OPENCLAW_{name}_MS", default)) / 1000.0
+
+
+def _arg(argv: list, flag: str, default: str = "") -> str:
+    return argv[argv.index(flag) + 1] if flag in argv else default
+
+
+def main(argv: list) -> int:
+    time.sleep(_ms("CLI", 250))
+    agents = STATE / "agents.json"
+    STATE.mkdir(parents=True, exist_ok=True)
+    known = json.loads(agents.read_text()) if agents.exists() else {}
+
+    if argv[:2] == ["agents", "list"]:
+        for name in ["main", *known]:
+            print(f"- {name}")
+        return 0
+    if argv[:2] == ["agents", "add"]:
+        known[argv[2]] = _arg(argv, "--model")
+        agents.write_text(json.dumps(known))
+        return 0
+    if argv[:1] != ["agent"]:
+        print(f"fake_openclaw: unsupported command {argv[:2]}", file=sys.stderr)
+        return 2
+
+    agent, session, message = _arg(argv, "--agent"), _arg(argv, "--session-id"), _arg(argv, "--message")
+    if agent not in known and agent != "main":
+        print(f"Unknown agent: {agent}", file=sys.stderr)
+        return 1
+    sess = STATE / "sessions" / (re.sub(r"[^A-Za-z0-9._-]+", "_", f"{agent}-{session}") + ".json")
+    sess.parent.mkdir(exist_ok=True)
+    warm = sess.exists()
+    ctx = json.loads(sess.read_text())["chars"] if warm else 0
+    t0 = time.perf_counter()
+    time.sleep(_ms("WARM", 30) if warm else _ms("BOOTSTRAP", 400))
+    bootstrap_ms = (time.perf_counter() - t0) * 1000
+    time.sleep(_ms("WORK", 0))
+
+    m = re.search(r"- id: (\S+)", message)
+    if os.environ.get("FAKE_OPENCLAW_COMMIT") == "1" and m:
+        Path(f"{m.group(1)}.txt").write_text(f"{agent} {session} {time.time()}\n")
+        subprocess.run(["git", "add", "-A"], capture_output=True)
+        subprocess.run(["git", "commit", "-qm", f"task {m.group(1)}"], capture_output=True)
+
+    reply = '{"success": true, "summary": "fake turn", "files_changed": [], "commits_made": [], "notes": ""}'
+    ctx += len(message) + len(reply) + (0 if warm else 20000)  # system prompt on first turn
+    sess.write_text(json.dumps({"chars": ctx}))
+    print(json.dumps({
+        "result": {"payloads": [{"text": reply}]},
+        "usage": {"total_tokens": ctx // 4},
+        "meta": {"warm": warm, "bootstrap_ms": round(bootstrap_ms, 1)},
+    }))
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main(sys.argv[1:]))
@@ -1,16 +1,85 @@
 #!/usr/bin/env python3
 """overnight_builder.py — Queue-driven overnight Codex build runner.
 
-Reads:   ~/openclaw-workspace/state/overnight_queue.json
-Writes:  ~/openclaw-workspace/state/overnight_build_results.json
+Reads:   ~/openclaw-workspace/state/overnight_queue.json (via overnight_queue_store.py)
+Writes:  ~/openclaw-workspace/state/overnight_build_results/ (see overnight_results.py)
 Reads:   ~/openclaw-workspace/state/codex_status.json
-Sends:   Telegram summary via scripts/simple_telegram_notify.py
+Sends:   Telegram digests and summary via overnight_notify.py (spooled; see below)
 
 Key constraints (hard defaults):
 - Check Codex availability before spawning.
 - Max 3 concurrent tasks.
 - 10-minute timeout per task.
 
+Each item runs in its own git worktree on a task branch (overnight/<id>), taken
+from a pool of pre-warmed worktrees under ~/.openclaw/overnight_worktrees/ that
+is kept between runs, so concurrent agents never share a working tree or index.
+Commits and changed files are computed per worktree, in a thread so the event
+loop keeps serving the other items; of what the agent left uncommitted only
+the changed, non-ignored paths are committed on the task branch. Successful branches are
+integrated into the workspace checkout one at a time (fast-forward when
+possible, else a merge); a branch that does not merge cleanly is left in place
+for review. --no-worktrees falls back to running every item in the checkout.
+
+Agent turns run as asyncio subprocesses in their own process group. Output is
+read incrementally into state/overnight_builder_logs/<id>.log (stderr keeps a
+bounded tail in memory). On timeout or cancellation the whole group gets
+SIGTERM, then SIGKILL after a short grace. Processes still left in the group
+when the agent exits (codex, git, test runners) are killed as well, and their
+count is recorded per task as `orphans`.
+
+Per-task git deltas come from GitBatch: HEAD is read from the ref files, and
+commits and changed paths are walked over one long-lived `git cat-file --batch`
+process (comparing tree ids, so unchanged subtrees are skipped). Only
+`git status` still forks, with the untracked cache (and fsmonitor on macOS)
+enabled. `--bench-git N` times this against the plain git commands.
+
+Queue items are claimed (RUNNING) before they start and removed as each one
+finishes, through overnight_queue_store's locked, write-ahead-logged updates,
+so daily_review.py can enqueue while a run is in progress. Claims left by a
+builder that died are returned to the queue at the next start.
+
+--daemon keeps the builder (and its lock) running until --until (local
+HH:MM, default 05:00): whenever a slot is free it waits for the queue file to
+change (kqueue on macOS, a --poll-seconds stat poll elsewhere) and admits new
+items by priority; with every slot busy it only wakes for completions. At the
+window end, or on SIGTERM (in either mode), it stops admitting, lets running items finish and
+writes the summary. Results are appended as each item finishes; an item
+whose run raises is recorded as failed and removed like any other.
+
+Failed agent turns are classified from stderr. Rate limits and transient
+errors (5xx, overloaded, connection resets) are retried on the same agent with
+exponential backoff and full jitter (--max-retries, --retry-base-seconds, or
+per item `max_retries`). Exhaustion (usage limit, insufficient quota), or a rate
+limit that outlasts its retries, moves the item to the next model that
+scripts/model_router.py allows, run through its own agent (overnight-<model>).
+Exhaustion switches every later item too. Codex is marked unavailable in
+codex_status.json only when the error says when it resets ("try again in
+2h", "resets at 14:00"; at most a day out), with that time as resets_at;
+otherwise only this run skips it. A run no longer aborts when Codex is unavailable at start
+if the router has another model. Each result records `model`, `retries`
+and `fallbacks`.
+
+--hedge (opt-in) starts a second attempt for an item still running past its
+predicted p90 duration (overnight_predictor.py, at least --hedge-min-samples
+similar runs, never before --hedge-min-seconds) when a slot is free that no
+queued item would take. The hedge runs in its own worktree on branch
+overnight/<id>-hedge, on the next model the router allows (else the same agent
+in a separate session). The first successful attempt is integrated; the other
+is cancelled (its process group killed) and its worktree and branch are
+discarded. Results record a `hedge` entry (winner, extra seconds and tokens)
+and --hedge-stats reports hedge and win rates over the history.
+
+Agent turns reuse warm sessions from a SessionPool (state/overnight_sessions.json)
+instead of a fresh `overnight:<id>` session per item, so the bootstrap and
+system prompt are paid once per session rather than once per item. A session
+serves one turn at a time and is retired once its context reaches
+--session-max-tokens, after a failed or cancelled turn, or after a day.
+ensure_codex_agent()'s registry check is cached for the day in
+state/overnight_agents_cache.json; an "unknown agent" error drops the cache
+entry and re-checks once. --no-session-pool restores per-item sessions, and
+--bench-sessions N measures turn-start overhead against fake_openclaw.py.
+
 This script is intended to be invoked by launchd/cron.
 
 """
@@ -19,34 +88,89 @@ from __future__ import annotations
 
 import argparse
 import asyncio
+import contextlib
+import hashlib
+import heapq
 import json
 import os
+import random
 import re
+import select
+import shutil
+import signal
 import subprocess
 import sys
+import tempfile
+import threading
 import time
-from dataclasses import dataclass
-from datetime import datetime, timezone
+import uuid
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta, timezone
 from pathlib import Path
-from typing import Any, Dict, List, Optional, Tuple
-
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+import overnight_notify
+import overnight_queue_store
+import overnight_results
+
+try:
+    import overnight_predictor
+except Exception:  # pragma: no cover
+    overnight_predictor = None  # type: ignore
+
+# model_router.py lives in scripts/, one level above scripts/advanced/.
+_SCRIPTS_DIR = str(Path(__file__).resolve().parent.parent)
+if _SCRIPTS_DIR not in sys.path:
+    sys.path.insert(0, _SCRIPTS_DIR)
+try:
+    import model_router
+except Exception as exc:  # pragma: no cover
+    print(f"overnight_builder: model_router unavailable ({exc}); no model fallback or Codex status updates", file=sys.stderr)
+    model_router = None  # type: ignore
 
 # Workspace root
 # Default: ~/.openclaw/workspace
 # Override: set OPENCLAW_WORKSPACE=/path/to/workspace
 CLAWD = Path(os.environ.get("OPENCLAW_WORKSPACE", str(Path.home() / ".openclaw" / "workspace")))
 STATE_DIR = CLAWD / "state"
-SCRIPTS_DIR = CLAWD / "scripts"
 
 QUEUE_PATH = STATE_DIR / "overnight_queue.json"
 CODEX_STATUS_PATH = STATE_DIR / "codex_status.json"
-RESULTS_PATH = STATE_DIR / "overnight_build_results.json"
+RESULTS_PATH = STATE_DIR / "overnight_build_results"
 LOCK_PATH = STATE_DIR / "overnight_builder.lock"
+# Outside the workspace checkout, so the slots never show up in its status or
+# get swept into `git add -A`. One pool per repository under it.
+WORKTREES_DIR = Path.home() / ".openclaw" / "overnight_worktrees"
+LOGS_DIR = STATE_DIR / "overnight_builder_logs"
+NOTIFY_SPOOL_DIR = STATE_DIR / "overnight_notify_spool"
+AGENTS_CACHE_PATH = STATE_DIR / "overnight_agents_cache.json"
+SESSIONS_PATH = STATE_DIR / "overnight_sessions.json"
 
 DEFAULT_AGENT_NAME = "codex"
 DEFAULT_AGENT_MODEL = "openai-codex/gpt-5.2"
 DEFAULT_MAX_CONCURRENCY = 3
 DEFAULT_TIMEOUT_S = 600
+BRANCH_PREFIX = "overnight/"
+KILL_GRACE_S = 5.0
+DEFAULT_DAEMON_UNTIL = "05:00"
+DEFAULT_MAX_RETRIES = 2
+DEFAULT_RETRY_BASE_S = 30.0
+RETRY_CAP_S = 600.0
+USAGE_CACHE_S = 600.0
+EXHAUSTED_MAX_S = 24 * 3600
+HEDGE_MIN_SAMPLES = 3
+HEDGE_MIN_AFTER_S = 60.0
+HEDGE_RECHECK_S = 15.0
+DEFAULT_POLL_S = 5.0
+DEFAULT_NOTIFY_INTERVAL_S = 1800.0
+DEFAULT_SESSION_MAX_TOKENS = 100_000
+SESSION_MAX_AGE_S = 24 * 3600
+SESSION_HANDOFF = (
+    "NEW TASK. Earlier messages in this session belong to other, finished tasks; "
+    "do not continue them. Everything you need is below.\n\n"
+)
+STREAM_CHUNK_BYTES = 64 * 1024
+STDERR_TAIL_BYTES = 64 * 1024
 
 
 _JSON_FENCE_RE = re.compile(r"^```(?:json)?\s*|\s*```$", re.IGNORECASE)
@@ -71,19 +195,412 @@ def _load_json(path: Path) -> Optional[Dict[str, Any]]:
 
 def _save_json(path: Path, data: Dict[str, Any]) -> None:
     path.parent.mkdir(parents=True, exist_ok=True)
-    path.write_text(json.dumps(data, indent=2, ensure_ascii=False) + "\n", encoding="utf-8")
+    tmp = path.with_suffix(".tmp")
+    tmp.write_text(json.dumps(data, indent=2) + "\n", encoding="utf-8")
+    os.replace(tmp, path)
 
 
-def _run(cmd: List[str], *, cwd: Optional[Path] = None, timeout_s: Optional[int] = None) -> subprocess.CompletedProcess:
+def _run(cmd: List[str], *, cwd: Optional[Path] = None, timeout_s: Optional[int] = None, input: Optional[str] = None) -> subprocess.CompletedProcess:
     return subprocess.run(
         cmd,
         cwd=str(cwd) if cwd else None,
         capture_output=True,
         text=True,
         timeout=timeout_s,
+        input=input,
+    )
+
+
+@dataclass
+class AgentProcess:
+    returncode: Optional[int]  # None when the turn was killed on timeout
+    stdout: str
+    stderr: str
+    orphans: int = 0
+
+
+async def _output(cmd: List[str], timeout_s: float = 10) -> str:
+    """stdout of a short helper command, without blocking the event loop ("" on failure)."""
+
+    try:
+        proc = await asyncio.create_subprocess_exec(*cmd, stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.DEVNULL)
+    except OSError:
+        return ""
+    try:
+        out, _ = await asyncio.wait_for(proc.communicate(), timeout=timeout_s)
+    except asyncio.TimeoutError:
+        proc.kill()
+        await proc.wait()
+        return ""
+    return out.decode("utf-8", errors="replace")
+
+
+async def _group_members(pgid: int) -> List[int]:
+    """Live pids in process group `pgid` (pgrep works on Linux and macOS)."""
+
+    if shutil.which("pgrep"):
+        pids = (await _output(["pgrep", "-g", str(pgid)])).split()
+        if not pids:
+            return []
+        # Exited-but-unreaped members (zombies) are already gone.
+        out = await _output(["ps", "-o", "pid=,stat=", "-p", ",".join(pids)])
+        return [int(f[0]) for f in (line.split() for line in out.splitlines()) if len(f) == 2 and f[0].isdigit() and not f[1].startswith("Z")]
+    try:
+        os.killpg(pgid, 0)
+    except (ProcessLookupError, PermissionError):
+        return []
+    return [-1]  # members exist, count unknown
+
+
+async def _kill_group(pgid: int) -> int:
+    """SIGTERM the group, SIGKILL whatever outlives the grace; returns how many were alive."""
+
+    alive = len(await _group_members(pgid))
+    if not alive:
+        return 0
+    for sig in (signal.SIGTERM, signal.SIGKILL):
+        try:
+            os.killpg(pgid, sig)
+        except (ProcessLookupError, PermissionError):
+            break
+        deadline = time.monotonic() + KILL_GRACE_S
+        while await _group_members(pgid) and time.monotonic() < deadline:
+            await asyncio.sleep(0.1)
+        if not await _group_members(pgid):
+            break
+    return alive
+
+
+async def _pump(stream: asyncio.StreamReader, log, keep: bytearray, limit: Optional[int]) -> None:
+    while True:
+        chunk = await stream.read(STREAM_CHUNK_BYTES)
+        if not chunk:
+            break
+        log.write(chunk)
+        log.flush()
+        keep += chunk
+        if limit is not None and len(keep) > limit:
+            del keep[: len(keep) - limit]
+
+
+async def _exited(proc: asyncio.subprocess.Process, poll_s: float = 0.2) -> int:
+    """The leader's exit status. Process.wait() would also wait for every
+    process that inherited its pipes to close them."""
+
+    while proc.returncode is None:
+        await asyncio.sleep(poll_s)
+    return proc.returncode
+
+
+async def _reap(proc: asyncio.subprocess.Process, pumps: asyncio.Future) -> Tuple[bool, int]:
+    """End an agent turn: kill its group, collect the leader, drain the pipes.
+
+    Stragglers (anything the agent started that outlived it) inherit the
+    pipes, so neither Process.wait() nor the pumps would return while they
+    run: the leader is polled instead and the final drain is bounded.
+    Returns (leader was still running, orphans besides the leader).
+    """
+
+    leader_alive = proc.returncode is None
+    stragglers = await _kill_group(proc.pid)
+    if leader_alive:
+        await _exited(proc)
+    # With the group gone the pipes close, unless something left it.
+    with contextlib.suppress(asyncio.TimeoutError):
+        await asyncio.wait_for(asyncio.shield(pumps), timeout=KILL_GRACE_S)
+    pumps.cancel()
+    return leader_alive, max(0, stragglers - (1 if leader_alive else 0))
+
+
+async def _run_agent(cmd: List[str], *, cwd: Path, timeout_s: float, log_path: Path) -> AgentProcess:
+    """Run an agent turn in its own process group, streaming output to `log_path`.
+
+    stdout is kept whole (it is the --json payload); stderr only its tail. On
+    timeout or cancellation, and for stragglers after a normal exit, the
+    whole group is terminated.
+    """
+
+    log_path.parent.mkdir(parents=True, exist_ok=True)
+    out, err = bytearray(), bytearray()
+    proc = await asyncio.create_subprocess_exec(
+        *cmd,
+        cwd=str(cwd),
+        stdout=asyncio.subprocess.PIPE,
+        stderr=asyncio.subprocess.PIPE,
+        start_new_session=True,
+    )
+    with log_path.open("ab") as log:
+        pumps = asyncio.gather(_pump(proc.stdout, log, out, None), _pump(proc.stderr, log, err, STDERR_TAIL_BYTES))
+        try:
+            await asyncio.wait_for(_exited(proc), timeout=timeout_s)
+            # Stragglers inherit the pipes; do not wait on them past a short drain.
+            await asyncio.wait_for(asyncio.shield(pumps), timeout=KILL_GRACE_S)
+        except asyncio.TimeoutError:
+            pass
+        finally:
+            # Shielded as a whole: a second cancellation must not leave the group running.
+            leader_alive, orphans = await asyncio.shield(_reap(proc, pumps))
+    return AgentProcess(
+        None if leader_alive else proc.returncode,
+        out.decode("utf-8", errors="replace"),
+        err.decode("utf-8", errors="replace"),
+        orphans,
     )
 
 
+def _window_end(until: str) -> datetime:
+    """Next local occurrence of HH:MM, as an aware datetime."""
+
+    hour, _, minute = until.partition(":")
+    now = datetime.now().astimezone()
+    end = now.replace(hour=int(hour), minute=int(minute or 0), second=0, microsecond=0)
+    if end <= now:
+        end += timedelta(days=1)
+    return end
+
+
+class QueueWatcher:
+    """Wakes the daemon when the queue file changes.
+
+    Uses kqueue on the queue's directory where available (macOS/BSD: the
+    store commits by renaming into it), otherwise a stat poll. changed()
+    compares (inode, mtime, size), so unrelated directory writes are ignored.
+    """
+
+    def __init__(self, path: Path, poll_s: float) -> None:
+        self.path = path
+        self.poll_s = max(0.5, poll_s)
+        self.sig: Optional[Tuple[int, int, int]] = None
+        self.kq = None
+        self.dir_fd: Optional[int] = None
+        if hasattr(select, "kqueue"):
+            try:
+                path.parent.mkdir(parents=True, exist_ok=True)
+                self.dir_fd = os.open(str(path.parent), os.O_RDONLY)
+                self.kq = select.kqueue()
+                self.kq.control(
+                    [select.kevent(self.dir_fd, filter=select.KQ_FILTER_VNODE, flags=select.KQ_EV_ADD | select.KQ_EV_CLEAR, fflags=select.KQ_NOTE_WRITE)],
+                    0,
+                )
+            except OSError:
+                self.close()
+
+    def close(self) -> None:
+        if self.kq is not None:
+            self.kq.close()
+            self.kq = None
+        if self.dir_fd is not None:
+            os.close(self.dir_fd)
+            self.dir_fd = None
+
+    def changed(self) -> bool:
+        try:
+            st = self.path.stat()
+            sig = (st.st_ino, st.st_mtime_ns, st.st_size)
+        except FileNotFoundError:
+            sig = (0, 0, 0)
+        if sig == self.sig:
+            return False
+        self.sig = sig
+        return True
+
+    async def wait(self, timeout: Optional[float]) -> None:
+        if self.kq is None:
+            await asyncio.sleep(self.poll_s if timeout is None else max(0.0, min(self.poll_s, timeout)))
+            return
+        loop = asyncio.get_running_loop()
+        ready = loop.create_future()
+        loop.add_reader(self.kq.fileno(), lambda: ready.done() or ready.set_result(None))
+        try:
+            await asyncio.wait_for(ready, timeout)
+        except asyncio.TimeoutError:
+            pass
+        finally:
+            loop.remove_reader(self.kq.fileno())
+            if ready.done():
+                self.kq.control(None, 16, 0)
+
+
+_RATE_LIMIT_RE = re.compile(r"rate[ _-]?limit|too many requests|\b429\b|retry[- ]after", re.IGNORECASE)
+_EXHAUSTED_RE = re.compile(r"usage limit|quota|exhausted|insufficient[_ ]credit|out of credits", re.IGNORECASE)
+_RESETS_IN_RE = re.compile(r"(?:try again|retry|resets?) in\s+((?:\d+(?:\.\d+)?\s*[dhms][a-z]*[\s,]*(?:and\s+)?)+)", re.IGNORECASE)
+_RESETS_AT_RE = re.compile(
+    r"resets? (?:at|on)\s+(\d{4}-\d{2}-\d{2}[T ]\d{1,2}:\d{2}(?::\d{2}(?:\.\d+)?)?(?:Z|[+-]\d{2}:?\d{2})?|\d{1,2}:\d{2}\s*(?:[ap]\.?m\.?)?)",
+    re.IGNORECASE,
+)
+_UNIT_S = {"d": 86400, "h": 3600, "m": 60, "s": 1}
+_TRANSIENT_RE = re.compile(
+    r"\b50[234]\b|overloaded|temporarily unavailable|econnreset|connection (?:reset|refused|aborted)|network error|socket hang up",
+    re.IGNORECASE,
+)
+
+
+_NO_AGENT_RE = re.compile(r"unknown agent|agent .{0,40}not found|no such agent", re.IGNORECASE)
+
+
+def classify_error(text: str) -> Optional[str]:
+    """no_agent | exhausted | rate_limit | transient for retryable agent failures, else None."""
+
+    if _NO_AGENT_RE.search(text):
+        return "no_agent"
+    # "Rate limit ... quota" is a rate limit; retrying it is cheap.
+    if _RATE_LIMIT_RE.search(text):
+        return "rate_limit"
+    if _EXHAUSTED_RE.search(text):
+        return "exhausted"
+    if _TRANSIENT_RE.search(text):
+        return "transient"
+    return None
+
+
+def exhausted_until(text: str, now: Optional[datetime] = None) -> Optional[datetime]:
+    """When an exhaustion error says the model comes back (local time, at most a day out), else None."""
+
+    now = now or datetime.now()
+    until: Optional[datetime] = None
+    m = _RESETS_IN_RE.search(text)
+    if m:
+        secs = sum(float(n) * _UNIT_S[u[0].lower()] for n, u in re.findall(r"(\d+(?:\.\d+)?)\s*([dhms][a-z]*)", m.group(1)))
+        if secs > 0:
+            until = now + timedelta(seconds=secs)
+    m = None if until else _RESETS_AT_RE.search(text)
+    if m:
+        raw = m.group(1).strip()
+        try:
+            if "-" in raw[:5]:
+                at = datetime.fromisoformat(raw.replace("Z", "+00:00").replace(" ", "T"))
+                until = at.astimezone().replace(tzinfo=None) if at.tzinfo else at
+            else:
+                hm = re.match(r"(\d{1,2}):(\d{2})\s*([ap])?", raw, re.IGNORECASE)
+                hour, minute = int(hm.group(1)), int(hm.group(2))
+                if hm.group(3):
+                    hour = hour % 12 + (12 if hm.group(3).lower() == "p" else 0)
+                until = now.replace(hour=hour, minute=minute, second=0, microsecond=0)
+                if until <= now:
+                    until += timedelta(days=1)
+        except ValueError:
+            until = None
+    if until is None or until <= now:
+        return None
+    return min(until, now + timedelta(seconds=EXHAUSTED_MAX_S))
+
+
+@dataclass
+class RetryPolicy:
+    max_retries: int = DEFAULT_MAX_RETRIES
+    base_s: float = DEFAULT_RETRY_BASE_S
+    cap_s: float = RETRY_CAP_S
+
+    def delay(self, attempt: int) -> float:
+        """Full-jitter exponential backoff for retry number `attempt` (0-based)."""
+
+        return random.uniform(0, min(self.cap_s, self.base_s * (2 ** attempt)))
+
+
+class ModelRoute:
+    """Which agent and model new attempts use, falling back via model_router.
+
+    Starts on the configured agent/model. A model that reports exhaustion is
+    dropped for the rest of the run (for every item); Codex is also marked
+    unavailable in codex_status.json, but only when the error says when it
+    resets. An item whose model keeps rate-limiting moves on by itself.
+    Fallback agents are created on first use like the Codex one. Usage comes
+    from model_router.get_usage_json() (a subprocess), which refresh_usage()
+    runs in a thread; the sync paths only read the cached value.
+    """
+
+    def __init__(self, agent_name: str, model: str, workspace: Path, enabled: bool = True) -> None:
+        self.base_agent = agent_name
+        self.base_model = model
+        self.workspace = workspace
+        self.enabled = enabled and model_router is not None
+        self.exhausted: set = set()
+        self.ready: set = {self.key(model)}
+        self._usage: Tuple[float, float] = (0.0, 0.0)
+        self._refreshing: Optional[asyncio.Future] = None
+        self.lock = asyncio.Lock()
+
+    def key(self, model: str) -> str:
+        models = getattr(model_router, "MODELS", {}) if model_router is not None else {}
+        return next((k for k, v in models.items() if v == model), model)
+
+    def agent_for(self, key: str) -> Tuple[str, str]:
+        if key == self.key(self.base_model):
+            return self.base_agent, self.base_model
+        return f"overnight-{key}", model_router.MODELS[key]
+
+    def _stale(self) -> bool:
+        at = self._usage[0]
+        return not at or time.monotonic() - at > USAGE_CACHE_S
+
+    def _start_refresh(self) -> asyncio.Future:
+        if self._refreshing is None or self._refreshing.done():
+            self._refreshing = asyncio.ensure_future(asyncio.to_thread(model_router.get_usage_json))
+            self._refreshing.add_done_callback(self._store_usage)
+        return self._refreshing
+
+    def _store_usage(self, fut: asyncio.Future) -> None:
+        usage = fut.result() if not fut.cancelled() and fut.exception() is None else {}
+        pct = float(((usage.get("models") or {}).get("claude") or {}).get("context_pct") or 0) if isinstance(usage, dict) else 0.0
+        self._usage = (time.monotonic(), pct)
+
+    async def refresh_usage(self) -> None:
+        """Re-read router usage if the cached value is stale, off the event loop."""
+
+        if self.enabled and self._stale():
+            with contextlib.suppress(Exception):
+                await asyncio.shield(self._start_refresh())
+
+    def _usage_pct(self) -> float:
+        if self._stale():
+            # Refresh in the background; until it lands, use the last value.
+            with contextlib.suppress(RuntimeError):
+                asyncio.get_running_loop()
+                self._start_refresh()
+        return self._usage[1]
+
+    def candidates(self, tried: Iterable[str] = ()) -> List[str]:
+        """Usable model keys in router order, minus exhausted and `tried`."""
+
+        base = self.key(self.base_model)
+        if not self.enabled:
+            return [] if base in self.exhausted or base in tried else [base]
+        allowed = list(model_router.allowed_models(self._usage_pct()))
+        skip = set(self.exhausted) | set(tried)
+        return [k for k in allowed if k in model_router.MODELS and k not in skip]
+
+    def start_key(self) -> Optional[str]:
+        base = self.key(self.base_model)
+        if base == "codex" and not codex_available():
+            self.exhausted.add(base)
+        if base not in self.exhausted:
+            return base
+        fallback = self.candidates()
+        return fallback[0] if fallback else None
+
+    def mark_exhausted(self, key: str, reason: str) -> None:
+        if key in self.exhausted:
+            return
+        self.exhausted.add(key)
+        until = exhausted_until(reason)
+        # Without a reset time, a persisted flag would keep Codex off until
+        # someone clears it by hand; the in-memory mark covers this run.
+        if key == "codex" and model_router is not None and until is not None:
+            model_router.set_codex_status(False, resets_at=until.isoformat(timespec="seconds"), reason=f"overnight_builder: {reason[:200]}")
+
+    async def ensure(self, key: str, recheck: bool = False) -> Tuple[str, str]:
+        agent, model = self.agent_for(key)
+        async with self.lock:
+            if recheck:
+                # The cached registry check was stale (agent deleted since).
+                await asyncio.to_thread(forget_agent, agent)
+                self.ready.discard(key)
+            if key not in self.ready:
+                await asyncio.to_thread(ensure_codex_agent, agent_name=agent, model=model, workspace=self.workspace)
+                self.ready.add(key)
+        return agent, model
+
+
 def _acquire_lock() -> Optional[int]:
     """Returns file descriptor if lock acquired, else None."""
     import fcntl
@@ -111,6 +628,17 @@ def _release_lock(fd: int) -> None:
         os.close(fd)
 
 
+def _reset_passed(resets_at: Any) -> bool:
+    """Whether `resets_at` (ISO, with or without an offset; naive means local time) is past."""
+
+    try:
+        at = datetime.fromisoformat(str(resets_at).replace("Z", "+00:00"))
+        # astimezone() reads a naive value as local time.
+        return datetime.now(timezone.utc) >= at.astimezone(timezone.utc)
+    except (ValueError, TypeError, OverflowError):
+        return False
+
+
 def codex_available() -> bool:
     state = _load_json(CODEX_STATUS_PATH)
     if not state:
@@ -119,7 +647,8 @@ def codex_available() -> bool:
     if state.get("exhausted") is True:
         return False
     if state.get("available") is False:
-        return False
+        # model_router clears the flag itself once resets_at has passed.
+        return bool(state.get("resets_at")) and _reset_passed(state["resets_at"])
 
     # If neither field exists, fail closed.
     if "available" not in state and "exhausted" not in state:
@@ -128,17 +657,48 @@ def codex_available() -> bool:
     return True
 
 
-def ensure_codex_agent(*, agent_name: str, model: str, workspace: Path) -> None:
+def _agent_cache_key(agent_name: str, model: str, workspace: Path) -> str:
+    return f"{agent_name}|{model}|{workspace}"
+
+
+def forget_agent(agent_name: str, cache_path: Path = AGENTS_CACHE_PATH) -> None:
+    """Drop cached registry checks for `agent_name` (e.g. after "unknown agent")."""
+
+    cache = _load_json(cache_path) or {}
+    agents = cache.get("agents") or {}
+    keep = {k: v for k, v in agents.items() if k.split("|", 1)[0] != agent_name}
+    if keep != agents:
+        _save_json(cache_path, {**cache, "agents": keep})
+
+
+def ensure_codex_agent(*, agent_name: str, model: str, workspace: Path, cache_path: Optional[Path] = AGENTS_CACHE_PATH) -> None:
     """Ensure an OpenClaw isolated agent exists for Codex runs.
 
     We use an isolated agent so the session can be separated logically, while
     still pointing at the same workspace so file edits land in ~/openclaw-workspace.
+
+    A successful check is cached in `cache_path` for the rest of the (local)
+    day, so later runs skip `openclaw agents list`; pass None to always check.
     """
+    today = datetime.now().date().isoformat()
+    key = _agent_cache_key(agent_name, model, workspace)
+    cache = (_load_json(cache_path) if cache_path is not None else None) or {}
+    if cache.get("day") != today:
+        cache = {"day": today, "agents": {}}
+    if key in (cache.get("agents") or {}):
+        return
+
+    def remember() -> None:
+        if cache_path is not None:
+            cache["agents"][key] = _iso(_utc_now())
+            _save_json(cache_path, cache)
+
     p = _run(["openclaw", "agents", "list"], timeout_s=30)
     if p.returncode != 0:
         raise RuntimeError(p.stderr.strip() or "openclaw agents list failed")
 
     if re.search(rf"^- {re.escape(agent_name)}\b", p.stdout, re.MULTILINE):
+        remember()
         return
 
     add_cmd = [
@@ -155,6 +715,54 @@ def ensure_codex_agent(*, agent_name: str, model: str, workspace: Path) -> None:
     p2 = _run(add_cmd, timeout_s=60)
     if p2.returncode != 0:
         raise RuntimeError(p2.stderr.strip() or p2.stdout.strip() or f"Failed to create agent '{agent_name}'")
+    remember()
+
+
+class SessionPool:
+    """Warm OpenClaw sessions per agent, reused across items and runs.
+
+    A session serves one turn at a time. Its context size is tracked from the
+    turn's reported usage (which includes the session history), or estimated
+    from message sizes when there is none. A session is retired once that
+    passes max_context_tokens, after a turn that failed or was cancelled, and
+    after SESSION_MAX_AGE_S; the next acquire then starts a fresh one.
+    State lives in `path` so later runs (and the daemon) start warm.
+    """
+
+    def __init__(self, path: Path = SESSIONS_PATH, max_context_tokens: int = DEFAULT_SESSION_MAX_TOKENS) -> None:
+        self.path = path
+        self.max_context_tokens = max_context_tokens
+        now = time.time()
+        data = _load_json(path) or {}
+        self.sessions: List[Dict[str, Any]] = [
+            s for s in (data.get("sessions") or []) if isinstance(s, dict) and now - float(s.get("created") or 0) < SESSION_MAX_AGE_S
+        ]
+        self.busy: set = set()
+        self.stats = {"warm": 0, "fresh": 0, "retired": 0}
+
+    def _save(self) -> None:
+        _save_json(self.path, {"sessions": self.sessions})
+
+    def acquire(self, agent: str) -> Dict[str, Any]:
+        idle = [s for s in self.sessions if s["agent"] == agent and s["id"] not in self.busy]
+        if idle:
+            sess = max(idle, key=lambda s: s["turns"])
+            self.stats["warm"] += 1
+        else:
+            sess = {"id": f"overnight:{agent}:{uuid.uuid4().hex[:8]}", "agent": agent, "created": time.time(), "turns": 0, "context": 0}
+            self.sessions.append(sess)
+            self.stats["fresh"] += 1
+        self.busy.add(sess["id"])
+        return sess
+
+    def release(self, sess: Dict[str, Any], *, ok: bool, tokens: Optional[int], chars: int) -> None:
+        self.busy.discard(sess["id"])
+        sess["turns"] += 1
+        sess["context"] = tokens if tokens else sess["context"] + chars // 4
+        if not ok or sess["context"] >= self.max_context_tokens:
+            self.sessions = [s for s in self.sessions if s is not sess]
+            self.stats["retired"] += 1
+        self._save()
 
 
 def _git_head(repo: Path) -> str:
@@ -197,6 +805,491 @@ def _git_uncommitted_files(repo: Path) -> List[str]:
     return sorted(set(files))
 
 
+class GitBatch:
+    """Cheap repeated git queries for one repository and its worktrees.
+
+    Refs are read from files (loose, then packed-refs); objects come from a
+    persistent `git cat-file --batch`. Anything unusual (reftable, a missing
+    object, a deep history walk) falls back to the plain git commands above.
+    """
+
+    MAX_WALK = 2000
+    SLOP = 5  # git's revision.c SLOP
+
+    def __init__(self, repo: Path) -> None:
+        self.repo = repo
+        self.proc: Optional[subprocess.Popen] = None
+        self.lock = threading.Lock()
+        self.forks = 0
+        self._abbrev: Optional[int] = None
+
+    def close(self) -> None:
+        if self.proc is not None:
+            self.proc.stdin.close()
+            self.proc.wait(timeout=10)
+            self.proc = None
+
+    def _read(self, sha: str) -> Tuple[str, bytes]:
+        with self.lock:
+            if self.proc is None or self.proc.poll() is not None:
+                self.forks += 1
+                self.proc = subprocess.Popen(
+                    ["git", "cat-file", "--batch"], cwd=str(self.repo), stdin=subprocess.PIPE, stdout=subprocess.PIPE
+                )
+            self.proc.stdin.write(sha.encode("ascii") + b"\n")
+            self.proc.stdin.flush()
+            header = self.proc.stdout.readline().split()
+            if len(header) != 3:
+                raise KeyError(sha)
+            body = self.proc.stdout.read(int(header[2]) + 1)[:-1]
+            return header[1].decode("ascii"), body
+
+    def _dirs(self, path: Path) -> Tuple[Path, Path]:
+        """(per-worktree git dir, common git dir) for a checkout."""
+
+        dotgit = path / ".git"
+        gitdir = dotgit
+        if dotgit.is_file():
+            gitdir = Path(dotgit.read_text(encoding="utf-8").split(":", 1)[1].strip())
+            if not gitdir.is_absolute():
+                gitdir = (path / gitdir).resolve()
+        common = gitdir
+        if (gitdir / "commondir").exists():
+            common = (gitdir / (gitdir / "commondir").read_text(encoding="utf-8").strip()).resolve()
+        return gitdir, common
+
+    def head(self, path: Optional[Path] = None) -> str:
+        path = path or self.repo
+        try:
+            gitdir, common = self._dirs(path)
+            if (common / "reftable").exists():
+                raise ValueError("reftable")
+            ref = (gitdir / "HEAD").read_text(encoding="utf-8").strip()
+            for _ in range(5):
+                if not ref.startswith("ref: "):
+                    if re.fullmatch(r"[0-9a-f]{40}|[0-9a-f]{64}", ref):
+                        return ref
+                    break
+                name = ref[5:].strip()
+                loose = common / name
+                if loose.exists():
+                    ref = loose.read_text(encoding="utf-8").strip()
+                    continue
+                packed = common / "packed-refs"
+                found = None
+                if packed.exists():
+                    for line in packed.read_text(encoding="utf-8").splitlines():
+                        parts = line.split()
+                        if len(parts) == 2 and parts[1] == name:
+                            found = parts[0]
+                            break
+                if found is None:
+                    break
+                ref = found
+        except (OSError, IndexError, ValueError):
+            pass
+        self.forks += 1
+        return _git_head(path)
+
+    def _commit(self, sha: str) -> Tuple[str, List[str], int, str]:
+        """(tree, parents, committer time, subject) of a commit."""
+
+        kind, body = self._read(sha)
+        if kind != "commit":
+            raise KeyError(sha)
+        headers, _, message = body.partition(b"\n\n")
+        tree, parents, when = "", [], 0
+        for line in headers.split(b"\n"):
+            if line.startswith(b"tree "):
+                tree = line[5:].decode("ascii")
+            elif line.startswith(b"parent "):
+                parents.append(line[7:].decode("ascii"))
+            elif line.startswith(b"committer "):
+                when = int(line.rsplit(b" ", 2)[1])
+        subject = message.decode("utf-8", errors="replace").strip().split("\n", 1)[0]
+        return tree, parents, when, subject
+
+    def _tree(self, sha: str) -> Dict[str, Tuple[str, str]]:
+        """name -> (mode, sha) for a tree object."""
+
+        kind, body = self._read(sha)
+        if kind != "tree":
+            raise KeyError(sha)
+        width = len(sha) // 2
+        out: Dict[str, Tuple[str, str]] = {}
+        i = 0
+        while i < len(body):
+            sp = body.index(b" ", i)
+            nul = body.index(b"\0", sp)
+            out[body[sp + 1 : nul].decode("utf-8", errors="surrogateescape")] = (body[i:sp].decode("ascii"), body[nul + 1 : nul + 1 + width].hex())
+            i = nul + 1 + width
+        return out
+
+    def abbrev(self) -> int:
+        if self._abbrev is None:
+            self.forks += 1
+            p = _run(["git", "rev-parse", "--short", "HEAD"], cwd=self.repo, timeout_s=10)
+            self._abbrev = len(p.stdout.strip()) if p.returncode == 0 and p.stdout.strip() else 7
+        return self._abbrev
+
+    def commits_between(self, a: str, b: str) -> List[str]:
+        """`git log --oneline a..b`: commits reachable from b but not from a, newest first."""
+
+        if a == b:
+            return []
+        try:
+            # Date-ordered walk from both ends, mirroring git's limit_list():
+            # once every queued commit is reachable from `a` and none is newer
+            # than the last shown one, it still takes SLOP more steps, which
+            # is what lets git (and us) see through moderate clock skew.
+            info: Dict[str, Tuple[str, List[str], int, str]] = {}
+            hidden: set = set()
+            queue: List[Tuple[int, int, str]] = []
+            order: List[str] = []
+            slop = self.SLOP
+            last_shown: Optional[int] = None
+
+            def hide(sha: str) -> None:
+                # Like git, this also marks parents not read yet, so a later
+                # visit from `b` finds them already hidden.
+                hidden.add(sha)
+                stack = list(info[sha][1])
+                while stack:
+                    cur = stack.pop()
+                    if cur not in hidden:
+                        hidden.add(cur)
+                        if cur in info:
+                            stack.extend(info[cur][1])
+
+            def push(sha: str, from_a: bool) -> None:
+                if sha not in info:
+                    info[sha] = self._commit(sha)
+                    heapq.heappush(queue, (-info[sha][2], len(info), sha))
+                if from_a:
+                    hide(sha)
+
+            push(a, True)
+            push(b, False)
+            while queue:
+                if len(info) > self.MAX_WALK:
+                    raise KeyError("walk too deep")
+                _, _, sha = heapq.heappop(queue)
+                for parent in info[sha][1]:
+                    push(parent, sha in hidden)
+                if sha not in hidden:
+                    last_shown = info[sha][2]
+                    order.append(sha)
+                    continue
+                if not queue:
+                    break
+                if (last_shown is not None and last_shown <= -queue[0][0]) or any(s not in hidden for _, _, s in queue):
+                    slop = self.SLOP
+                else:
+                    slop -= 1
+                    if not slop:
+                        break
+            n = self.abbrev()
+            return [f"{s[:n]} {info[s][3]}".strip() for s in order if s not in hidden]
+        except (KeyError, ValueError, OSError):
+            self.forks += 1
+            return _git_commits_between(self.repo, a, b)
+
+    def files_between(self, a: str, b: str) -> List[str]:
+        """Paths whose blobs differ between the trees of commits a and b."""
+
+        if a == b:
+            return []
+        out: List[str] = []
+
+        def walk(t1: Optional[str], t2: Optional[str], prefix: str) -> None:
+            if t1 == t2:
+                return
+            e1 = self._tree(t1) if t1 else {}
+            e2 = self._tree(t2) if t2 else {}
+            for name in sorted(set(e1) | set(e2)):
+                m1, s1 = e1.get(name, ("", None))
+                m2, s2 = e2.get(name, ("", None))
+                if (m1, s1) == (m2, s2):
+                    continue
+                d1, d2 = m1 == "40000", m2 == "40000"
+                if d1 or d2:
+                    walk(s1 if d1 else None, s2 if d2 else None, f"{prefix}{name}/")
+                if (s1 and not d1) or (s2 and not d2):
+                    out.append(prefix + name)
+
+        try:
+            walk(self._commit(a)[0], self._commit(b)[0], "")
+        except (KeyError, ValueError, OSError):
+            self.forks += 1
+            return _git_files_between(self.repo, a, b)
+        return out
+
+    def uncommitted_files(self, path: Optional[Path] = None) -> List[str]:
+        cmd = ["git", "-c", "core.untrackedCache=true"]
+        if sys.platform in ("darwin", "win32"):
+            cmd += ["-c", "core.fsmonitor=true"]
+        self.forks += 1
+        p = _run(cmd + ["status", "--porcelain", "-z"], cwd=path or self.repo, timeout_s=20)
+        if p.returncode != 0:
+            return []
+        files: List[str] = []
+        entries = p.stdout.split("\0")
+        i = 0
+        while i < len(entries):
+            entry = entries[i]
+            i += 1
+            if len(entry) < 4:
+                continue
+            files.append(entry[3:])
+            if entry[0] in "RC":
+                i += 1  # the rename/copy source follows
+        return sorted(set(files))
+
+
+def _bench_git(repo: Path, iterations: int) -> int:
+    """Per-task git delta cost: plain commands vs GitBatch, on `repo`."""
+
+    base = _run(["git", "rev-parse", "HEAD~1"], cwd=repo, timeout_s=10).stdout.strip() or _git_head(repo)
+
+    def legacy() -> None:
+        start = _git_head(repo)
+        end = _git_head(repo)
+        _git_commits_between(repo, base, end)
+        _git_files_between(repo, base, end)
+        _git_uncommitted_files(repo)
+        assert start == end
+
+    git = GitBatch(repo)
+
+    def batched() -> None:
+        start = git.head()
+        end = git.head()
+        git.commits_between(base, end)
+        git.files_between(base, end)
+        git.uncommitted_files()
+        assert start == end
+
+    legacy_commits, legacy_files = _git_commits_between(repo, base, _git_head(repo)), _git_files_between(repo, base, _git_head(repo))
+    batched()
+    if git.commits_between(base, git.head()) != legacy_commits or sorted(git.files_between(base, git.head())) != sorted(legacy_files):
+        print("warning: GitBatch deltas differ from git log/diff on this repo", file=sys.stderr)
+    git.forks = 0
+    print(f"{repo} — HEAD~1..HEAD: {len(legacy_commits)} commit(s), {len(legacy_files)} file(s); {iterations} iterations")
+    for name, fn, forks in (("git commands", legacy, 5), ("GitBatch", batched, None)):
+        t0 = time.perf_counter()
+        for _ in range(iterations):
+            fn()
+        per_task = (time.perf_counter() - t0) / iterations * 1000
+        n = forks if forks is not None else git.forks / iterations
+        print(f"  {name:13} {per_task:8.2f} ms/task  {n:.1f} forks/task")
+    git.close()
+    return 0
+
+
+async def _bench_sessions(turns: int, max_context_tokens: int) -> int:
+    """Turn-start overhead with fake_openclaw.py: per-item sessions vs SessionPool.
+
+    Each turn is the registry check plus one agent turn (no work), as the
+    builder runs them; the stub reports how much of the turn was session
+    bootstrap. Latencies come from the FAKE_OPENCLAW_*_MS variables.
+    """
+
+    fake = Path(__file__).resolve().with_name("fake_openclaw.py")
+    if not fake.exists():
+        print(f"{fake} not found", file=sys.stderr)
+        return 1
+    with tempfile.TemporaryDirectory(prefix="overnight-bench-") as tmp:
+        root = Path(tmp)
+        (root / "bin").mkdir()
+        shim = root / "bin" / "openclaw"
+        shim.write_text(f'#!/bin/sh\nexec "{sys.executable}" "{fake}" "$@"\n')
+        shim.chmod(0o755)
+        os.environ["PATH"] = f"{root / 'bin'}{os.pathsep}{os.environ.get('PATH', '')}"
+        os.environ["FAKE_OPENCLAW_STATE"] = str(root / "fake")
+        workspace = root / "ws"
+        workspace.mkdir()
+        prompt = _build_prompt({"id": "bench", "type": "bench", "spec": "x" * 2000})
+
+        async def one(i: int, cache: Optional[Path], pool: Optional[SessionPool]) -> Tuple[float, float, float]:
+            t0 = time.perf_counter()
+            await asyncio.to_thread(ensure_codex_agent, agent_name="bench", model=DEFAULT_AGENT_MODEL, workspace=workspace, cache_path=cache)
+            t1 = time.perf_counter()
+            sess = pool.acquire("bench") if pool is not None else {"id": f"overnight:bench-{i}", "turns": 0}
+            message = SESSION_HANDOFF + prompt if sess["turns"] else prompt
+            cmd = ["openclaw", "agent", "--agent", "bench", "--session-id", sess["id"], "--message", message, "--json"]
+            proc = await _run_agent(cmd, cwd=workspace, timeout_s=60, log_path=root / "bench.log")
+            payload = json.loads(proc.stdout)
+            if pool is not None:
+                pool.release(sess, ok=proc.returncode == 0, tokens=overnight_predictor.extract_usage_tokens(payload) if overnight_predictor else None, chars=len(message))
+            return t1 - t0, time.perf_counter() - t1, float(payload["meta"]["bootstrap_ms"]) / 1000
+
+        print(f"fake_openclaw, {turns} turns (CLI {os.environ.get('FAKE_OPENCLAW_CLI_MS', 250)} ms, bootstrap {os.environ.get('FAKE_OPENCLAW_BOOTSTRAP_MS', 400)} ms, warm {os.environ.get('FAKE_OPENCLAW_WARM_MS', 30)} ms)")
+        for name, cache, pool in (
+            ("per-item", None, None),
+            ("pooled", root / "agents_cache.json", SessionPool(root / "sessions.json", max_context_tokens=max_context_tokens)),
+        ):
+            samples = [await one(i, cache, pool) for i in range(turns)]
+            reg, turn, boot = (sum(x) / turns * 1000 for x in zip(*samples))
+            extra = f"  ({pool.stats['fresh']} fresh, {pool.stats['retired']} retired)" if pool is not None else ""
+            print(f"  {name:9} registry {reg:7.1f} ms  turn {turn:7.1f} ms  (bootstrap {boot:6.1f} ms)  total {reg + turn:7.1f} ms/turn{extra}")
+    return 0
+
+
+def _committable(repo: Path, files: List[str]) -> List[str]:
+    """The paths of `files` that may be committed: inside `repo` and not ignored."""
+
+    root = os.path.normpath(str(repo))
+    inside = [f for f in files if f and not os.path.isabs(f) and os.path.normpath(os.path.join(root, f)).startswith(root + os.sep)]
+    if not inside:
+        return []
+    # Tracked paths are never reported as ignored, so modified files stay in.
+    p = _run(["git", "check-ignore", "-z", "--stdin"], cwd=repo, timeout_s=30, input="\0".join(inside) + "\0")
+    ignored = set(p.stdout.split("\0")) if p.returncode == 0 else set()
+    return [f for f in inside if f not in ignored and f.rstrip("/") not in ignored]
+
+
+def _git_commit_leftovers(repo: Path, message: str, files: Optional[List[str]] = None) -> Optional[str]:
+    """Commit what the agent left uncommitted so it survives worktree reuse.
+
+    Only `files` (the uncommitted paths found after the turn) are staged, minus
+    ignored paths and anything outside `repo`; other untracked files stay out
+    of the task branch. Hooks run as for any other commit; returns their (or
+    git's) error if the commit was refused, else None.
+    """
+
+    paths = _committable(repo, files if files is not None else _git_uncommitted_files(repo))
+    if not paths:
+        return None
+    p = _run(["git", "add", "-A", "--pathspec-from-file=-", "--pathspec-file-nul"], cwd=repo, timeout_s=60, input="\0".join(paths) + "\0")
+    if p.returncode != 0:
+        return (p.stderr.strip() or "git add failed")[-500:]
+    p = _run(["git", "commit", "-q", "-m", message], cwd=repo, timeout_s=120)
+    if p.returncode != 0:
+        return (p.stderr.strip() or p.stdout.strip() or "git commit failed")[-500:]
+    return None
+
+
+def _branch_name(item_id: str) -> str:
+    return BRANCH_PREFIX + (re.sub(r"[^A-Za-z0-9._-]+", "-", item_id).strip("-.") or "item")
+
+
+class WorktreePool:
+    """Reusable detached worktrees of `repo`, one checked out per running item.
+
+    Slots live under `root` (by default a per-repository directory under
+    WORKTREES_DIR, outside the checkout) and survive between runs, so
+    acquiring one is a checkout of the few files that changed since last
+    night rather than a full clone. Integration into `repo` is serialized by
+    `lock`.
+    """
+
+    def __init__(self, repo: Path, root: Optional[Path] = None) -> None:
+        self.repo = repo
+        if root is None:
+            digest = hashlib.sha1(str(repo.resolve()).encode("utf-8")).hexdigest()[:8]
+            root = WORKTREES_DIR / f"{repo.resolve().name}-{digest}"
+        self.root = root
+        self.free: List[Path] = []
+        self.lock = asyncio.Lock()
+
+    def _exclude_root(self) -> None:
+        """Keep a pool placed inside the checkout out of `git status` / `git add -A`."""
+
+        try:
+            rel = self.root.resolve().relative_to(self.repo.resolve())
+        except ValueError:
+            return
+        p = _run(["git", "rev-parse", "--git-path", "info/exclude"], cwd=self.repo, timeout_s=30)
+        if p.returncode != 0:
+            return
+        exclude = Path(p.stdout.strip())
+        exclude = exclude if exclude.is_absolute() else self.repo / exclude
+        line = f"/{rel.as_posix()}/"
+        current = exclude.read_text(encoding="utf-8") if exclude.exists() else ""
+        if line not in current.splitlines():
+            exclude.parent.mkdir(parents=True, exist_ok=True)
+            with exclude.open("a", encoding="utf-8") as f:
+                f.write(("" if not current or current.endswith("\n") else "\n") + line + "\n")
+
+    def _add(self, path: Path) -> None:
+        if (path / ".git").exists():
+            return
+        _run(["git", "worktree", "prune"], cwd=self.repo, timeout_s=30)
+        p = _run(["git", "worktree", "add", "--detach", str(path), "HEAD"], cwd=self.repo, timeout_s=120)
+        if p.returncode != 0:
+            raise RuntimeError(p.stderr.strip() or f"git worktree add {path} failed")
+
+    def prewarm(self, size: int) -> None:
+        self.root.mkdir(parents=True, exist_ok=True)
+        self._exclude_root()
+        for i in range(size):
+            path = self.root / f"slot-{i}"
+            self._add(path)
+            self.free.append(path)
+
+    def _unused_branch(self, branch: str) -> str:
+        """`branch`, or `branch-2`, `branch-3`, ... if it already exists.
+
+        An existing branch is a conflicted or failed item left for review;
+        it is never reset.
+        """
+
+        name, n = branch, 1
+        while _run(["git", "rev-parse", "--verify", "-q", f"refs/heads/{name}"], cwd=self.repo, timeout_s=30).returncode == 0:
+            n += 1
+            name = f"{branch}-{n}"
+        return name
+
+    def acquire(self, branch: str, base: str) -> Tuple[Path, str]:
+        """Check out a new branch at `base` in a free slot; returns (slot, branch name used)."""
+
+        if not self.free:
+            self.root.mkdir(parents=True, exist_ok=True)
+            path = self.root / f"slot-{len(list(self.root.glob('slot-*')))}"
+            self._add(path)
+            self.free.append(path)
+        path = self.free.pop()
+        branch = self._unused_branch(branch)
+        for cmd in (
+            ["git", "reset", "-q", "--hard"],
+            ["git", "clean", "-qfd"],
+            ["git", "checkout", "-q", "-b", branch, base],
+        ):
+            p = _run(cmd, cwd=path, timeout_s=120)
+            if p.returncode != 0:
+                self.free.append(path)
+                raise RuntimeError(p.stderr.strip() or f"{' '.join(cmd)} failed in {path}")
+        return path, branch
+
+    def release(self, path: Path) -> None:
+        # Detach so the task branch is not held by the worktree.
+        _run(["git", "checkout", "-q", "--detach"], cwd=path, timeout_s=60)
+        self.free.append(path)
+
+    def integrate(self, branch: str) -> str:
+        """Bring `branch` into the checkout: ff, merge, conflict or failed."""
+
+        if _run(["git", "merge", "-q", "--ff-only", branch], cwd=self.repo, timeout_s=120).returncode == 0:
+            return "ff"
+        p = _run(["git", "merge", "-q", "--no-edit", branch], cwd=self.repo, timeout_s=120)
+        if p.returncode == 0:
+            return "merge"
+        if _run(["git", "merge", "--abort"], cwd=self.repo, timeout_s=60).returncode == 0:
+            return "conflict"
+        # The merge never started (e.g. the checkout has local changes in the way).
+        return "failed"
+
+    def delete_branch(self, branch: str) -> None:
+        _run(["git", "branch", "-q", "-D", branch], cwd=self.repo, timeout_s=30)
+
+    def discard(self, path: Path, branch: Optional[str], base: str) -> None:
+        """Return a slot after an attempt that never finished; keep its branch only if it has commits."""
+
+        self.release(path)
+        if branch and _run(["git", "rev-parse", "-q", "--verify", f"refs/heads/{branch}"], cwd=self.repo, timeout_s=30).stdout.strip() == base:
+            self.delete_branch(branch)
+
+
 def _extract_json_object(text: str) -> Optional[Dict[str, Any]]:
     t = text.strip()
     t = _JSON_FENCE_RE.sub("", t).strip()
@@ -217,17 +1310,24 @@ def _extract_json_object(text: str) -> Optional[Dict[str, Any]]:
     return None
 
 
-def _build_prompt(item: Dict[str, Any]) -> str:
+def _build_prompt(item: Dict[str, Any], worktree: Optional[Path] = None, branch: Optional[str] = None) -> str:
     item_id = item.get("id", "")
     item_type = item.get("type", "")
     spec = (item.get("spec") or "").strip()
     repo = (item.get("repo") or "workspace").strip()
+    where = ""
+    if worktree is not None:
+        where = (
+            f"Work ONLY inside the git worktree {worktree} (branch {branch or _branch_name(str(item_id))}); "
+            "other tasks are running in the main checkout and in other worktrees. Commit there; do not push or switch branches.\n\n"
+        )
 
     # We want the CLI terminal to *do work* in the workspace and then report.
     # The orchestrator also computes commits/files independently.
     return (
         "You are Codex running an overnight build task in the user’s OpenClaw workspace.\n"
         "Work carefully, make changes directly in the repository, run quick sanity checks, and commit if appropriate.\n\n"
+        f"{where}"
         "Return TWO parts in your final message:\n"
         "(1) A brief human summary (2-6 sentences).\n"
         "(2) A single JSON object (no code fences) with this schema:\n"
@@ -261,6 +1361,205 @@ class TaskResult:
     model_report: Optional[Dict[str, Any]]
     raw_reply: str
     error: Optional[str] = None
+    tokens: Optional[int] = None
+    branch: Optional[str] = None
+    integration: Optional[str] = None  # ff|merge|conflict|failed|skipped
+    orphans: int = 0
+    model: Optional[str] = None
+    retries: int = 0
+    fallbacks: int = 0
+    hedge: Optional[Dict[str, Any]] = None
+
+
+class Hedger:
+    """Opt-in second attempts for items that run past their predicted p90.
+
+    `slot_free` is supplied by the run loop; a hedge only starts when it
+    would not keep a queued item from a slot, and it holds that slot until
+    it ends.
+    """
+
+    def __init__(self, predictor: Any, model: str, min_samples: int = HEDGE_MIN_SAMPLES, min_after_s: float = HEDGE_MIN_AFTER_S) -> None:
+        self.predictor = predictor
+        self.model = model
+        self.min_samples = min_samples
+        self.min_after_s = min_after_s
+        self.slot_free: Callable[[], bool] = lambda: False
+        self.active = 0
+        self.freed = asyncio.Event()
+
+    def plan(self, item: Dict[str, Any], timeout_s: int) -> Optional[Any]:
+        """The item's prediction if it is confident enough to hedge on, else None."""
+
+        pred = self.predictor.predict(item, model=self.model)
+        if pred.p90_s is None or pred.samples < self.min_samples or max(pred.p90_s, self.min_after_s) >= timeout_s:
+            return None
+        return pred
+
+    def take(self) -> bool:
+        if not self.slot_free():
+            return False
+        self.active += 1
+        return True
+
+    def give_back(self) -> None:
+        self.active -= 1
+        self.freed.set()
+
+
+@dataclass
+class _Attempt:
+    """One agent run of an item: the primary, or a hedge in its own worktree."""
+
+    label: str  # primary|hedge
+    session_id: str
+    log_path: Path
+    work_dir: Path
+    start_head: str
+    worktree: Optional[Path] = None
+    branch: Optional[str] = None
+    agent: str = ""
+    model: Optional[str] = None
+    status: str = "fail"
+    error: Optional[str] = None
+    raw_reply: str = ""
+    model_report: Optional[Dict[str, Any]] = None
+    tokens: Optional[int] = None
+    orphans: int = 0
+    retries: int = 0
+    fallbacks: int = 0
+    files: List[str] = field(default_factory=list)
+    commits: List[str] = field(default_factory=list)
+    t0: float = field(default_factory=time.monotonic)
+    elapsed_s: float = 0.0
+
+
+def _attempt_delta(att: _Attempt, item: Dict[str, Any], git: GitBatch) -> None:
+    """Commit the attempt's leftovers (in a worktree) and record its commits and files."""
+
+    files = git.uncommitted_files(att.work_dir)
+    if att.worktree is not None:
+        refused = _git_commit_leftovers(att.worktree, f"overnight {item.get('id', '')}: uncommitted agent changes", files)
+        if refused:
+            att.error = att.error or f"uncommitted changes were not committed: {refused}"
+    end_head = git.head(att.work_dir)
+    att.commits = git.commits_between(att.start_head, end_head)
+    att.files = sorted(set(git.files_between(att.start_head, end_head) + files))
+
+
+async def _run_attempt(
+    att: _Attempt,
+    *,
+    item: Dict[str, Any],
+    prompt: str,
+    timeout_s: int,
+    git: GitBatch,
+    route: ModelRoute,
+    retry: RetryPolicy,
+    key: Optional[str],
+    tried: List[str],
+    sessions: Optional[SessionPool] = None,
+) -> _Attempt:
+    """Run the agent (with retries and model fallback) and compute the attempt's git delta."""
+
+    rechecked = False
+    while True:
+        if key is None:
+            att.error = att.error or "no model available (Codex exhausted and no router fallback)"
+            break
+        if key in route.exhausted:
+            # Another item found this model exhausted meanwhile.
+            att.fallbacks += 1
+            nxt = route.candidates(tried + [key])
+            key = nxt[0] if nxt else None
+            continue
+        att.agent, att.model = await route.ensure(key)
+        att.error = None
+        message = prompt
+        session = sessions.acquire(att.agent) if sessions is not None else None
+        if session is not None:
+            att.session_id = session["id"]
+            if session["turns"]:
+                message = SESSION_HANDOFF + prompt
+        cmd = [
+            "openclaw",
+            "agent",
+            "--agent",
+            att.agent,
+            "--session-id",
+            att.session_id,
+            "--message",
+            message,
+            "--json",
+            "--timeout",
+            str(timeout_s),
+        ]
+        turn_ok = False
+        try:
+            # openclaw enforces --timeout itself; ours is the backstop.
+            proc = await _run_agent(cmd, cwd=att.work_dir, timeout_s=timeout_s + 30, log_path=att.log_path)
+            att.orphans += proc.orphans
+            if proc.returncode is None:
+                att.error = f"timeout after {timeout_s}s"
+            elif proc.returncode != 0:
+                att.error = proc.stderr.strip() or proc.stdout.strip() or "openclaw agent failed"
+            else:
+                payload = json.loads(proc.stdout)
+                payloads = (payload.get("result") or {}).get("payloads") or []
+                att.raw_reply = (payloads[0].get("text") if payloads else "") or ""
+                att.model_report = _extract_json_object(att.raw_reply)
+                if overnight_predictor is not None:
+                    att.tokens = overnight_predictor.extract_usage_tokens(payload)
+                turn_ok = True
+        except Exception as exc:
+            att.error = str(exc)
+        finally:
+            if session is not None:
+                # Failed or cancelled turns may leave the session mid-turn: retire it.
+                sessions.release(session, ok=turn_ok, tokens=att.tokens if turn_ok else None, chars=len(message) + len(att.raw_reply))
+
+        kind = classify_error(att.error) if att.error and not att.error.startswith("timeout after") else None
+        if kind is None:
+            break
+        if kind == "no_agent":
+            if rechecked:
+                break
+            rechecked = True
+            await route.ensure(key, recheck=True)
+            continue
+        if kind != "exhausted" and att.retries < retry.max_retries:
+            att.retries += 1
+            await asyncio.sleep(retry.delay(att.retries - 1))
+            continue
+        if kind == "exhausted":
+            route.mark_exhausted(key, att.error)
+        # Exhausted, or still rate limited after every retry: next model.
+        tried.append(key)
+        await route.refresh_usage()
+        nxt = route.candidates(tried)
+        if not nxt:
+            break
+        key = nxt[0]
+        att.fallbacks += 1
+    att.elapsed_s = time.monotonic() - att.t0
+
+    # Compute repo deltas regardless of agent output. The leftover commit runs
+    # hooks and may take minutes, so all of it stays off the event loop.
+    delta = asyncio.ensure_future(asyncio.to_thread(_attempt_delta, att, item, git))
+    try:
+        await asyncio.shield(delta)
+    except asyncio.CancelledError:
+        # The thread cannot be stopped; let it finish before the worktree is released.
+        await asyncio.wait([delta])
+        raise
+
+    # Determine success/fail.
+    att.status = "success"
+    if att.error:
+        att.status = "fail"
+    elif att.model_report and att.model_report.get("success") is False:
+        att.status = "fail"
+    return att
 
 
 async def run_one_item(
@@ -270,17 +1569,16 @@ async def run_one_item(
     timeout_s: int,
     repo_root: Path,
     dry_run: bool,
+    pool: Optional[WorktreePool] = None,
+    git: Optional[GitBatch] = None,
+    route: Optional[ModelRoute] = None,
+    retry: Optional[RetryPolicy] = None,
+    hedger: Optional[Hedger] = None,
+    sessions: Optional[SessionPool] = None,
 ) -> TaskResult:
     started = _utc_now()
     session_id = f"overnight:{item.get('id','item')}".replace(" ", "_")
 
-    # Snapshot git state for the workspace repo.
-    start_head = _git_head(repo_root)
-
-    raw_reply = ""
-    model_report: Optional[Dict[str, Any]] = None
-    error: Optional[str] = None
-
     if dry_run:
         await asyncio.sleep(0.01)
         finished = _utc_now()
@@ -298,65 +1596,155 @@ async def run_one_item(
             raw_reply="dry-run",
         )
 
-    prompt = _build_prompt(item)
-
-    cmd = [
-        "openclaw",
-        "agent",
-        "--agent",
-        agent_name,
-        "--session-id",
-        session_id,
-        "--message",
-        prompt,
-        "--json",
-        "--timeout",
-        str(timeout_s),
-    ]
-
-    try:
-        # run in thread to avoid blocking event loop
-        proc = await asyncio.to_thread(_run, cmd, cwd=repo_root, timeout_s=timeout_s + 30)
-        if proc.returncode != 0:
-            error = proc.stderr.strip() or proc.stdout.strip() or "openclaw agent failed"
+    git = git or GitBatch(repo_root)
+    retry = retry or RetryPolicy()
+    if item.get("max_retries") is not None:
+        retry = RetryPolicy(int(item["max_retries"]), retry.base_s, retry.cap_s)
+    route = route or ModelRoute(agent_name, DEFAULT_AGENT_MODEL, repo_root, enabled=False)
+    log_name = re.sub(r"[^A-Za-z0-9._-]+", "_", str(item.get("id") or "item"))
+
+    async def start_attempt(label: str, key: Optional[str], tried: List[str]) -> Tuple[_Attempt, asyncio.Task]:
+        # Snapshot git state; with a pool each attempt gets its own worktree.
+        suffix = "" if label == "primary" else f"-{label}"
+        if pool is not None:
+            branch = _branch_name(str(item.get("id") or "item")) + suffix
+            async with pool.lock:
+                start_head = git.head()
+                worktree, branch = await asyncio.to_thread(pool.acquire, branch, start_head)
+            att = _Attempt(label, session_id + suffix.replace("-", ":"), LOGS_DIR / f"{log_name}{suffix}.log", worktree, start_head, worktree, branch)
         else:
-            payload = json.loads(proc.stdout)
-            payloads = (payload.get("result") or {}).get("payloads") or []
-            raw_reply = (payloads[0].get("text") if payloads else "") or ""
-            model_report = _extract_json_object(raw_reply)
-    except subprocess.TimeoutExpired:
-        error = f"timeout after {timeout_s}s"
-    except Exception as exc:
-        error = str(exc)
+            att = _Attempt(label, session_id, LOGS_DIR / f"{log_name}.log", repo_root, git.head())
+        prompt = _build_prompt(item, att.worktree, att.branch)
+        task = asyncio.create_task(
+            _run_attempt(att, item=item, prompt=prompt, timeout_s=timeout_s, git=git, route=route, retry=retry, key=key, tried=tried, sessions=sessions)
+        )
+        return att, task
 
-    finished = _utc_now()
+    attempts: List[_Attempt] = []
+    released: List[_Attempt] = []
 
-    # Compute repo deltas regardless of agent output.
-    end_head = _git_head(repo_root)
-    commits = _git_commits_between(repo_root, start_head, end_head)
-    files = sorted(set(_git_files_between(repo_root, start_head, end_head) + _git_uncommitted_files(repo_root)))
+    async def release(a: _Attempt, drop_branch: bool) -> None:
+        released.append(a)
+        await asyncio.to_thread(pool.release, a.worktree)
+        if drop_branch:
+            await asyncio.to_thread(pool.delete_branch, a.branch)
 
-    # Determine success/fail.
-    status = "success"
-    if error:
-        status = "fail"
-    elif model_report and model_report.get("success") is False:
-        status = "fail"
+    try:
+        tasks: Dict[asyncio.Task, _Attempt] = {}
+        winner: Optional[_Attempt] = None
+        hedged = False
+        plan = hedger.plan(item, timeout_s) if hedger is not None and pool is not None else None
+        primary_key = route.start_key()
+        try:
+            att, task = await start_attempt("primary", primary_key, [])
+            attempts.append(att)
+            tasks[task] = att
+            if plan is not None:
+                # Past the predicted p90, add a hedge whenever a slot is free.
+                wait_s = max(plan.p90_s, hedger.min_after_s)
+                while not hedged:
+                    done, _ = await asyncio.wait(tasks, timeout=wait_s)
+                    if done:
+                        break
+                    wait_s = HEDGE_RECHECK_S
+                    if hedger.take():
+                        hedged = True
+                        used = [k for k in (primary_key, route.key(att.model or "")) if k]
+                        alt = route.candidates(used)
+                        key = alt[0] if alt else primary_key
+                        hatt, htask = await start_attempt("hedge", key, [] if key == primary_key else used)
+                        attempts.append(hatt)
+                        tasks[htask] = hatt
+            # First successful attempt wins; otherwise report the primary.
+            while tasks and winner is None:
+                done, _ = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+                for t in done:
+                    a = tasks.pop(t)
+                    t.result()
+                    if a.status == "success" and winner is None:
+                        winner = a
+        finally:
+            for t, a in tasks.items():
+                t.cancel()
+                a.elapsed_s = time.monotonic() - a.t0
+            if tasks:
+                await asyncio.gather(*tasks, return_exceptions=True)
+            if hedged:
+                hedger.give_back()
+
+        rep = winner or attempts[0]
+        losers = [a for a in attempts if a is not rep]
+        finished = _utc_now()
+        status, error = rep.status, rep.error
+        branch = rep.branch
+
+        integration: Optional[str] = None
+        if pool is not None:
+            for a in losers:
+                await release(a, True)
+            await release(rep, not rep.commits)
+            if not rep.commits:
+                branch = None
+            elif status != "success":
+                integration = "skipped"
+            else:
+                async with pool.lock:
+                    integration = await asyncio.to_thread(pool.integrate, branch)
+                if integration in ("ff", "merge"):
+                    await asyncio.to_thread(pool.delete_branch, branch)
+                else:
+                    status = "fail"
+                    error = f"{branch} did not merge into the workspace ({integration}); left for review"
+
+        hedge: Optional[Dict[str, Any]] = None
+        if hedged:
+            loser = losers[0]
+            extra_tokens = loser.tokens
+            estimated = False
+            if extra_tokens is None and plan.p50_tokens and plan.p50_s:
+                # A cancelled turn reports no usage; scale the predicted cost by its runtime.
+                extra_tokens = int(plan.p50_tokens * min(1.0, loser.elapsed_s / plan.p50_s))
+                estimated = True
+            hedge_att = attempts[1]
+            hedge = {
+                "after_s": round(max(plan.p90_s, hedger.min_after_s), 1),
+                "agent": hedge_att.agent,
+                "model": hedge_att.model,
+                "winner": rep.label if winner is not None else None,
+                "extra_seconds": round(loser.elapsed_s, 1),
+                "extra_tokens": extra_tokens,
+                "extra_tokens_estimated": estimated,
+            }
 
-    return TaskResult(
-        task=item,
-        status=status,
-        started_at=_iso(started),
-        finished_at=_iso(finished),
-        duration_seconds=(finished - started).total_seconds(),
-        files_changed=files,
-        commits_made=commits,
-        agent=agent_name,
-        session_id=session_id,
-        model_report=model_report,
-        raw_reply=raw_reply,
-        error=error,
-    )
+        return TaskResult(
+            task=item,
+            status=status,
+            started_at=_iso(started),
+            finished_at=_iso(finished),
+            duration_seconds=(finished - started).total_seconds(),
+            files_changed=rep.files,
+            commits_made=rep.commits,
+            agent=rep.agent or agent_name,
+            session_id=rep.session_id,
+            model_report=rep.model_report,
+            raw_reply=rep.raw_reply,
+            error=error,
+            tokens=rep.tokens,
+            branch=branch,
+            integration=integration,
+            orphans=sum(a.orphans for a in attempts),
+            model=rep.model,
+            retries=rep.retries,
+            fallbacks=rep.fallbacks,
+            hedge=hedge,
+        )
+    finally:
+        if pool is not None:
+            # An attempt that raised (git timeout, a hook hanging) still gives
+            # its slot back; its branch survives only if it holds commits.
+            for a in attempts:
+                if a.worktree is not None and all(a is not r for r in released):
+                    await asyncio.to_thread(pool.discard, a.worktree, a.branch, a.start_head)
 
 
 def _sort_items(items: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
@@ -373,14 +1761,13 @@ def _sort_items(items: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
     return sorted(items, key=key)
 
 
-def _append_results(run_results: List[TaskResult]) -> Dict[str, Any]:
-    existing = _load_json(RESULTS_PATH) or {"runs": [], "last_run_at": None}
-    runs = existing.get("runs") if isinstance(existing.get("runs"), list) else []
-
+def _append_results(run_results: List[TaskResult], run_id: Optional[str] = None) -> List[Dict[str, Any]]:
+    run_id = run_id or _iso(_utc_now())
+    entries: List[Dict[str, Any]] = []
     for r in run_results:
-        runs.append(
+        entries.append(
             {
-                "run_id": _iso(_utc_now()),
+                "run_id": run_id,
                 "task": r.task,
                 "status": r.status,
                 "started_at": r.started_at,
@@ -393,13 +1780,69 @@ def _append_results(run_results: List[TaskResult]) -> Dict[str, Any]:
                 "model_report": r.model_report,
                 "raw_reply": r.raw_reply,
                 "error": r.error,
+                "tokens": r.tokens,
+                "branch": r.branch,
+                "integration": r.integration,
+                "orphans": r.orphans,
+                "model": r.model,
+                "retries": r.retries,
+                "fallbacks": r.fallbacks,
+                "hedge": r.hedge,
             }
         )
 
-    existing["runs"] = runs[-2000:]  # cap history
-    existing["last_run_at"] = _iso(_utc_now())
-    _save_json(RESULTS_PATH, existing)
-    return existing
+    overnight_results.ResultsStore(RESULTS_PATH).append_run(entries)
+    return entries
+
+
+def _crashed_result(item: Dict[str, Any], agent_name: str, started: datetime, exc: BaseException) -> TaskResult:
+    finished = _utc_now()
+    return TaskResult(
+        task=item,
+        status="fail",
+        started_at=_iso(started),
+        finished_at=_iso(finished),
+        duration_seconds=(finished - started).total_seconds(),
+        files_changed=[],
+        commits_made=[],
+        agent=agent_name,
+        session_id="",
+        model_report=None,
+        raw_reply="",
+        error=f"builder error: {exc.__class__.__name__}: {exc}"[:500],
+    )
+
+
+def _hedge_stats(hedges: Iterable[Optional[Dict[str, Any]]]) -> Dict[str, Any]:
+    """Hedge rate, win rate and extra cost over items' `hedge` records (None = not hedged)."""
+
+    items = hedged = won = extra_tokens = 0
+    extra_s = 0.0
+    for h in hedges:
+        items += 1
+        if not h:
+            continue
+        hedged += 1
+        won += 1 if h.get("winner") == "hedge" else 0
+        extra_tokens += int(h.get("extra_tokens") or 0)
+        extra_s += float(h.get("extra_seconds") or 0)
+    return {
+        "items": items,
+        "hedged": hedged,
+        "hedge_rate": round(hedged / items, 3) if items else 0.0,
+        "hedge_wins": won,
+        "win_rate": round(won / hedged, 3) if hedged else 0.0,
+        "extra_tokens": extra_tokens,
+        "extra_seconds": round(extra_s, 1),
+    }
+
+
+def _hedge_line(stats: Dict[str, Any]) -> str:
+    return (
+        f"Hedged: {stats['hedged']}/{stats['items']} items ({stats['hedge_rate']:.0%}), "
+        f"hedge won {stats['hedge_wins']} ({stats['win_rate']:.0%}), "
+        f"extra ~{stats['extra_tokens']} tokens, {stats['extra_seconds'] / 60:.1f} min"
+    )
 
 
 def _format_summary(results: List[TaskResult]) -> str:
@@ -409,6 +1852,12 @@ def _format_summary(results: List[TaskResult]) -> str:
     lines: List[str] = []
     lines.append("🌙 Overnight build summary")
     lines.append(f"Tasks: {len(results)} (✅ {ok} / ❌ {fail})")
+    orphans = sum(r.orphans for r in results)
+    if orphans:
+        lines.append(f"Orphaned processes killed: {orphans}")
+    hedges = _hedge_stats(r.hedge for r in results)
+    if hedges["hedged"]:
+        lines.append(_hedge_line(hedges))
     lines.append("")
 
     for r in results:
@@ -420,22 +1869,60 @@ def _format_summary(results: List[TaskResult]) -> str:
         dur = int(r.duration_seconds)
         lines.append(f"{status} {tid} (p{pr}, {t}, {dur}s): {spec}")
         if r.commits_made:
-            lines.append(f"  commits: {len(r.commits_made)}")
+            merged = f" ({r.integration})" if r.integration else ""
+            lines.append(f"  commits: {len(r.commits_made)}{merged}")
         if r.files_changed:
             lines.append(f"  files: {len(r.files_changed)}")
+        if r.retries or r.fallbacks:
+            lines.append(f"  retries: {r.retries}, fallbacks: {r.fallbacks} (ran on {r.model})")
+        if r.hedge:
+            lines.append(f"  hedged after {int(r.hedge['after_s'])}s on {r.hedge['model']}: {r.hedge['winner'] or 'no'} attempt won")
         if r.error:
             lines.append(f"  error: {r.error}")
 
     return "\n".join(lines).strip() + "\n"
 
 
-def _send_telegram(text: str) -> None:
-    script = SCRIPTS_DIR / "simple_telegram_notify.py"
-    if not script.exists():
-        raise RuntimeError("simple_telegram_notify.py not found")
-    p = _run([sys.executable, str(script), text], cwd=CLAWD, timeout_s=30)
-    if p.returncode != 0:
-        raise RuntimeError(p.stderr.strip() or p.stdout.strip() or "Failed to send Telegram")
+def _queue_forecast_lines() -> List[str]:
+    """Predicted effort for what is still queued (empty if no predictor/history)."""
+
+    if overnight_predictor is None:
+        return []
+    items = overnight_queue_store.QueueStore(QUEUE_PATH).items()
+    if not items:
+        return []
+    try:
+        predictor = overnight_predictor.load_fitted()
+    except Exception:
+        return []
+    preds = [predictor.predict(it) for it in items]
+    known = [p for p in preds if p.p50_s is not None]
+    if not known:
+        return []
+    p50 = sum(p.p50_s for p in known) / 60
+    p90 = sum(p.p90_s for p in known) / 60
+    return ["", f"Queue: {len(items)} remaining, est {p50:.0f}m (p90 {p90:.0f}m) for {len(known)} with history"]
+
+
+def _format_digest(batch: List[TaskResult], running: int, pending: int) -> str:
+    ok = sum(1 for r in batch if r.status == "success")
+    lines = [
+        f"🌙 Overnight progress {datetime.now().strftime('%H:%M')}: {len(batch)} finished (✅ {ok} / ❌ {len(batch) - ok}), {running} running, {pending} queued"
+    ]
+    for r in batch:
+        status = "✅" if r.status == "success" else "❌"
+        line = f"{status} {r.task.get('id', '(no-id)')} ({int(r.duration_seconds)}s)"
+        if r.error:
+            line += f": {r.error.splitlines()[0][:120]}"
+        lines.append(line)
+    return "\n".join(lines)
+
+
+def _notify(outbox: "overnight_notify.Outbox", text: str, **kw: Any) -> None:
+    """Spool a Telegram message and make sure a drainer is delivering; never waits on the send."""
+
+    outbox.enqueue(text, **kw)
+    outbox.spawn_drainer()
 
 
 async def main_async() -> int:
@@ -443,19 +1930,51 @@ async def main_async() -> int:
 
     ap = argparse.ArgumentParser(description="Overnight build runner (queue → Codex → results → Telegram)")
     ap.add_argument("--queue", default=str(QUEUE_PATH), help="Path to overnight queue JSON")
-    ap.add_argument("--results", default=str(RESULTS_PATH), help="Path to results JSON")
+    ap.add_argument("--results", default=str(RESULTS_PATH), help="Results store directory (a legacy .json path is migrated)")
     ap.add_argument("--agent", default=DEFAULT_AGENT_NAME, help=f"OpenClaw agent name (default: {DEFAULT_AGENT_NAME})")
     ap.add_argument("--model", default=DEFAULT_AGENT_MODEL, help=f"Model id used if agent is auto-created (default: {DEFAULT_AGENT_MODEL})")
     ap.add_argument("--max-concurrency", type=int, default=DEFAULT_MAX_CONCURRENCY)
     ap.add_argument("--timeout-seconds", type=int, default=DEFAULT_TIMEOUT_S)
+    ap.add_argument("--no-worktrees", action="store_true", help="Run every item in the workspace checkout instead of per-item worktrees")
     ap.add_argument("--dry-run", action="store_true")
+    ap.add_argument("--daemon", action="store_true", help="Keep running and admit queue items as they are added, until --until")
+    ap.add_argument("--until", default=DEFAULT_DAEMON_UNTIL, help=f"Local HH:MM at which --daemon stops admitting work (default: {DEFAULT_DAEMON_UNTIL})")
+    ap.add_argument("--max-retries", type=int, default=DEFAULT_MAX_RETRIES, help=f"Retries per item on rate limits/transient errors (default {DEFAULT_MAX_RETRIES}; item max_retries overrides)")
+    ap.add_argument("--retry-base-seconds", type=float, default=DEFAULT_RETRY_BASE_S, help=f"Backoff base; retry n waits up to base*2^n, jittered (default {DEFAULT_RETRY_BASE_S:g})")
+    ap.add_argument("--no-fallback", action="store_true", help="Never switch models; exhausted items fail")
+    ap.add_argument("--hedge", action="store_true", help="Start a second attempt for items running past their predicted p90 when a slot is free")
+    ap.add_argument("--hedge-min-samples", type=int, default=HEDGE_MIN_SAMPLES, help=f"Similar past runs needed before an item is hedged (default {HEDGE_MIN_SAMPLES})")
+    ap.add_argument("--hedge-min-seconds", type=float, default=HEDGE_MIN_AFTER_S, help=f"Never hedge an item before it has run this long (default {HEDGE_MIN_AFTER_S:g})")
+    ap.add_argument("--hedge-stats", action="store_true", help="Print hedge rate, win rate and extra cost over the results history and exit")
+    ap.add_argument("--poll-seconds", type=float, default=DEFAULT_POLL_S, help="Queue poll interval for --daemon where kqueue is unavailable")
     ap.add_argument("--send-summary", action="store_true", help="Send Telegram summary at end")
+    ap.add_argument("--notify-interval", type=float, default=DEFAULT_NOTIFY_INTERVAL_S, help=f"With --send-summary, send a digest of finished items every N seconds; 0 = summary only (default {DEFAULT_NOTIFY_INTERVAL_S:g})")
+    ap.add_argument("--notify-min-interval", type=float, default=overnight_notify.MIN_INTERVAL_S, help=f"Minimum seconds between Telegram sends (default {overnight_notify.MIN_INTERVAL_S:g})")
     ap.add_argument("--send-summary-only", action="store_true", help="Send Telegram summary for last run and exit")
+    ap.add_argument("--session-max-tokens", type=int, default=DEFAULT_SESSION_MAX_TOKENS, help=f"Retire a pooled agent session once its context reaches this many tokens (default {DEFAULT_SESSION_MAX_TOKENS})")
+    ap.add_argument("--no-session-pool", action="store_true", help="Start a fresh session (overnight:<id>) for every item")
+    ap.add_argument("--bench-sessions", type=int, metavar="N", help="Time N agent turn starts against fake_openclaw.py, per-item sessions vs the pool, and exit")
+    ap.add_argument("--bench-git", type=int, metavar="N", help="Time per-task git delta computation (N iterations) and exit")
+    ap.add_argument("--bench-repo", default=str(CLAWD), help="Repository for --bench-git (default: workspace)")
     args = ap.parse_args()
 
+    if args.bench_git:
+        return _bench_git(Path(args.bench_repo).expanduser(), args.bench_git)
+    if args.bench_sessions:
+        return await _bench_sessions(args.bench_sessions, int(args.session_max_tokens))
+
     QUEUE_PATH = Path(args.queue).expanduser()
     RESULTS_PATH = Path(args.results).expanduser()
 
+    if args.hedge_stats:
+        entries = list(overnight_results.ResultsStore(RESULTS_PATH).iter_entries())
+        stats = _hedge_stats(e.get("hedge") for e in entries)
+        print(_hedge_line(stats))
+        for model in sorted({str(e["hedge"].get("model")) for e in entries if e.get("hedge")}):
+            sub_stats = _hedge_stats(e["hedge"] for e in entries if e.get("hedge") and str(e["hedge"].get("model")) == model)
+            print(f"  {model}: {sub_stats['hedged']} hedges, won {sub_stats['hedge_wins']} ({sub_stats['win_rate']:.0%})")
+        return 0
+
     # Safety: prevent overlapping runs.
     lock_fd = _acquire_lock()
     if lock_fd is None:
@@ -463,14 +1982,12 @@ async def main_async() -> int:
         return 2
 
     try:
+        overnight_results.ResultsStore(RESULTS_PATH).migrate()
         if args.send_summary_only:
-            existing = _load_json(RESULTS_PATH) or {}
-            runs = existing.get("runs") if isinstance(existing.get("runs"), list) else []
-            if not runs:
+            last = overnight_results.ResultsStore(RESULTS_PATH).latest_run()
+            if not last:
                 print("No previous runs found; nothing to summarize.")
                 return 0
-            # summarize last contiguous run batch (best-effort: last 20)
-            last = runs[-20:]
             # render a simple, stable summary
             lines = ["🌅 Morning overnight build summary", f"Last results entries: {len(last)}", ""]
             for r in last:
@@ -481,71 +1998,215 @@ async def main_async() -> int:
                 dur = r.get("duration_seconds")
                 dur_s = f"{int(dur)}s" if isinstance(dur, (int, float)) else "?s"
                 lines.append(f"{emoji} {tid} ({dur_s})")
-            _send_telegram("\n".join(lines))
-            print("Sent summary.")
+            hedges = _hedge_stats(r.get("hedge") for r in last)
+            if hedges["hedged"]:
+                lines.append(_hedge_line(hedges))
+            lines.extend(_queue_forecast_lines())
+            _notify(overnight_notify.Outbox(NOTIFY_SPOOL_DIR, min_interval_s=args.notify_min_interval), "\n".join(lines), kind="summary")
+            print(f"Queued summary for delivery ({NOTIFY_SPOOL_DIR}).")
             return 0
 
+        workspace = Path.home() / ".openclaw" / "workspace"
+        route = ModelRoute(args.agent, args.model, workspace, enabled=not args.no_fallback)
+        retry = RetryPolicy(max(0, int(args.max_retries)), float(args.retry_base_seconds))
         if not args.dry_run:
-            if not codex_available():
-                print("Codex is not available (state/codex_status.json). Aborting.")
+            await route.refresh_usage()
+            start = route.start_key()
+            if start is None:
+                print("Codex is not available (state/codex_status.json) and no fallback model is allowed. Aborting.")
                 return 3
+            if start != route.key(args.model):
+                print(f"Codex is not available (state/codex_status.json); starting on fallback model {start}.")
 
         # Ensure codex agent exists (even for dry run, for consistent behavior).
-        ensure_codex_agent(agent_name=args.agent, model=args.model, workspace=Path.home() / ".openclaw" / "workspace")
+        ensure_codex_agent(agent_name=args.agent, model=args.model, workspace=workspace)
 
-        queue = _load_json(QUEUE_PATH) or {"items": []}
-        items = queue.get("items")
-        if not isinstance(items, list):
-            items = []
+        store = overnight_queue_store.QueueStore(QUEUE_PATH)
+        # Only one builder runs at a time (lock above), so RUNNING claims
+        # from a dead builder process are safe to hand back.
+        store.requeue_stale()
 
-        # Filter invalid items
-        normalized: List[Dict[str, Any]] = []
-        for it in items:
-            if not isinstance(it, dict):
-                continue
-            if not it.get("id") or not it.get("spec") or it.get("priority") is None:
-                continue
-            normalized.append(it)
-
-        if not normalized:
-            print("Queue is empty. Nothing to do.")
-            return 0
-
-        ordered = _sort_items(normalized)
-
-        sem = asyncio.Semaphore(max(1, int(args.max_concurrency)))
+        max_conc = max(1, int(args.max_concurrency))
+        deadline = _window_end(args.until) if args.daemon else None
         repo_root = CLAWD
+        git = GitBatch(repo_root)
 
-        results: List[TaskResult] = []
+        pool: Optional[WorktreePool] = None
+        if not args.dry_run and not args.no_worktrees:
+            pool = WorktreePool(repo_root)
 
-        async def worker(it: Dict[str, Any]) -> None:
-            async with sem:
-                res = await run_one_item(
-                    item=it,
-                    agent_name=args.agent,
-                    timeout_s=int(args.timeout_seconds),
-                    repo_root=repo_root,
-                    dry_run=bool(args.dry_run),
-                )
-                results.append(res)
+        hedger: Optional[Hedger] = None
+        if args.hedge and pool is not None:
+            if overnight_predictor is None:
+                print("Hedging needs overnight_predictor.py; running without it.")
+            else:
+                predictor = await asyncio.to_thread(overnight_predictor.load_fitted)
+                hedger = Hedger(predictor, args.model, min_samples=max(1, int(args.hedge_min_samples)), min_after_s=float(args.hedge_min_seconds))
 
-        # Launch tasks (bounded by semaphore)
-        await asyncio.gather(*[worker(it) for it in ordered])
+        sessions: Optional[SessionPool] = None
+        if not args.dry_run and not args.no_session_pool:
+            sessions = SessionPool(SESSIONS_PATH, max_context_tokens=max(1, int(args.session_max_tokens)))
 
-        # Persist results
-        _append_results(results)
-
-        # Remove processed items from queue (so we don't rerun them).
-        processed_ids = {r.task.get("id") for r in results}
-        remaining = [it for it in items if isinstance(it, dict) and it.get("id") not in processed_ids]
-        _save_json(QUEUE_PATH, {"items": remaining})
+        run_id = _iso(_utc_now())
+        results: List[TaskResult] = []
+        pending: List[Dict[str, Any]] = []
+        started: set = set()
+        running: Dict[asyncio.Task, Tuple[Dict[str, Any], datetime]] = {}
+        watcher = QueueWatcher(QUEUE_PATH, float(args.poll_seconds))
+        stop = asyncio.Event()
+        loop = asyncio.get_running_loop()
+        with contextlib.suppress(NotImplementedError, RuntimeError):
+            loop.add_signal_handler(signal.SIGTERM, stop.set)
+
+        def refresh() -> None:
+            """Re-rank everything runnable in the queue that has not started yet."""
+
+            fresh = []
+            for it in store.items(overnight_queue_store.QUEUED):
+                if not it.get("id") or not it.get("spec") or it.get("priority") is None:
+                    continue
+                if str(it["id"]) not in started:
+                    fresh.append(it)
+            pending[:] = _sort_items(fresh)
+
+        def record(it: Dict[str, Any], res: TaskResult) -> None:
+            results.append(res)
+            _append_results([res], run_id)
+            # Processed items leave the queue (success or fail) so they
+            # are not rerun; the results store keeps the record.
+            if not args.dry_run:
+                store.complete([str(it["id"])])
+            if outbox is not None:
+                digest.append(res)
+
+        async def run_and_record(it: Dict[str, Any]) -> None:
+            res = await run_one_item(
+                item=it,
+                agent_name=args.agent,
+                timeout_s=int(args.timeout_seconds),
+                repo_root=repo_root,
+                dry_run=bool(args.dry_run),
+                pool=pool,
+                git=git,
+                route=route,
+                retry=retry,
+                hedger=hedger,
+                sessions=sessions,
+            )
+            record(it, res)
+
+        outbox = overnight_notify.Outbox(NOTIFY_SPOOL_DIR, min_interval_s=args.notify_min_interval) if args.send_summary else None
+        digest: List[TaskResult] = []
+
+        async def digest_loop(interval: float) -> None:
+            # Completions since the last digest go out as one message; a
+            # digest still unsent (Telegram down) absorbs the next one.
+            while True:
+                await asyncio.sleep(interval)
+                if digest:
+                    text = _format_digest(digest, len(running), len(pending))
+                    digest.clear()
+                    _notify(outbox, text, run_id=run_id, kind="digest", coalesce=True)
+
+        def admitting() -> bool:
+            if stop.is_set():
+                return False
+            if deadline is not None and _utc_now() >= deadline:
+                return False
+            return args.dry_run or not args.daemon or route.start_key() is not None
+
+        def busy() -> int:
+            return len(running) + (hedger.active if hedger is not None else 0)
+
+        if hedger is not None:
+            # Hedges only use slots that queued work would not take.
+            hedger.slot_free = lambda: busy() < max_conc and not (pending and admitting())
+
+        refresh()
+        watcher.changed()
+        if not pending and not args.daemon:
+            git.close()
+            print("Queue is empty. Nothing to do.")
+            return 0
+        if pool is not None:
+            await asyncio.to_thread(pool.prewarm, max_conc)
+        if args.daemon:
+            print(f"Daemon: watching {QUEUE_PATH} until {_iso(deadline)} ({max_conc} slots).")
+
+        digests = None
+        if outbox is not None and args.notify_interval > 0:
+            digests = asyncio.create_task(digest_loop(float(args.notify_interval)))
+        try:
+            while True:
+                # Admit the best-ranked items into free slots.
+                while pending and busy() < max_conc and admitting():
+                    it = pending.pop(0)
+                    if not args.dry_run and not store.claim([str(it["id"])]):
+                        continue  # removed or taken since the last refresh
+                    started.add(str(it["id"]))
+                    running[asyncio.create_task(run_and_record(it))] = (it, _utc_now())
+                if not running and (not args.daemon or not admitting()):
+                    break
+                waits = set(running)
+                stopper = None if stop.is_set() else asyncio.create_task(stop.wait())
+                if stopper is not None:
+                    waits.add(stopper)
+                freed = None
+                if hedger is not None and hedger.active:
+                    # A hedge ending frees a slot without ending an item.
+                    hedger.freed.clear()
+                    freed = asyncio.create_task(hedger.freed.wait())
+                    waits.add(freed)
+                watch = None
+                if args.daemon and busy() < max_conc and admitting():
+                    # Only wake for queue changes while a slot is free.
+                    timeout = (deadline - _utc_now()).total_seconds() if deadline else None
+                    watch = asyncio.create_task(watcher.wait(timeout))
+                    waits.add(watch)
+                done, _ = await asyncio.wait(waits, return_when=asyncio.FIRST_COMPLETED)
+                for t in (stopper, watch, freed):
+                    if t is not None and not t.done():
+                        t.cancel()
+                for t in done:
+                    if t not in running:
+                        continue
+                    it, since = running.pop(t)
+                    try:
+                        t.result()
+                    except Exception as exc:
+                        # One item's crash must not take the run (and the
+                        # items still running) down with it.
+                        print(f"Item {it['id']} crashed: {exc!r}", file=sys.stderr)
+                        if not any(r.task is it for r in results):
+                            record(it, _crashed_result(it, args.agent, since, exc))
+                if args.daemon and watcher.changed():
+                    refresh()
+        finally:
+            if digests is not None:
+                digests.cancel()
+            for t in running:
+                t.cancel()
+            if running:
+                await asyncio.gather(*running, return_exceptions=True)
+            watcher.close()
+            git.close()
+            if not args.dry_run:
+                done_ids = {str(r.task.get("id")) for r in results}
+                unfinished = [i for i in started if i not in done_ids]
+                if unfinished:
+                    store.requeue(unfinished)
+
+        if not results:
+            print("No items ran.")
+            return 0
 
         summary = _format_summary(results)
         print(summary)
 
-        if args.send_summary:
-            _send_telegram(summary)
-            print("Sent Telegram summary.")
+        if outbox is not None:
+            # The summary covers everything, so it replaces undelivered digests.
+            _notify(outbox, summary, run_id=run_id, kind="summary", supersedes="digest")
+            print(f"Queued Telegram summary for delivery ({NOTIFY_SPOOL_DIR}).")
 
         return 0
 
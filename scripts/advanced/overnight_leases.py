@@ -0,0 +1,227 @@
+#!/usr/bin/env python3
+"""overnight_leases.py — lease store for multi-host overnight_queue.py workers.
+
+`overnight_queue.py --worker` instances on several machines point at the same
+SQLite file (e.g. on a shared volume) and split one night's queue between them:
+
+  - publish: each worker adds its queue's tasks for the night; every worker
+    then sees the union, so queue files do not have to match exactly
+  - claim:   a task is taken atomically (BEGIN IMMEDIATE) with a lease that
+    expires after lease_seconds unless renewed
+  - renew:   a heartbeat extends the leases of everything a worker is running
+  - requeue: a lease that lapses (worker died or hung) makes the task
+    claimable again; after lease_max_attempts claims it is marked failed
+  - finish:  done / failed are final for the night; a task interrupted by the
+    stop window is released back to queued
+
+Rows are keyed by (night, task id), where night is the run date (YYYYMMDD in
+the queue timezone), so the same queue runs again the next night. Lease times
+are wall-clock seconds: keep the hosts NTP-synced. On network filesystems
+SQLite's WAL mode is unsafe, so the default rollback journal is used.
+
+Usage:
+  python3 scripts/advanced/overnight_leases.py --status [--night YYYYMMDD] [--db PATH]
+"""
+
+from __future__ import annotations
+
+import argparse
+import contextlib
+import json
+import os
+import socket
+import sqlite3
+import sys
+import threading
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional
+
+CLAWD = Path(os.environ.get("OPENCLAW_WORKSPACE", str(Path.home() / ".openclaw" / "workspace")))
+DEFAULT_DB_PATH = CLAWD / "state" / "overnight_leases.sqlite"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS leases (
+    night TEXT NOT NULL,
+    task_id TEXT NOT NULL,
+    task TEXT NOT NULL,
+    state TEXT NOT NULL DEFAULT 'queued',
+    owner TEXT,
+    lease_until REAL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    updated_at TEXT,
+    info TEXT,
+    PRIMARY KEY (night, task_id)
+)
+"""
+
+
+def worker_id() -> str:
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+def _ts() -> str:
+    return datetime.now(timezone.utc).isoformat().replace("+00:00", "Z")
+
+
+class LeaseStore:
+    """The lease table shared by one night's workers.
+
+    Calls block for up to busy_timeout_s while another host holds the
+    database lock, so async callers run them in a thread (asyncio.to_thread).
+    The connection is shared across those threads, one call at a time.
+    """
+
+    def __init__(self, path: Path = DEFAULT_DB_PATH, busy_timeout_s: float = 30.0) -> None:
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        # Autocommit mode; writes take the database lock up front with
+        # BEGIN IMMEDIATE so check-then-update is atomic across hosts.
+        self.conn = sqlite3.connect(str(self.path), timeout=busy_timeout_s, isolation_level=None, check_same_thread=False)
+        self.conn.row_factory = sqlite3.Row
+        self.conn.execute(SCHEMA)
+        self._lock = threading.RLock()
+
+    def close(self) -> None:
+        with self._lock:
+            self.conn.close()
+
+    @contextlib.contextmanager
+    def _write(self):
+        with self._lock:
+            self.conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield self.conn
+            except BaseException:
+                self.conn.execute("ROLLBACK")
+                raise
+            self.conn.execute("COMMIT")
+
+    def publish(self, night: str, tasks: Iterable[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Add tasks for the night (existing rows win) and return the night's full task list."""
+
+        with self._write() as c:
+            for t in tasks:
+                tid = str(t.get("id") or "")
+                if tid:
+                    c.execute(
+                        "INSERT OR IGNORE INTO leases (night, task_id, task, updated_at) VALUES (?, ?, ?, ?)",
+                        (night, tid, json.dumps(t, ensure_ascii=False), _ts()),
+                    )
+        with self._lock:
+            rows = self.conn.execute("SELECT task FROM leases WHERE night = ? ORDER BY rowid", (night,)).fetchall()
+        return [json.loads(r["task"]) for r in rows]
+
+    def claim(self, night: str, task_id: str, owner: str, lease_s: float, max_attempts: int) -> bool:
+        now = time.time()
+        with self._write() as c:
+            row = c.execute("SELECT state, owner, lease_until, attempts FROM leases WHERE night = ? AND task_id = ?", (night, task_id)).fetchone()
+            if row is None or row["state"] in ("done", "failed"):
+                return False
+            if row["state"] == "leased" and row["owner"] != owner and (row["lease_until"] or 0) > now:
+                return False
+            if row["attempts"] >= max_attempts:
+                c.execute(
+                    "UPDATE leases SET state = 'failed', owner = NULL, lease_until = NULL, updated_at = ?, info = ? WHERE night = ? AND task_id = ?",
+                    (_ts(), json.dumps({"error": f"lease lost {row['attempts']} times"}), night, task_id),
+                )
+                return False
+            c.execute(
+                "UPDATE leases SET state = 'leased', owner = ?, lease_until = ?, attempts = attempts + 1, updated_at = ? WHERE night = ? AND task_id = ?",
+                (owner, now + lease_s, _ts(), night, task_id),
+            )
+            return True
+
+    def renew(self, night: str, task_ids: Iterable[str], owner: str, lease_s: float) -> List[str]:
+        """Extend this owner's leases; returns the ids whose lease was lost."""
+
+        ids = list(task_ids)
+        if not ids:
+            return []
+        lost = []
+        with self._write() as c:
+            for tid in ids:
+                cur = c.execute(
+                    "UPDATE leases SET lease_until = ?, updated_at = ? WHERE night = ? AND task_id = ? AND owner = ? AND state = 'leased'",
+                    (time.time() + lease_s, _ts(), night, tid, owner),
+                )
+                if cur.rowcount == 0:
+                    lost.append(tid)
+        return lost
+
+    def finish(self, night: str, task_id: str, owner: str, ok: bool, info: Optional[Dict[str, Any]] = None) -> bool:
+        with self._write() as c:
+            cur = c.execute(
+                "UPDATE leases SET state = ?, lease_until = NULL, updated_at = ?, info = ? WHERE night = ? AND task_id = ? AND owner = ?",
+                ("done" if ok else "failed", _ts(), json.dumps(info or {}), night, task_id, owner),
+            )
+            return cur.rowcount > 0
+
+    def release(self, night: str, task_id: str, owner: str) -> bool:
+        with self._write() as c:
+            cur = c.execute(
+                "UPDATE leases SET state = 'queued', owner = NULL, lease_until = NULL, updated_at = ? WHERE night = ? AND task_id = ? AND owner = ? AND state = 'leased'",
+                (_ts(), night, task_id, owner),
+            )
+            return cur.rowcount > 0
+
+    def snapshot(self, night: str) -> Dict[str, Dict[str, Any]]:
+        """task id -> {state, owner, lease_until, attempts, live, task} for the night, in publish order."""
+
+        now = time.time()
+        out: Dict[str, Dict[str, Any]] = {}
+        with self._lock:
+            rows = self.conn.execute(
+                "SELECT task_id, task, state, owner, lease_until, attempts, updated_at FROM leases WHERE night = ? ORDER BY rowid", (night,)
+            ).fetchall()
+        for r in rows:
+            out[r["task_id"]] = {
+                "state": r["state"],
+                "owner": r["owner"],
+                "lease_until": r["lease_until"],
+                "attempts": r["attempts"],
+                "updated_at": r["updated_at"],
+                "live": r["state"] == "leased" and (r["lease_until"] or 0) > now,
+                "task": json.loads(r["task"]),
+            }
+        return out
+
+
+def main() -> int:
+    ap = argparse.ArgumentParser(description="Inspect the overnight_queue lease store")
+    ap.add_argument("--db", default=str(DEFAULT_DB_PATH))
+    ap.add_argument("--night", help="YYYYMMDD (default: most recent night in the store)")
+    ap.add_argument("--status", action="store_true")
+    ap.add_argument("--json", action="store_true")
+    args = ap.parse_args()
+
+    if not Path(args.db).exists():
+        print(f"No lease store at {args.db}.", file=sys.stderr)
+        return 1
+    store = LeaseStore(Path(args.db))
+    night = args.night
+    if not night:
+        row = store.conn.execute("SELECT MAX(night) AS n FROM leases").fetchone()
+        night = row["n"] if row else None
+    if not night:
+        print("Lease store is empty.")
+        return 0
+
+    snap = store.snapshot(night)
+    if args.json:
+        print(json.dumps({"night": night, "tasks": {tid: {k: v for k, v in st.items() if k != "task"} for tid, st in snap.items()}}, indent=2))
+        return 0
+    counts: Dict[str, int] = {}
+    for s in snap.values():
+        key = "leased (expired)" if s["state"] == "leased" and not s["live"] else s["state"]
+        counts[key] = counts.get(key, 0) + 1
+    print(f"night {night}: " + ", ".join(f"{k}={v}" for k, v in sorted(counts.items())))
+    for tid, s in sorted(snap.items()):
+        owner = f" owner={s['owner']}" if s["owner"] else ""
+        print(f"  {s['state']:7} {tid}{owner} attempts={s['attempts']} updated={s['updated_at']}")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
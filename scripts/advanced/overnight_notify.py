@@ -0,0 +1,316 @@
+#!/usr/bin/env python3
+"""overnight_notify.py — spooled Telegram outbox for overnight_builder.py.
+
+The builder never sends Telegram messages itself. It writes them to a spool
+directory and starts a detached drainer, so a slow or failing send cannot hold
+up a run:
+
+  state/overnight_notify_spool/
+    20260203T031245.123456Z-1a2b3c.json   one queued message
+    *.inflight                            the message being sent right now
+    dead/                                 messages that failed max_attempts times
+    state.json                            last_sent_at (for rate limiting)
+    drain.log                             drainer stderr
+
+  - enqueue: atomic write of {text, run_id, kind, ...}; with `coalesce`, the
+    text is appended to an unsent message of the same run and kind instead
+    (digests that piled up behind a failing send go out as one message);
+    with `supersedes`, unsent messages of the given kind for the run are
+    dropped (the final summary already contains them)
+  - drain: one drainer at a time (flock on .drain.lock) sends messages in
+    order, at most one per min_interval_s. It sends through
+    scripts/simple_telegram_notify.py. A failed send is retried with
+    exponential backoff (or after Telegram's "retry after N"). After
+    max_attempts the message moves to dead/. The drainer keeps going,
+    sleeping through backoffs, until the spool is empty (everything sent or
+    dead); a drainer that was killed is replaced by the next spawn (or
+    --drain from cron).
+
+Usage:
+  python3 scripts/advanced/overnight_notify.py --status
+  python3 scripts/advanced/overnight_notify.py --drain [--min-interval 30]
+  python3 scripts/advanced/overnight_notify.py --send "text"       # enqueue and spawn a drainer
+  python3 scripts/advanced/overnight_notify.py --requeue-dead
+"""
+
+from __future__ import annotations
+
+import argparse
+import contextlib
+import fcntl
+import json
+import os
+import re
+import subprocess
+import sys
+import time
+import uuid
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+CLAWD = Path(os.environ.get("OPENCLAW_WORKSPACE", str(Path.home() / ".openclaw" / "workspace")))
+SCRIPTS_DIR = CLAWD / "scripts"
+DEFAULT_SPOOL_DIR = CLAWD / "state" / "overnight_notify_spool"
+
+MIN_INTERVAL_S = 30.0
+MAX_ATTEMPTS = 8
+RETRY_BASE_S = 30.0
+RETRY_CAP_S = 1800.0
+RECHECK_S = 60.0
+SEND_TIMEOUT_S = 30
+
+_RETRY_AFTER_RE = re.compile(r"retry[ _-]?after\D{0,3}(\d+)", re.IGNORECASE)
+
+
+def _ts() -> str:
+    return datetime.now(timezone.utc).isoformat().replace("+00:00", "Z")
+
+
+def send_telegram(text: str) -> None:
+    """One synchronous send via simple_telegram_notify.py; raises on failure."""
+
+    script = SCRIPTS_DIR / "simple_telegram_notify.py"
+    if not script.exists():
+        raise RuntimeError("simple_telegram_notify.py not found")
+    p = subprocess.run([sys.executable, str(script), text], cwd=str(CLAWD), capture_output=True, text=True, timeout=SEND_TIMEOUT_S)
+    if p.returncode != 0:
+        raise RuntimeError(p.stderr.strip() or p.stdout.strip() or "Failed to send Telegram")
+
+
+class Outbox:
+    def __init__(
+        self,
+        spool: Path = DEFAULT_SPOOL_DIR,
+        *,
+        min_interval_s: float = MIN_INTERVAL_S,
+        max_attempts: int = MAX_ATTEMPTS,
+    ) -> None:
+        self.spool = Path(spool)
+        self.dead = self.spool / "dead"
+        self.state_path = self.spool / "state.json"
+        self.min_interval_s = min_interval_s
+        self.max_attempts = max_attempts
+
+    # -- plumbing -----------------------------------------------------------
+
+    @contextlib.contextmanager
+    def _locked(self, name: str = ".lock", block: bool = True) -> Iterator[bool]:
+        self.spool.mkdir(parents=True, exist_ok=True)
+        fd = os.open(str(self.spool / name), os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            try:
+                fcntl.flock(fd, fcntl.LOCK_EX | (0 if block else fcntl.LOCK_NB))
+            except BlockingIOError:
+                yield False
+                return
+            yield True
+        finally:
+            os.close(fd)
+
+    def _write(self, path: Path, msg: Dict[str, Any]) -> None:
+        tmp = path.with_name(path.name + ".tmp")
+        tmp.write_text(json.dumps(msg, ensure_ascii=False) + "\n", encoding="utf-8")
+        os.replace(tmp, path)
+
+    def _read(self, path: Path) -> Optional[Dict[str, Any]]:
+        try:
+            msg = json.loads(path.read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            return None
+        return msg if isinstance(msg, dict) else None
+
+    def _queued(self) -> List[Tuple[Path, Dict[str, Any]]]:
+        out = []
+        for path in sorted(self.spool.glob("*.json")):
+            if path == self.state_path:
+                continue
+            msg = self._read(path)
+            if msg is not None:
+                out.append((path, msg))
+        return out
+
+    def _state(self) -> Dict[str, Any]:
+        return self._read(self.state_path) or {}
+
+    # -- producers ----------------------------------------------------------
+
+    def enqueue(
+        self,
+        text: str,
+        *,
+        run_id: Optional[str] = None,
+        kind: str = "message",
+        coalesce: bool = False,
+        supersedes: Optional[str] = None,
+    ) -> Path:
+        """Spool a message; never sends. Returns the message file."""
+
+        with self._locked():
+            if supersedes and run_id:
+                for path, msg in self._queued():
+                    if msg.get("run_id") == run_id and msg.get("kind") == supersedes:
+                        path.unlink()
+            if coalesce and run_id:
+                for path, msg in self._queued():
+                    if msg.get("run_id") == run_id and msg.get("kind") == kind:
+                        msg["text"] = f"{msg['text']}\n\n{text}"
+                        msg["coalesced"] = int(msg.get("coalesced") or 1) + 1
+                        self._write(path, msg)
+                        return path
+            stamp = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%S.%fZ")
+            path = self.spool / f"{stamp}-{uuid.uuid4().hex[:6]}.json"
+            self._write(path, {"text": text, "run_id": run_id, "kind": kind, "created": _ts(), "attempts": 0, "next_at": 0})
+            return path
+
+    def spawn_drainer(self) -> None:
+        """Start a detached drainer (a no-op one if another is already running)."""
+
+        self.spool.mkdir(parents=True, exist_ok=True)
+        cmd = [sys.executable, str(Path(__file__).resolve()), "--drain", "--spool", str(self.spool), "--min-interval", str(self.min_interval_s)]
+        with (self.spool / "drain.log").open("ab") as log:
+            subprocess.Popen(cmd, stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL, stderr=log, start_new_session=True, cwd=str(CLAWD if CLAWD.exists() else self.spool))
+
+    # -- drainer ------------------------------------------------------------
+
+    def _backoff(self, attempts: int, error: str) -> float:
+        m = _RETRY_AFTER_RE.search(error)
+        if m:
+            return float(m.group(1)) + 1
+        return min(RETRY_CAP_S, RETRY_BASE_S * (2 ** max(0, attempts - 1)))
+
+    def _take(self) -> Tuple[Optional[Path], Optional[Dict[str, Any]], Optional[float]]:
+        """Claim the oldest message if it is due, else report how long until it is.
+
+        Strictly oldest first: a message waiting on a retry holds back the
+        ones behind it, so digests never arrive out of order.
+        """
+
+        with self._locked():
+            queued = self._queued()
+            if not queued:
+                return None, None, None
+            path, msg = queued[0]
+            wait = float(msg.get("next_at") or 0) - time.time()
+            if wait > 0:
+                return None, None, wait
+            inflight = path.with_suffix(".inflight")
+            os.replace(path, inflight)
+            return inflight, msg, None
+
+    def _settle(self, inflight: Path, msg: Dict[str, Any], error: Optional[str]) -> None:
+        with self._locked():
+            if error is None:
+                inflight.unlink()
+                state = self._state()
+                state.update({"last_sent_at": time.time(), "sent": int(state.get("sent") or 0) + 1})
+                self._write(self.state_path, state)
+                return
+            msg["attempts"] = int(msg.get("attempts") or 0) + 1
+            msg["last_error"] = error[:500]
+            if msg["attempts"] >= self.max_attempts:
+                self.dead.mkdir(exist_ok=True)
+                self._write(self.dead / inflight.with_suffix(".json").name, msg)
+                inflight.unlink()
+                return
+            msg["next_at"] = time.time() + self._backoff(msg["attempts"], error)
+            self._write(inflight, msg)
+            os.replace(inflight, inflight.with_suffix(".json"))
+
+    def drain(self, send=send_telegram) -> int:
+        """Send until the spool is empty, pacing and retrying; returns messages sent (-1 if another drainer runs).
+
+        Every message ends up sent or in dead/ (after max_attempts), so this
+        returns once the last backoff has played out.
+        """
+
+        with self._locked(".drain.lock", block=False) as mine:
+            if not mine:
+                return -1
+            # A drainer that died mid-send left its message in flight.
+            for inflight in self.spool.glob("*.inflight"):
+                os.replace(inflight, inflight.with_suffix(".json"))
+            sent = 0
+            while True:
+                inflight, msg, wait = self._take()
+                if inflight is None:
+                    if wait is None:
+                        return sent
+                    # Wake up now and then: a message may have been
+                    # superseded or requeued while we wait.
+                    time.sleep(min(max(0.0, wait), RECHECK_S))
+                    continue
+                gap = float(self._state().get("last_sent_at") or 0) + self.min_interval_s - time.time()
+                if gap > 0:
+                    time.sleep(gap)
+                try:
+                    send(msg["text"])
+                    error = None
+                except Exception as exc:
+                    error = str(exc) or exc.__class__.__name__
+                    print(f"{_ts()} send failed (attempt {int(msg.get('attempts') or 0) + 1}): {error}", file=sys.stderr)
+                self._settle(inflight, msg, error)
+                if error is None:
+                    sent += 1
+
+    # -- inspection ---------------------------------------------------------
+
+    def requeue_dead(self) -> int:
+        n = 0
+        with self._locked():
+            for path in sorted(self.dead.glob("*.json")) if self.dead.exists() else []:
+                msg = self._read(path) or {}
+                msg.update({"attempts": 0, "next_at": 0})
+                self._write(self.spool / path.name, msg)
+                path.unlink()
+                n += 1
+        return n
+
+    def status(self) -> Dict[str, Any]:
+        queued = self._queued() if self.spool.exists() else []
+        state = self._state()
+        return {
+            "spool": str(self.spool),
+            "queued": len(queued),
+            "retrying": sum(1 for _, m in queued if int(m.get("attempts") or 0) > 0),
+            "inflight": len(list(self.spool.glob("*.inflight"))) if self.spool.exists() else 0,
+            "dead": len(list(self.dead.glob("*.json"))) if self.dead.exists() else 0,
+            "sent": int(state.get("sent") or 0),
+            "last_sent_at": state.get("last_sent_at"),
+        }
+
+
+def main() -> int:
+    ap = argparse.ArgumentParser(description="Spooled Telegram outbox for overnight_builder")
+    ap.add_argument("--spool", default=str(DEFAULT_SPOOL_DIR))
+    ap.add_argument("--status", action="store_true")
+    ap.add_argument("--drain", action="store_true", help="Send queued messages, waiting out retries, until the spool is empty")
+    ap.add_argument("--send", metavar="TEXT", help="Enqueue a message and spawn a drainer")
+    ap.add_argument("--requeue-dead", action="store_true", help="Give dead messages another max_attempts")
+    ap.add_argument("--min-interval", type=float, default=MIN_INTERVAL_S, help=f"Seconds between sends (default {MIN_INTERVAL_S:g})")
+    ap.add_argument("--json", action="store_true")
+    args = ap.parse_args()
+
+    box = Outbox(Path(args.spool).expanduser(), min_interval_s=max(0.0, args.min_interval))
+    if args.requeue_dead:
+        print(f"Requeued {box.requeue_dead()} message(s).")
+    if args.send:
+        box.enqueue(args.send)
+        box.spawn_drainer()
+        return 0
+    if args.drain:
+        sent = box.drain()
+        if sent >= 0:
+            print(f"{_ts()} drained: {sent} sent", file=sys.stderr)
+        return 0
+    st = box.status()
+    if args.json:
+        print(json.dumps(st, indent=2))
+        return 0
+    last = datetime.fromtimestamp(st["last_sent_at"], timezone.utc).isoformat() if st["last_sent_at"] else "never"
+    print(f"{st['spool']}: {st['queued']} queued ({st['retrying']} retrying), {st['inflight']} in flight, {st['dead']} dead; {st['sent']} sent, last {last}")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
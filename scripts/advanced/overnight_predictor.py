@@ -0,0 +1,392 @@
+#!/usr/bin/env python3
+"""overnight_predictor.py — duration / token-cost predictor for overnight tasks.
+
+Learns from past runs of both overnight runners:
+  - task_start/task_end events in state/overnight_progress.jsonl (+ rotated
+    segments in state/overnight_progress_segments/)  — overnight_queue.py
+  - run entries in state/overnight_build_results/ — overnight_builder.py
+
+Features per sample: task id, task type, model, spec size, repo and the words
+of the task name/tags/spec. A prediction weights every stored sample by its
+similarity to the task and reports weighted p50/p90 duration and tokens plus a
+0..1 confidence.
+
+Refits are incremental: the model file (state/overnight_predictor.json) keeps
+a watermark into each source and only new events are read.
+
+Usage:
+  python3 scripts/advanced/overnight_predictor.py --refit
+  python3 scripts/advanced/overnight_predictor.py --refit --full
+  python3 scripts/advanced/overnight_predictor.py --queue          # predict every queued task/item
+  python3 scripts/advanced/overnight_predictor.py --task '{"id": "OB-7", "type": "codex", "spec": "..."}'
+  python3 scripts/advanced/overnight_predictor.py --queue --json
+
+Library:
+  from overnight_predictor import Predictor
+  p = Predictor.load(); p.refit(); p.predict(task).p90_s
+"""
+
+from __future__ import annotations
+
+import argparse
+import gzip
+import json
+import math
+import os
+import re
+import sys
+from dataclasses import asdict, dataclass
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+try:
+    import overnight_results
+except Exception:  # pragma: no cover
+    overnight_results = None  # type: ignore
+
+CLAWD = Path(os.environ.get("OPENCLAW_WORKSPACE", str(Path.home() / ".openclaw" / "workspace")))
+STATE_DIR = CLAWD / "state"
+MODEL_PATH = STATE_DIR / "overnight_predictor.json"
+PROGRESS_PATH = STATE_DIR / "overnight_progress.jsonl"
+PROGRESS_META_PATH = STATE_DIR / "overnight_progress.meta.json"
+PROGRESS_SEGMENTS_DIR = STATE_DIR / "overnight_progress_segments"
+RESULTS_PATH = STATE_DIR / "overnight_build_results"
+QUEUE_PATH = STATE_DIR / "overnight_queue.json"
+
+MAX_SAMPLES = 5000
+MAX_PENDING_STARTS = 500
+TOP_K = 25
+
+_WORD_RE = re.compile(r"[a-z0-9]{3,}")
+_STOPWORDS = {"the", "and", "for", "with", "that", "this", "from", "into", "add", "run", "use"}
+
+
+def _load_json(path: Path) -> Optional[Dict[str, Any]]:
+    if not path.exists():
+        return None
+    try:
+        data = json.loads(path.read_text(encoding="utf-8"))
+        return data if isinstance(data, dict) else None
+    except (OSError, json.JSONDecodeError):
+        return None
+
+
+def _save_json(path: Path, data: Dict[str, Any]) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_suffix(".tmp")
+    tmp.write_text(json.dumps(data, ensure_ascii=False) + "\n", encoding="utf-8")
+    os.replace(tmp, path)
+
+
+def extract_usage_tokens(data: Any) -> Optional[int]:
+    """Find a total token count in an `openclaw agent --json` payload.
+
+    The payload layout varies between OpenClaw versions, so this looks for the
+    first `usage`-like dict anywhere in it. Returns None if nothing is found.
+    """
+
+    stack = [data]
+    while stack:
+        cur = stack.pop()
+        if isinstance(cur, dict):
+            for key in ("total_tokens", "totalTokens"):
+                if isinstance(cur.get(key), (int, float)):
+                    return int(cur[key])
+            inp = cur.get("input_tokens", cur.get("inputTokens", cur.get("input")))
+            out = cur.get("output_tokens", cur.get("outputTokens", cur.get("output")))
+            if isinstance(inp, (int, float)) and isinstance(out, (int, float)):
+                return int(inp) + int(out)
+            stack.extend(cur.values())
+        elif isinstance(cur, list):
+            stack.extend(cur)
+    return None
+
+
+def spec_size(task: Dict[str, Any]) -> int:
+    """Spec length in bytes: the file size if `spec` names a file, else its text length."""
+
+    spec = task.get("spec")
+    if not spec:
+        return 0
+    spec = str(spec)
+    if "\n" not in spec and len(spec) < 400:
+        p = Path(spec).expanduser() if spec.startswith(("/", "~")) else CLAWD / spec
+        try:
+            if p.is_file():
+                return p.stat().st_size
+        except OSError:
+            pass
+    return len(spec.encode("utf-8"))
+
+
+def task_words(task: Dict[str, Any]) -> List[str]:
+    parts = [str(task.get("name") or ""), str(task.get("id") or "")]
+    tags = task.get("tags")
+    if isinstance(tags, list):
+        parts.extend(str(t) for t in tags)
+    spec = str(task.get("spec") or "")
+    parts.append(spec[:400])
+    words = {w for w in _WORD_RE.findall(" ".join(parts).lower()) if w not in _STOPWORDS}
+    return sorted(words)[:40]
+
+
+def features(task: Dict[str, Any], *, model: Optional[str] = None) -> Dict[str, Any]:
+    ttype = str(task.get("type") or "").lower()
+    return {
+        "id": str(task.get("id") or ""),
+        "type": ttype,
+        "model": str(task.get("model") or model or ttype),
+        "repo": str(task.get("repo") or "workspace"),
+        "spec": spec_size(task),
+        "words": task_words(task),
+    }
+
+
+@dataclass
+class Prediction:
+    p50_s: Optional[float]
+    p90_s: Optional[float]
+    p50_tokens: Optional[int]
+    p90_tokens: Optional[int]
+    confidence: float
+    samples: int
+
+
+def _weighted_quantile(pairs: List[Tuple[float, float]], q: float) -> Optional[float]:
+    if not pairs:
+        return None
+    pairs = sorted(pairs)
+    total = sum(w for _, w in pairs)
+    acc = 0.0
+    for v, w in pairs:
+        acc += w
+        if acc >= q * total:
+            return v
+    return pairs[-1][0]
+
+
+def similarity(a: Dict[str, Any], b: Dict[str, Any]) -> float:
+    """0..1 similarity between two feature dicts."""
+
+    if a["id"] and a["id"] == b["id"]:
+        return 1.0
+    score = 0.0
+    score += 0.25 if a["type"] == b["type"] else 0.0
+    score += 0.15 if a["model"] == b["model"] else 0.0
+    score += 0.15 if a["repo"] == b["repo"] else 0.0
+    sa, sb = a["spec"], b["spec"]
+    if sa and sb:
+        score += 0.15 * max(0.0, 1.0 - abs(math.log2(sa) - math.log2(sb)) / 4.0)
+    elif not sa and not sb:
+        score += 0.15
+    wa, wb = set(a["words"]), set(b["words"])
+    if wa and wb:
+        score += 0.3 * len(wa & wb) / len(wa | wb)
+    return score
+
+
+class Predictor:
+    def __init__(self, state: Optional[Dict[str, Any]] = None) -> None:
+        state = state or {}
+        self.samples: List[Dict[str, Any]] = list(state.get("samples") or [])
+        self.progress_mark: Dict[str, int] = dict(state.get("progress_mark") or {"gen": 0, "off": 0})
+        self.results_mark: str = str(state.get("results_mark") or "")
+        self.pending_starts: Dict[str, Dict[str, Any]] = dict(state.get("pending_starts") or {})
+
+    @classmethod
+    def load(cls, path: Path = MODEL_PATH) -> "Predictor":
+        return cls(_load_json(path))
+
+    def save(self, path: Path = MODEL_PATH) -> None:
+        _save_json(path, {
+            "samples": self.samples[-MAX_SAMPLES:],
+            "progress_mark": self.progress_mark,
+            "results_mark": self.results_mark,
+            "pending_starts": dict(list(self.pending_starts.items())[-MAX_PENDING_STARTS:]),
+        })
+
+    # -- training ---------------------------------------------------------
+
+    def add_sample(self, feats: Dict[str, Any], duration_s: float, tokens: Optional[int], source: str) -> None:
+        sample = dict(feats)
+        sample.update({"dur": round(float(duration_s), 2), "tok": tokens, "src": source})
+        self.samples.append(sample)
+        if len(self.samples) > MAX_SAMPLES:
+            del self.samples[: len(self.samples) - MAX_SAMPLES]
+
+    def _progress_chunks(self) -> Iterable[Tuple[int, int, Iterable[bytes]]]:
+        """Yield (generation, start_offset, lines) for journal data past the watermark."""
+
+        meta = _load_json(PROGRESS_META_PATH) or {}
+        current = int(meta.get("generation") or 0)
+        gen, off = int(self.progress_mark.get("gen", 0)), int(self.progress_mark.get("off", 0))
+        while gen < current:
+            seg = PROGRESS_SEGMENTS_DIR / f"overnight_progress.{gen:06d}.jsonl.gz"
+            if seg.exists():
+                with gzip.open(seg, "rb") as f:
+                    f.seek(off)
+                    yield gen, off, list(f)
+            gen, off = gen + 1, 0
+        if PROGRESS_PATH.exists():
+            if PROGRESS_PATH.stat().st_size < off:
+                off = 0
+            with PROGRESS_PATH.open("rb") as f:
+                f.seek(off)
+                yield gen, off, list(f)
+
+    def _refit_progress(self) -> int:
+        added = 0
+        for gen, off, lines in self._progress_chunks():
+            for raw in lines:
+                if not raw.endswith(b"\n"):
+                    # Torn write at the tail; pick it up next time.
+                    break
+                off += len(raw)
+                try:
+                    ev = json.loads(raw)
+                except ValueError:
+                    continue
+                if not isinstance(ev, dict):
+                    continue
+                kind = ev.get("event")
+                if kind == "task_start" and isinstance(ev.get("task"), dict):
+                    key = f"{ev.get('run_id')}|{ev['task'].get('id')}"
+                    self.pending_starts[key] = features(ev["task"])
+                elif kind == "task_end":
+                    key = f"{ev.get('run_id')}|{ev.get('task_id')}"
+                    feats = self.pending_starts.pop(key, None)
+                    if feats is None or not ev.get("ok") or ev.get("cache") == "hit":
+                        continue
+                    if isinstance(ev.get("duration_s"), (int, float)):
+                        self.add_sample(feats, ev["duration_s"], ev.get("tokens"), "queue")
+                        added += 1
+            self.progress_mark = {"gen": gen, "off": off}
+        return added
+
+    def _refit_results(self) -> int:
+        if overnight_results is not None:
+            # Segments that finished before the watermark are skipped unread.
+            store = overnight_results.ResultsStore(RESULTS_PATH)
+            return self._refit_result_entries(store.iter_entries(finished_after=self.results_mark))
+        data = _load_json(RESULTS_PATH.with_suffix(".json")) or {}
+        runs = data.get("runs") if isinstance(data.get("runs"), list) else []
+        return self._refit_result_entries(runs)
+
+    def _refit_result_entries(self, runs: Iterable[Dict[str, Any]]) -> int:
+        added = 0
+        mark = self.results_mark
+        for r in runs:
+            if not isinstance(r, dict):
+                continue
+            finished = str(r.get("finished_at") or "")
+            if not finished or finished <= self.results_mark:
+                continue
+            mark = max(mark, finished)
+            if r.get("status") != "success" or not isinstance(r.get("duration_seconds"), (int, float)):
+                continue
+            task = r.get("task") if isinstance(r.get("task"), dict) else {}
+            self.add_sample(features(task, model=r.get("model") or r.get("agent")), r["duration_seconds"], r.get("tokens"), "builder")
+            added += 1
+        self.results_mark = mark
+        return added
+
+    def refit(self, *, full: bool = False) -> int:
+        """Fold new history into the model. Returns the number of samples added."""
+
+        if full:
+            self.__init__()
+        return self._refit_progress() + self._refit_results()
+
+    # -- inference --------------------------------------------------------
+
+    def predict(self, task: Dict[str, Any], *, model: Optional[str] = None) -> Prediction:
+        f = features(task, model=model)
+        scored = [(similarity(f, s), s) for s in self.samples]
+        scored = [x for x in scored if x[0] > 0.2]
+        scored.sort(key=lambda x: x[0], reverse=True)
+        top = scored[:TOP_K]
+        if not top:
+            return Prediction(None, None, None, None, 0.0, 0)
+
+        durs = [(float(s["dur"]), w) for w, s in top]
+        toks = [(float(s["tok"]), w) for w, s in top if isinstance(s.get("tok"), (int, float))]
+        p50_t = _weighted_quantile(toks, 0.5)
+        p90_t = _weighted_quantile(toks, 0.9)
+
+        # Confidence grows with how similar the neighbours are and how many
+        # of them there are (saturating around 10 good matches).
+        weight = sum(w for w, _ in top)
+        confidence = min(1.0, weight / 10.0) * (top[0][0] ** 0.5)
+        return Prediction(
+            p50_s=round(_weighted_quantile(durs, 0.5), 1),
+            p90_s=round(_weighted_quantile(durs, 0.9), 1),
+            p50_tokens=int(p50_t) if p50_t is not None else None,
+            p90_tokens=int(p90_t) if p90_t is not None else None,
+            confidence=round(confidence, 2),
+            samples=len(top),
+        )
+
+
+def load_fitted() -> Predictor:
+    """Load the saved model, fold in anything new and persist the watermark."""
+
+    p = Predictor.load()
+    if p.refit():
+        p.save()
+    return p
+
+
+def _queued_tasks() -> List[Dict[str, Any]]:
+    q = _load_json(QUEUE_PATH) or {}
+    out: List[Dict[str, Any]] = []
+    for key in ("tasks", "items"):
+        if isinstance(q.get(key), list):
+            out.extend(t for t in q[key] if isinstance(t, dict))
+    return out
+
+
+def main() -> int:
+    ap = argparse.ArgumentParser(description="Predict overnight task duration and token cost from history")
+    ap.add_argument("--refit", action="store_true", help="Fold new history into the saved model")
+    ap.add_argument("--full", action="store_true", help="With --refit: rebuild from scratch")
+    ap.add_argument("--queue", action="store_true", help="Predict every task in state/overnight_queue.json")
+    ap.add_argument("--task", help="Predict a single task given as JSON")
+    ap.add_argument("--json", action="store_true", help="Output JSON")
+    args = ap.parse_args()
+
+    p = Predictor.load()
+    added = p.refit(full=args.full)
+    p.save()
+    if args.refit and not (args.queue or args.task):
+        print(f"Model has {len(p.samples)} samples (+{added}).")
+        return 0
+
+    tasks: List[Dict[str, Any]] = []
+    if args.task:
+        try:
+            tasks.append(json.loads(args.task))
+        except json.JSONDecodeError as exc:
+            print(f"--task is not valid JSON: {exc}", file=sys.stderr)
+            return 2
+    if args.queue:
+        tasks.extend(_queued_tasks())
+    if not tasks:
+        ap.print_help()
+        return 0
+
+    preds = [(t, p.predict(t)) for t in tasks]
+    if args.json:
+        print(json.dumps([{"id": t.get("id"), **asdict(pr)} for t, pr in preds], indent=2))
+        return 0
+
+    def fmt(v: Optional[float]) -> str:
+        return "?" if v is None else f"{v / 60:.1f}m"
+
+    for t, pr in preds:
+        tok = "" if pr.p50_tokens is None else f" tokens p50={pr.p50_tokens} p90={pr.p90_tokens}"
+        print(f"{t.get('id', '(no-id)')}: p50={fmt(pr.p50_s)} p90={fmt(pr.p90_s)}{tok} conf={pr.confidence} n={pr.samples}")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
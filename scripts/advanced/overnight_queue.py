@@ -9,11 +9,73 @@ Task types:
   - opus:  run an OpenClaw agent turn (planning/research)
   - local: run a local command (array) or python script
 
-Progress is appended to state/overnight_progress.jsonl.
+Progress is appended to state/overnight_progress.jsonl, which rotates into
+gzipped segments under state/overnight_progress_segments/ by size and age. A
+sidecar index (state/overnight_progress.index.jsonl) maps run and task ids to
+byte offsets and rotates with the journal into per-segment shards, so --report
+reads only the live index and the shards whose runs, tasks or dates match.
+Task stdout/stderr is streamed to state/overnight_logs/<run>/<task>.{stdout,
+stderr}.log (gzipped when the task finishes); only a bounded head/tail is kept
+in memory.
 
 Usage:
   python3 scripts/overnight_queue.py
   python3 scripts/overnight_queue.py --dry-run
+  python3 scripts/overnight_queue.py --follow <task-id>
+  python3 scripts/overnight_queue.py --resume [RUN_ID]
+  python3 scripts/overnight_queue.py --worker
+  python3 scripts/overnight_queue.py --report [--run ID | --task ID | --since DATE]
+
+Task selection: by default a knapsack planner picks the most valuable subset
+of tasks whose estimated durations (history median, else overnight_predictor.py,
+else declared `effort` in minutes) and token costs (`est_tokens`) fit the remaining window and budget,
+and re-plans after every completion. Set config `"planner": "greedy"` for the
+plain score_task order.
+
+At stop_hour a window supervisor preempts running tasks: agent sessions get a
+"wrap up and commit now" nudge, process groups get SIGTERM and, after the
+configured grace, SIGKILL. Interrupted tasks are recorded in
+state/overnight_preempted.json and run first on the next night.
+
+Each task's CPU time, max RSS, block I/O and context switches are recorded in
+task_end (`rusage`) and summarized in run_end (`resources`). Optional caps:
+per-task `cpu_seconds` / `memory_mb` (or config default_cpu_seconds /
+default_memory_mb) become RLIMIT_CPU / RLIMIT_AS for the task process.
+
+With --worker, several hosts share one night's queue through a SQLite lease
+store (config lease_db, see overnight_leases.py): each task is claimed
+atomically with a lease renewed by a heartbeat, tasks held by live leases
+elsewhere are skipped, and tasks whose lease lapses (dead worker) are picked
+up again by the remaining workers.
+
+Agent tasks run in per-lane sessions (<session>-laneN, or <session>-chain-<name>
+for tasks sharing a `lane` name) instead of one shared session. A lane rotates
+to a fresh session once its turns have used lane_token_budget tokens, carrying
+over a short summary of its last few tasks.
+
+Spec files are read once per run (cached by mtime), trimmed by markdown
+section to spec_max_tokens, and inlined only once per lane session; later
+tasks in the lane refer back to them. Savings are reported in run_end
+(`prompts`).
+
+Small agent tasks (estimate <= batch_max_minutes, same type and repo) are
+micro-batched into one agent turn with a structured multi-task prompt; the
+reply's trailing {"results": [...]} object is split back into per-task
+task_end events. Batched logs are named after the batch (batch-<id>+N).
+
+Tasks are grouped into projects (`project`, else `repo`). With fair_share on,
+each project with pending work holds at most its share of the parallel slots
+(project_weights, default 1) and the least-served project dispatches next, so
+one busy repo cannot take the whole night. Priority aging raises a task's
+value by priority_aging_per_day per day since it was first queued
+(state/overnight_task_ages.json) up to priority_aging_max. run_end reports
+per-project throughput and wait times (`projects`).
+
+Local tasks may opt into a result cache with `"cache": true` and an optional
+`"inputs": ["glob", ...]` list (relative to the workspace, or absolute / `~/`).
+The cache key covers the command, the hashed
+contents of the matched input files and the git HEAD; a hit marks the task ok
+from the cached output without executing it.
 
 Notes:
 - Safety: this runner refuses tasks that look like production deploys unless
@@ -24,27 +86,122 @@ from __future__ import annotations
 
 import argparse
 import asyncio
+import glob
+import gzip
+import hashlib
 import json
+import math
 import os
+import re
 import shlex
+import shutil
+import signal
 import subprocess
 import sys
 import time
-from dataclasses import dataclass
-from datetime import datetime, timezone
+from dataclasses import dataclass, field, replace
+from datetime import datetime, timedelta, timezone
 from pathlib import Path
-from typing import Any, Dict, List, Optional, Tuple
+from typing import Any, Dict, List, Optional, Set, Tuple
 
 try:
     from zoneinfo import ZoneInfo
 except Exception:  # pragma: no cover
     ZoneInfo = None  # type: ignore
 
-CLAWD = Path.home() / ".openclaw" / "workspace"
+try:
+    import overnight_predictor
+except Exception:  # pragma: no cover
+    overnight_predictor = None  # type: ignore
+
+try:
+    import overnight_leases
+except Exception:  # pragma: no cover
+    overnight_leases = None  # type: ignore
+
+CLAWD = Path(os.environ.get("OPENCLAW_WORKSPACE", str(Path.home() / ".openclaw" / "workspace")))
 STATE_DIR = CLAWD / "state"
 QUEUE_PATH = STATE_DIR / "overnight_queue.json"
 PROGRESS_PATH = STATE_DIR / "overnight_progress.jsonl"
 RUN_STATE_PATH = STATE_DIR / "overnight_run.json"
+LOG_DIR = STATE_DIR / "overnight_logs"
+PREEMPTED_PATH = STATE_DIR / "overnight_preempted.json"
+PROGRESS_INDEX_PATH = STATE_DIR / "overnight_progress.index.jsonl"
+PROGRESS_META_PATH = STATE_DIR / "overnight_progress.meta.json"
+PROGRESS_SEGMENTS_DIR = STATE_DIR / "overnight_progress_segments"
+# Recorded in the meta so a later index layout can be told apart.
+PROGRESS_INDEX_VERSION = 1
+CACHE_DIR = STATE_DIR / "overnight_cache"
+TASK_AGES_PATH = STATE_DIR / "overnight_task_ages.json"
+
+# Wall clock for the run window, timestamps and scheduling. overnight_sim.py
+# swaps in a virtual clock; task executors always measure real time.
+CLOCK = time.time
+
+
+def use_state_dir(state_dir: Path) -> None:
+    """Point the queue, journal, logs and caches at state_dir (overnight_sim.py)."""
+
+    global STATE_DIR, QUEUE_PATH, PROGRESS_PATH, RUN_STATE_PATH, LOG_DIR, PREEMPTED_PATH
+    global PROGRESS_INDEX_PATH, PROGRESS_META_PATH, PROGRESS_SEGMENTS_DIR, CACHE_DIR, TASK_AGES_PATH
+    STATE_DIR = state_dir
+    QUEUE_PATH = STATE_DIR / "overnight_queue.json"
+    PROGRESS_PATH = STATE_DIR / "overnight_progress.jsonl"
+    RUN_STATE_PATH = STATE_DIR / "overnight_run.json"
+    LOG_DIR = STATE_DIR / "overnight_logs"
+    PREEMPTED_PATH = STATE_DIR / "overnight_preempted.json"
+    PROGRESS_INDEX_PATH = STATE_DIR / "overnight_progress.index.jsonl"
+    PROGRESS_META_PATH = STATE_DIR / "overnight_progress.meta.json"
+    PROGRESS_SEGMENTS_DIR = STATE_DIR / "overnight_progress_segments"
+    CACHE_DIR = STATE_DIR / "overnight_cache"
+    TASK_AGES_PATH = STATE_DIR / "overnight_task_ages.json"
+    _forget_progress_meta()
+
+# Process group leaders of running tasks, keyed by task id (for preemption).
+RUNNING_PROCS: Dict[str, asyncio.subprocess.Process] = {}
+
+# Read size for streamed subprocess output.
+STREAM_CHUNK_BYTES = 64 * 1024
+# Largest agent --json stdout we will re-read from disk to extract the reply.
+AGENT_JSON_MAX_BYTES = 8 * 1024 * 1024
+
+# Every task command runs under this tiny wrapper so we get the child's own
+# rusage (asyncio reaps the direct child itself, so os.wait4 is not available
+# to us) and can apply optional rlimits before exec. The wrapper ignores
+# SIGTERM/SIGINT so a graceful stop reaches the real task first; the whole
+# process group is killed on timeout.
+RUSAGE_SHIM = r"""
+import json, os, resource, signal, sys
+out, limits, cmd = sys.argv[1], json.loads(sys.argv[2]), sys.argv[3:]
+pid = os.fork()
+if pid == 0:
+    try:
+        if limits.get("cpu_seconds"):
+            s = int(limits["cpu_seconds"])
+            resource.setrlimit(resource.RLIMIT_CPU, (s, s + 5))
+        if limits.get("memory_mb"):
+            b = int(limits["memory_mb"]) * 1024 * 1024
+            try:
+                resource.setrlimit(resource.RLIMIT_AS, (b, b))
+            except (ValueError, OSError):
+                pass
+        os.execvp(cmd[0], cmd)
+    except BaseException as e:
+        sys.stderr.write("overnight_queue: cannot run %s: %s\n" % (cmd[0], e))
+        sys.stderr.flush()
+        os._exit(127)
+signal.signal(signal.SIGTERM, signal.SIG_IGN)
+signal.signal(signal.SIGINT, signal.SIG_IGN)
+_, status, ru = os.wait4(pid, 0)
+rss_kb = ru.ru_maxrss // 1024 if sys.platform == "darwin" else ru.ru_maxrss
+with open(out, "w") as f:
+    json.dump({
+        "user_s": round(ru.ru_utime, 3), "sys_s": round(ru.ru_stime, 3),
+        "max_rss_kb": rss_kb, "inblock": ru.ru_inblock, "oublock": ru.ru_oublock,
+        "nvcsw": ru.ru_nvcsw, "nivcsw": ru.ru_nivcsw,
+    }, f)
+sys.exit(os.waitstatus_to_exitcode(status) if os.WIFEXITED(status) else 128 + os.WTERMSIG(status))
+"""
 
 DEFAULT_CONFIG = {
     "start_hour": 22,
@@ -53,16 +210,105 @@ DEFAULT_CONFIG = {
     "timezone": "America/New_York",
     "max_tokens": 120_000,
     "agent_id": "main",
+    # Bytes of stdout/stderr kept in memory per stream (head + tail) for task_end.
+    "log_head_bytes": 4000,
+    "log_tail_bytes": 4000,
+    "compress_logs": True,
+    # Optional per-task caps (tasks override with cpu_seconds / memory_mb).
+    "default_cpu_seconds": None,
+    "default_memory_mb": None,
+    # Rotate overnight_progress.jsonl at the next run_start once either limit is hit.
+    "progress_rotate_bytes": 16 * 1024 * 1024,
+    "progress_rotate_days": 7,
+    # Result cache for local tasks that opt in with "cache": true (LRU by total size).
+    "cache_max_bytes": 64 * 1024 * 1024,
+    # AIMD concurrency: start at max_parallel, grow by 1 per healthy round up to
+    # adaptive_max_parallel, halve on timeouts / rate limits / high load.
+    "adaptive_parallel": False,
+    "min_parallel": 1,
+    "adaptive_max_parallel": 6,
+    "aimd_decrease_factor": 0.5,
+    "aimd_max_error_rate": 0.25,
+    "aimd_slow_fraction": 0.8,
+    "aimd_max_load_per_cpu": 1.5,
+    # Task selection: "knapsack" picks the most valuable subset that fits the
+    # remaining window and token budget (re-planned after every completion);
+    # "greedy" keeps the old score_task order.
+    "planner": "knapsack",
+    "plan_bucket_minutes": 5,
+    "plan_token_bucket": 5000,
+    # Fallback estimates when a task has no history and no declared effort/est_tokens.
+    "default_local_minutes": 5,
+    "default_agent_minutes": 20,
+    "default_local_tokens": 0,
+    "default_agent_tokens": 15_000,
+    # Per-lane agent sessions rotate to a fresh session once their turns have
+    # used this many tokens; the new session gets a summary of the last
+    # lane_carry_tasks tasks.
+    "lane_token_budget": 60_000,
+    "lane_carry_tasks": 3,
+    # Specs larger than this (estimated tokens) are trimmed by section.
+    "spec_max_tokens": 6000,
+    # Fair share: tasks are grouped by `project` (else `repo`). While several
+    # projects have work, each holds at most its weighted share of the
+    # parallel slots and the least-served project (per weight) goes next.
+    "fair_share": True,
+    "project_weights": {},
+    # Priority aging: a task's value/score grows by this fraction per day
+    # since it was first queued (`added`, else first seen), capped at
+    # priority_aging_max times.
+    "priority_aging_per_day": 0.1,
+    "priority_aging_max": 5.0,
+    # --worker mode: shared SQLite lease store (default state/overnight_leases.sqlite).
+    # Leases last lease_seconds and are renewed every lease_heartbeat_seconds;
+    # a lapsed lease requeues the task, up to lease_max_attempts claims.
+    "lease_db": None,
+    "lease_seconds": 300,
+    "lease_heartbeat_seconds": 60,
+    "lease_max_attempts": 3,
+    "lease_poll_seconds": 30,
+    # Use overnight_predictor.py estimates when at least this confident (0..1).
+    "predictor_min_confidence": 0.3,
+    # Stop-window preemption: at stop_hour agent tasks get a wrap-up nudge and
+    # local tasks SIGTERM; agents get SIGTERM after stop_grace_seconds; anything
+    # still alive stop_kill_after_seconds later is SIGKILLed (process group).
+    "stop_grace_seconds": 120,
+    "stop_kill_after_seconds": 15,
+    # Tasks interrupted at the stop window are ranked first next run, with
+    # their knapsack value multiplied by this.
+    "preempted_value_boost": 2.0,
+    # Micro-batching: agent tasks estimated at <= batch_max_minutes with the
+    # same type and repo share one agent turn (up to batch_max_tasks). Tasks
+    # opt out with "batch": false.
+    "batch_agent_tasks": True,
+    "batch_max_tasks": 4,
+    "batch_max_minutes": 10,
 }
 
+WRAP_UP_NUDGE = (
+    "OC-014 overnight stop window reached. Wrap up now: finish or revert the "
+    "current edit, commit any completed work with a clear message, and reply "
+    "with a short summary of what is done and what is left."
+)
+
+# Knapsack planner: discretization caps keep a re-plan well under a second.
+PLAN_MAX_TIME_BUCKETS = 240
+PLAN_MAX_TOKEN_BUCKETS = 60
+
+RATE_LIMIT_RE = re.compile(r"rate.?limit|too many requests|\b429\b|quota|overloaded|exhausted", re.IGNORECASE)
+
+
+def utc_now() -> datetime:
+    return datetime.fromtimestamp(CLOCK(), timezone.utc)
+
 
 def now_tz(tz_name: str) -> datetime:
     if ZoneInfo is None:
-        return datetime.now()
+        return datetime.fromtimestamp(CLOCK())
     try:
-        return datetime.now(ZoneInfo(tz_name))
+        return datetime.fromtimestamp(CLOCK(), ZoneInfo(tz_name))
     except Exception:
-        return datetime.now()
+        return datetime.fromtimestamp(CLOCK())
 
 
 def append_jsonl(path: Path, obj: Dict[str, Any]) -> None:
@@ -146,9 +392,271 @@ class TaskResult:
     stderr: str = ""
     duration_s: float = 0.0
     commit_hashes: List[str] = None
+    log_paths: List[str] = None
+    cache: Optional[str] = None  # hit|miss for cacheable local tasks
+    timed_out: bool = False
+    tokens: Optional[int] = None
+    rusage: Optional[Dict[str, Any]] = None
+    interrupted: bool = False
+
+
+class HeadTailBuffer:
+    """Keep the first `head` and last `tail` bytes of a stream.
+
+    Memory stays bounded no matter how chatty the task is; the full output
+    lives in the per-task log file.
+    """
+
+    def __init__(self, head: int, tail: int) -> None:
+        self.head_limit = max(0, int(head))
+        self.tail_limit = max(0, int(tail))
+        self.head = bytearray()
+        self.tail = bytearray()
+        self.total = 0
+
+    def feed(self, chunk: bytes) -> None:
+        self.total += len(chunk)
+        room = self.head_limit - len(self.head)
+        if room > 0:
+            self.head += chunk[:room]
+            chunk = chunk[room:]
+        if chunk and self.tail_limit:
+            self.tail += chunk
+            if len(self.tail) > self.tail_limit:
+                del self.tail[: len(self.tail) - self.tail_limit]
+
+    @property
+    def truncated(self) -> bool:
+        return self.total > len(self.head) + len(self.tail)
+
+    def text(self, log_path: Optional[Path] = None) -> str:
+        head = self.head.decode("utf-8", errors="replace")
+        tail = self.tail.decode("utf-8", errors="replace")
+        if not self.truncated:
+            return (head + tail).strip()
+        omitted = self.total - len(self.head) - len(self.tail)
+        where = f"; full log: {log_path}" if log_path else ""
+        return f"{head}\n... [{omitted} bytes omitted{where}] ...\n{tail}".strip()
+
+
+def safe_name(s: str) -> str:
+    return re.sub(r"[^A-Za-z0-9._-]+", "_", s).strip("_") or "task"
+
+
+def task_log_paths(log_dir: Path, task_id: str) -> Tuple[Path, Path]:
+    stem = safe_name(task_id)
+    return log_dir / f"{stem}.stdout.log", log_dir / f"{stem}.stderr.log"
+
+
+def gzip_file(path: Path) -> Path:
+    """Compress `path` to `path.gz` and remove the original."""
+
+    gz = path.with_name(path.name + ".gz")
+    with path.open("rb") as src, gzip.open(gz, "wb") as dst:
+        shutil.copyfileobj(src, dst)
+    path.unlink()
+    return gz
+
+
+async def pump_stream(stream: asyncio.StreamReader, log_path: Path, buf: HeadTailBuffer) -> None:
+    with log_path.open("ab") as f:
+        while True:
+            chunk = await stream.read(STREAM_CHUNK_BYTES)
+            if not chunk:
+                break
+            f.write(chunk)
+            f.flush()
+            buf.feed(chunk)
+
+
+@dataclass
+class StreamedProcess:
+    returncode: Optional[int]
+    stdout: HeadTailBuffer
+    stderr: HeadTailBuffer
+    stdout_path: Path
+    stderr_path: Path
+    rusage: Optional[Dict[str, Any]] = None
+
+
+def task_limits(task: Dict[str, Any], cfg: Dict[str, Any]) -> Dict[str, Any]:
+    limits: Dict[str, Any] = {}
+    for key, default_key in (("cpu_seconds", "default_cpu_seconds"), ("memory_mb", "default_memory_mb")):
+        val = task.get(key, cfg.get(default_key, DEFAULT_CONFIG[default_key]))
+        if isinstance(val, (int, float)) and val > 0:
+            limits[key] = int(val)
+    return limits
+
+
+async def run_streamed(
+    cmd: List[str],
+    log_dir: Path,
+    task_id: str,
+    cfg: Dict[str, Any],
+    limits: Optional[Dict[str, Any]] = None,
+) -> StreamedProcess:
+    """Run `cmd`, streaming stdout/stderr to per-task log files.
+
+    The command runs in its own process group under RUSAGE_SHIM, which
+    applies `limits` and reports the task's CPU / RSS / I/O usage. If the
+    caller cancels (e.g. task timeout), the whole group is killed and the log
+    files are still finalized.
+    """
+
+    log_dir.mkdir(parents=True, exist_ok=True)
+    out_path, err_path = task_log_paths(log_dir, task_id)
+    rusage_path = out_path.with_name(out_path.name.replace(".stdout.log", ".rusage.json"))
+    head = int(cfg.get("log_head_bytes", DEFAULT_CONFIG["log_head_bytes"]))
+    tail = int(cfg.get("log_tail_bytes", DEFAULT_CONFIG["log_tail_bytes"]))
+    out_buf = HeadTailBuffer(head, tail)
+    err_buf = HeadTailBuffer(head, tail)
+
+    proc = await asyncio.create_subprocess_exec(
+        sys.executable,
+        "-c",
+        RUSAGE_SHIM,
+        str(rusage_path),
+        json.dumps(limits or {}),
+        *cmd,
+        cwd=str(CLAWD),
+        stdout=asyncio.subprocess.PIPE,
+        stderr=asyncio.subprocess.PIPE,
+        start_new_session=True,
+    )
+    RUNNING_PROCS[task_id] = proc
+    try:
+        await asyncio.gather(
+            pump_stream(proc.stdout, out_path, out_buf),
+            pump_stream(proc.stderr, err_path, err_buf),
+        )
+        await proc.wait()
+    finally:
+        if proc.returncode is None:
+            try:
+                os.killpg(proc.pid, signal.SIGKILL)
+            except (ProcessLookupError, PermissionError):
+                pass
+            await asyncio.shield(proc.wait())
+        RUNNING_PROCS.pop(task_id, None)
+
+    rusage = load_json(rusage_path) or None
+    try:
+        rusage_path.unlink()
+    except FileNotFoundError:
+        pass
+    return StreamedProcess(proc.returncode, out_buf, err_buf, out_path, err_path, rusage)
+
+
+def summarize_resources(results: List["TaskResult"]) -> Dict[str, Any]:
+    """Per-run totals and peaks from task rusage, for run_end."""
+
+    measured = [r for r in results if r.rusage]
+    if not measured:
+        return {"tasks_measured": 0}
+    peak = max(measured, key=lambda r: r.rusage.get("max_rss_kb", 0))
+    hog = max(measured, key=lambda r: r.rusage.get("user_s", 0) + r.rusage.get("sys_s", 0))
+    return {
+        "tasks_measured": len(measured),
+        "cpu_user_s": round(sum(r.rusage.get("user_s", 0) for r in measured), 2),
+        "cpu_sys_s": round(sum(r.rusage.get("sys_s", 0) for r in measured), 2),
+        "max_rss_kb": peak.rusage.get("max_rss_kb", 0),
+        "max_rss_task": peak.task_id,
+        "max_cpu_task": hog.task_id,
+        "inblock": sum(r.rusage.get("inblock", 0) for r in measured),
+        "oublock": sum(r.rusage.get("oublock", 0) for r in measured),
+        "nivcsw": sum(r.rusage.get("nivcsw", 0) for r in measured),
+    }
 
 
-async def run_local_task(task: Dict[str, Any], dry_run: bool) -> TaskResult:
+async def finalize_logs(paths: List[Path], cfg: Dict[str, Any]) -> List[str]:
+    """Compress finished task logs (if enabled) and return their final paths."""
+
+    final: List[str] = []
+    for p in paths:
+        if not p.exists():
+            continue
+        if cfg.get("compress_logs", DEFAULT_CONFIG["compress_logs"]):
+            try:
+                p = await asyncio.to_thread(gzip_file, p)
+            except OSError:
+                pass
+        final.append(str(p))
+    return final
+
+
+def hash_file(path: Path) -> str:
+    h = hashlib.sha256()
+    with path.open("rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def cache_key(cmd_str: str, inputs: List[str]) -> str:
+    """Content address for a local task: command + input file hashes + git HEAD."""
+
+    h = hashlib.sha256()
+    h.update(cmd_str.encode("utf-8"))
+    h.update(b"\0" + current_git_head().encode("utf-8"))
+    files = set()
+    for pattern in inputs:
+        expanded = Path(pattern).expanduser()
+        # Path.glob only takes relative patterns; absolute ones (and ~/...)
+        # are globbed from their own anchor.
+        matches = (Path(m) for m in glob.glob(str(expanded), recursive=True)) if expanded.is_absolute() else CLAWD.glob(str(expanded))
+        for p in matches:
+            if p.is_file():
+                files.add(p)
+    for p in sorted(files):
+        name = str(p.relative_to(CLAWD)) if p.is_relative_to(CLAWD) else str(p)
+        h.update(b"\0" + name.encode("utf-8") + b"\0" + hash_file(p).encode("ascii"))
+    return h.hexdigest()
+
+
+def cache_get(key: str) -> Optional[Dict[str, Any]]:
+    path = CACHE_DIR / f"{key}.json"
+    entry = load_json(path)
+    if not entry:
+        return None
+    try:
+        # mtime doubles as the LRU clock.
+        os.utime(path, None)
+    except OSError:
+        pass
+    return entry
+
+
+def cache_put(key: str, entry: Dict[str, Any], max_bytes: int) -> None:
+    CACHE_DIR.mkdir(parents=True, exist_ok=True)
+    path = CACHE_DIR / f"{key}.json"
+    tmp = path.with_suffix(".tmp")
+    tmp.write_text(json.dumps(entry, ensure_ascii=False), encoding="utf-8")
+    os.replace(tmp, path)
+    evict_cache(max_bytes)
+
+
+def evict_cache(max_bytes: int) -> None:
+    """Drop least-recently-used entries until the cache fits in max_bytes."""
+
+    entries = []
+    for p in CACHE_DIR.glob("*.json"):
+        try:
+            st = p.stat()
+        except OSError:
+            continue
+        entries.append((st.st_mtime, st.st_size, p))
+    total = sum(size for _, size, _ in entries)
+    for _, size, p in sorted(entries):
+        if total <= max_bytes:
+            break
+        try:
+            p.unlink()
+            total -= size
+        except OSError:
+            pass
+
+
+async def run_local_task(task: Dict[str, Any], dry_run: bool, log_dir: Path, cfg: Dict[str, Any]) -> TaskResult:
     task_id = str(task.get("id") or "")
     name = str(task.get("name") or task_id)
 
@@ -170,20 +678,146 @@ async def run_local_task(task: Dict[str, Any], dry_run: bool) -> TaskResult:
     if dry_run:
         return TaskResult(task_id=task_id, name=name, ok=True, stdout=f"DRY RUN: would run {cmd_str}", duration_s=time.time() - start)
 
-    proc = await asyncio.create_subprocess_exec(
-        *cmd_list,
-        cwd=str(CLAWD),
-        stdout=asyncio.subprocess.PIPE,
-        stderr=asyncio.subprocess.PIPE,
+    key = None
+    if task.get("cache"):
+        inputs = task.get("inputs") if isinstance(task.get("inputs"), list) else []
+        key = await asyncio.to_thread(cache_key, cmd_str, [str(x) for x in inputs])
+        hit = cache_get(key)
+        if hit is not None:
+            return TaskResult(
+                task_id=task_id,
+                name=name,
+                ok=True,
+                stdout=str(hit.get("stdout") or ""),
+                stderr=str(hit.get("stderr") or ""),
+                duration_s=time.time() - start,
+                cache="hit",
+            )
+
+    sp = await run_streamed(cmd_list, log_dir, task_id, cfg, task_limits(task, cfg))
+    logs = await finalize_logs([sp.stdout_path, sp.stderr_path], cfg)
+    res = TaskResult(
+        task_id=task_id,
+        name=name,
+        ok=sp.returncode == 0,
+        stdout=sp.stdout.text(sp.stdout_path),
+        stderr=sp.stderr.text(sp.stderr_path),
+        duration_s=time.time() - start,
+        log_paths=logs,
+        cache="miss" if key else None,
+        rusage=sp.rusage,
     )
-    out_b, err_b = await proc.communicate()
-    out = out_b.decode("utf-8", errors="replace") if out_b else ""
-    err = err_b.decode("utf-8", errors="replace") if err_b else ""
-    ok = proc.returncode == 0
-    return TaskResult(task_id=task_id, name=name, ok=ok, stdout=out.strip(), stderr=err.strip(), duration_s=time.time() - start)
+    if key and res.ok:
+        cache_put(
+            key,
+            {
+                "command": cmd_str,
+                "stdout": res.stdout,
+                "stderr": res.stderr,
+                "duration_s": round(res.duration_s, 2),
+                "created_at": utc_now().isoformat().replace("+00:00", "Z"),
+            },
+            int(cfg.get("cache_max_bytes", DEFAULT_CONFIG["cache_max_bytes"])),
+        )
+    return res
+
+
+def estimate_tokens(text: str) -> int:
+    # Rough chars-per-token ratio for English prose and code.
+    return (len(text) + 3) // 4
+
+
+class SpecCache:
+    """Spec file text for one run's prompts, and what trimming/dedup saved.
+
+    Text is keyed by path and reused while (mtime, size) are unchanged.
+    Prompt builders report their savings per turn; a turn's savings are only
+    credited once the agent actually completed it (not on dry runs or
+    failed turns).
+    """
+
+    def __init__(self) -> None:
+        self.texts: Dict[str, Tuple[int, int, str]] = {}
+        self.stats = {"spec_reads": 0, "spec_cache_hits": 0, "spec_bytes_saved": 0}
+
+    def load(self, path: Path) -> Optional[str]:
+        try:
+            st = path.stat()
+        except OSError:
+            return None
+        key = str(path)
+        hit = self.texts.get(key)
+        if hit and hit[0] == st.st_mtime_ns and hit[1] == st.st_size:
+            self.stats["spec_cache_hits"] += 1
+            return hit[2]
+        try:
+            text = path.read_text(encoding="utf-8")
+        except (OSError, UnicodeDecodeError):
+            return None
+        self.texts[key] = (st.st_mtime_ns, st.st_size, text)
+        self.stats["spec_reads"] += 1
+        return text
+
+    def credit(self, saved: List[int]) -> None:
+        self.stats["spec_bytes_saved"] += sum(saved)
+
+    def summary(self) -> Dict[str, int]:
+        return {**self.stats, "spec_tokens_saved": (self.stats["spec_bytes_saved"] + 3) // 4}
+
+
+def trim_spec(text: str, max_tokens: int) -> str:
+    """Trim a spec to roughly max_tokens, dropping whole sections from the end.
+
+    Sections start at markdown headings. The text before the first heading is
+    always kept (cut hard if it alone is too large); sections that do not fit
+    are reduced to their heading so the agent knows they exist and can open
+    the file.
+    """
+
+    if max_tokens <= 0 or estimate_tokens(text) <= max_tokens:
+        return text
+    sections: List[List[str]] = [[]]
+    for line in text.splitlines(keepends=True):
+        if line.startswith("#") and sections[-1]:
+            sections.append([])
+        sections[-1].append(line)
+
+    budget = max_tokens * 4
+    head = "".join(sections[0])
+    if len(head) > budget:
+        return head[:budget] + "\n[... spec truncated; read the file for the rest ...]\n"
+    out = [head]
+    used = len(head)
+    dropped = 0
+    for sec in sections[1:]:
+        body = "".join(sec)
+        if dropped == 0 and used + len(body) <= budget:
+            out.append(body)
+            used += len(body)
+        else:
+            # Keep order: once one section is dropped, later ones are headings only.
+            out.append(sec[0].rstrip("\n") + "\n[... section trimmed ...]\n\n")
+            dropped += 1
+    return "".join(out)
+
+
+def build_openclaw_message(
+    task: Dict[str, Any],
+    cfg: Optional[Dict[str, Any]] = None,
+    sent_specs: Optional[Set[str]] = None,
+    specs: Optional[SpecCache] = None,
+    saved: Optional[List[int]] = None,
+) -> str:
+    """Prompt for one task.
+
+    `sent_specs` holds the specs already inlined into the target session; a
+    repeated spec is referenced instead of resent and the new ones are added
+    to the set. Bytes kept out of the prompt that way are appended to `saved`.
+    """
 
+    specs = specs if specs is not None else SpecCache()
+    saved = saved if saved is not None else []
 
-def build_openclaw_message(task: Dict[str, Any]) -> str:
     lines = []
     lines.append("You are running as part of the OC-014 overnight pipeline.")
     lines.append("SAFETY: Do NOT deploy to production. Do NOT run destructive commands. Prefer small scoped changes.")
@@ -196,9 +830,19 @@ def build_openclaw_message(task: Dict[str, Any]) -> str:
         lines.append(f"Spec path: {spec_path}")
         try:
             p = (CLAWD / spec_path).expanduser() if not str(spec_path).startswith("/") else Path(spec_path)
-            if p.exists() and p.is_file():
-                content = p.read_text(encoding="utf-8")
-                lines.append("\n--- SPEC ---\n" + content + "\n--- END SPEC ---\n")
+            content = specs.load(p) if p.is_file() else None
+            if content is not None:
+                key = str(p.resolve())
+                max_tokens = int((cfg or DEFAULT_CONFIG).get("spec_max_tokens", DEFAULT_CONFIG["spec_max_tokens"]) or 0)
+                if sent_specs is not None and key in sent_specs:
+                    lines.append("(Spec already provided earlier in this session; refer back to it.)")
+                    saved.append(len(content))
+                else:
+                    trimmed = trim_spec(content, max_tokens)
+                    saved.append(len(content) - len(trimmed))
+                    lines.append("\n--- SPEC ---\n" + trimmed + "\n--- END SPEC ---\n")
+                    if sent_specs is not None:
+                        sent_specs.add(key)
         except Exception:
             pass
 
@@ -209,10 +853,10 @@ def build_openclaw_message(task: Dict[str, Any]) -> str:
     return "\n".join(lines)
 
 
-async def run_agent_task(task: Dict[str, Any], dry_run: bool, agent_id: str, session_id: str) -> TaskResult:
-    task_id = str(task.get("id") or "")
-    name = str(task.get("name") or task_id)
-    msg = build_openclaw_message(task)
+async def agent_turn(
+    msg: str, key: str, agent_id: str, session_id: str, log_dir: Path, cfg: Dict[str, Any], limits: Dict[str, Any]
+) -> Tuple[StreamedProcess, str, Optional[int]]:
+    """Run one `openclaw agent` turn; returns the process, reply text and tokens."""
 
     cmd = [
         "openclaw",
@@ -225,32 +869,200 @@ async def run_agent_task(task: Dict[str, Any], dry_run: bool, agent_id: str, ses
         msg,
         "--json",
     ]
+    sp = await run_streamed(cmd, log_dir, key, cfg, limits)
+    out = sp.stdout.text(sp.stdout_path)
+    tokens: Optional[int] = None
 
-    start = time.time()
-    if dry_run:
-        return TaskResult(task_id=task_id, name=name, ok=True, stdout=f"DRY RUN: would run {' '.join(shlex.quote(x) for x in cmd[:8])} ...", duration_s=time.time() - start)
-
-    proc = await asyncio.create_subprocess_exec(
-        *cmd,
-        cwd=str(CLAWD),
-        stdout=asyncio.subprocess.PIPE,
-        stderr=asyncio.subprocess.PIPE,
-    )
-    out_b, err_b = await proc.communicate()
-    out = out_b.decode("utf-8", errors="replace") if out_b else ""
-    err = err_b.decode("utf-8", errors="replace") if err_b else ""
-    ok = proc.returncode == 0
-
-    # Best-effort parse to surface agent reply.
+    # Best-effort parse to surface agent reply. The --json payload is small in
+    # practice; only re-read the log when the in-memory window was truncated.
     try:
-        data = json.loads(out) if out.strip() else {}
+        raw = out
+        if sp.stdout.truncated and sp.stdout.total <= AGENT_JSON_MAX_BYTES:
+            raw = sp.stdout_path.read_text(encoding="utf-8", errors="replace")
+        data = json.loads(raw) if raw.strip() else {}
         reply = data.get("reply") or data.get("output") or data.get("text")
         if reply:
             out = str(reply)
+        if overnight_predictor is not None:
+            tokens = overnight_predictor.extract_usage_tokens(data)
     except Exception:
         pass
 
-    return TaskResult(task_id=task_id, name=name, ok=ok, stdout=out.strip(), stderr=err.strip(), duration_s=time.time() - start)
+    return sp, out, tokens
+
+
+async def run_agent_task(
+    task: Dict[str, Any],
+    dry_run: bool,
+    agent_id: str,
+    session_id: str,
+    log_dir: Path,
+    cfg: Dict[str, Any],
+    carry: str = "",
+    sent_specs: Optional[Set[str]] = None,
+    specs: Optional[SpecCache] = None,
+) -> TaskResult:
+    task_id = str(task.get("id") or "")
+    name = str(task.get("name") or task_id)
+    # Specs only count as sent (and savings as saved) once the session has
+    # actually received them.
+    seen = set(sent_specs) if sent_specs is not None else None
+    saved: List[int] = []
+    msg = build_openclaw_message(task, cfg, seen, specs, saved)
+    if carry:
+        msg = carry + "\n\n" + msg
+
+    start = time.time()
+    if dry_run:
+        cmd = ["openclaw", "agent", "--agent", agent_id, "--session-id", session_id, "--message", msg]
+        return TaskResult(task_id=task_id, name=name, ok=True, stdout=f"DRY RUN: would run {' '.join(shlex.quote(x) for x in cmd[:8])} ...", duration_s=time.time() - start)
+
+    sp, out, tokens = await agent_turn(msg, task_id, agent_id, session_id, log_dir, cfg, task_limits(task, cfg))
+    if sp.returncode == 0:
+        if sent_specs is not None:
+            sent_specs |= seen
+        if specs is not None:
+            specs.credit(saved)
+    logs = await finalize_logs([sp.stdout_path, sp.stderr_path], cfg)
+    return TaskResult(
+        task_id=task_id,
+        name=name,
+        ok=sp.returncode == 0,
+        stdout=out.strip(),
+        stderr=sp.stderr.text(sp.stderr_path),
+        duration_s=time.time() - start,
+        log_paths=logs,
+        tokens=tokens,
+        rusage=sp.rusage,
+    )
+
+
+def batch_proc_key(tasks: List[Dict[str, Any]]) -> str:
+    """Process / log key for a task or batch of tasks."""
+
+    first = str(tasks[0].get("id") or "")
+    return first if len(tasks) == 1 else f"batch-{first}+{len(tasks) - 1}"
+
+
+def batch_key(task: Dict[str, Any]) -> Tuple[str, str, str, str]:
+    """Agent tasks with the same key may share one turn."""
+
+    return str(task.get("type") or "codex").lower(), str(task.get("repo") or "workspace"), str(task.get("lane") or ""), task_project(task)
+
+
+def build_batch_message(
+    tasks: List[Dict[str, Any]],
+    cfg: Optional[Dict[str, Any]] = None,
+    sent_specs: Optional[Set[str]] = None,
+    specs: Optional[SpecCache] = None,
+    saved: Optional[List[int]] = None,
+) -> str:
+    lines = []
+    lines.append("You are running as part of the OC-014 overnight pipeline.")
+    lines.append("SAFETY: Do NOT deploy to production. Do NOT run destructive commands. Prefer small scoped changes.")
+    lines.append(f"This turn contains {len(tasks)} small independent tasks. Do them one at a time, in order, and commit each separately.")
+    lines.append("")
+    for i, task in enumerate(tasks, 1):
+        # Reuse the single-task body minus its preamble. Tasks sharing a spec
+        # get it inlined once.
+        body = build_openclaw_message(task, cfg, sent_specs, specs, saved).split("\n\n", 1)[-1]
+        lines.append(f"=== TASK {i}/{len(tasks)} id={task.get('id','')} ===")
+        lines.append(body)
+        lines.append("")
+    lines.append("When finished, reply with a short summary per task and END your reply with exactly one JSON object:")
+    lines.append('{"results": [{"id": "<task id>", "ok": true|false, "summary": "<what changed / what to review>", "commits": ["<hash>", ...]}]}')
+    lines.append("Include one entry for every task id above; use ok=false for anything not completed.")
+    return "\n".join(lines)
+
+
+def parse_batch_reply(reply: str) -> Dict[str, Dict[str, Any]]:
+    """Extract the trailing {"results": [...]} object from a batched reply, keyed by task id."""
+
+    decoder = json.JSONDecoder()
+    # The last candidate wins: agents sometimes echo the format line first.
+    for start in reversed([m.start() for m in re.finditer(r"\{\s*\"results\"", reply)]):
+        try:
+            data, _ = decoder.raw_decode(reply[start:])
+        except ValueError:
+            continue
+        items = data.get("results") if isinstance(data, dict) else None
+        if isinstance(items, list):
+            return {str(it.get("id")): it for it in items if isinstance(it, dict) and it.get("id") is not None}
+    return {}
+
+
+async def run_agent_batch(
+    tasks: List[Dict[str, Any]],
+    batch_id: str,
+    dry_run: bool,
+    agent_id: str,
+    session_id: str,
+    log_dir: Path,
+    cfg: Dict[str, Any],
+    carry: str = "",
+    sent_specs: Optional[Set[str]] = None,
+    specs: Optional[SpecCache] = None,
+) -> List[TaskResult]:
+    """Run several small compatible agent tasks as one turn and split the reply per task.
+
+    Duration and tokens are shared evenly across the batch; rusage is
+    attached to the first result only so resource totals count it once.
+    """
+
+    start = time.time()
+    if dry_run:
+        ids = ",".join(str(t.get("id") or "") for t in tasks)
+        return [
+            TaskResult(task_id=str(t.get("id") or ""), name=str(t.get("name") or t.get("id")), ok=True, stdout=f"DRY RUN: would batch [{ids}] into one agent turn", duration_s=0.0)
+            for t in tasks
+        ]
+
+    # The tasks run back to back in one process: CPU time adds up, memory does not.
+    limits: Dict[str, Any] = {}
+    for t in tasks:
+        for k, v in task_limits(t, cfg).items():
+            limits[k] = limits.get(k, 0) + v if k == "cpu_seconds" else max(limits.get(k, 0), v)
+    seen = set(sent_specs) if sent_specs is not None else set()
+    saved: List[int] = []
+    msg = build_batch_message(tasks, cfg, seen, specs, saved)
+    if carry:
+        msg = carry + "\n\n" + msg
+    sp, out, tokens = await agent_turn(msg, batch_id, agent_id, session_id, log_dir, cfg, limits)
+    if sp.returncode == 0:
+        if sent_specs is not None:
+            sent_specs |= seen
+        if specs is not None:
+            specs.credit(saved)
+    logs = await finalize_logs([sp.stdout_path, sp.stderr_path], cfg)
+    elapsed = time.time() - start
+    parsed = parse_batch_reply(out) if sp.returncode == 0 else {}
+    stderr = sp.stderr.text(sp.stderr_path)
+
+    results = []
+    for i, t in enumerate(tasks):
+        tid = str(t.get("id") or "")
+        item = parsed.get(tid)
+        if item is not None:
+            ok = bool(item.get("ok"))
+            text = str(item.get("summary") or "")
+            commits = [str(c) for c in item.get("commits") or []]
+            err = "" if ok else "reported not completed in batched turn"
+        else:
+            ok, text, commits = False, out.strip(), []
+            err = stderr if sp.returncode != 0 else "no result for this task in batched reply"
+        results.append(TaskResult(
+            task_id=tid,
+            name=str(t.get("name") or tid),
+            ok=ok,
+            stdout=text.strip(),
+            stderr=err,
+            duration_s=elapsed / len(tasks),
+            commit_hashes=commits or None,
+            log_paths=logs,
+            tokens=(tokens // len(tasks)) if tokens is not None else None,
+            rusage=sp.rusage if i == 0 else None,
+        ))
+    return results
 
 
 def git_commits_since(base_rev: str) -> List[str]:
@@ -301,7 +1113,920 @@ def should_stop_now(cfg: Dict[str, Any]) -> bool:
     return n.hour >= stop_h and not within_run_window(cfg)
 
 
-async def run_queue(dry_run: bool) -> int:
+def event_task_id(ev: Dict[str, Any]) -> str:
+    if ev.get("task_id"):
+        return str(ev["task_id"])
+    task = ev.get("task")
+    if isinstance(task, dict) and task.get("id"):
+        return str(task["id"])
+    return ""
+
+
+def index_entry(ev: Dict[str, Any], generation: int, offset: int) -> Dict[str, Any]:
+    """Compact sidecar index record: segment generation + byte offset."""
+
+    entry: Dict[str, Any] = {"g": generation, "o": offset, "e": ev.get("event")}
+    if ev.get("run_id"):
+        entry["r"] = ev["run_id"]
+    tid = event_task_id(ev)
+    if tid:
+        entry["t"] = tid
+    ts = ev.get("ts") or ev.get("started_at") or ev.get("ended_at")
+    if ts:
+        entry["ts"] = ts
+    return entry
+
+
+def segment_path(generation: int) -> Path:
+    return PROGRESS_SEGMENTS_DIR / f"overnight_progress.{generation:06d}.jsonl.gz"
+
+
+def segment_index_path(generation: int) -> Path:
+    return PROGRESS_SEGMENTS_DIR / f"overnight_progress.{generation:06d}.index.jsonl"
+
+
+# The progress meta as this process last checked or wrote it, so log_event
+# does not go back to disk for every event.
+_PROGRESS_META: Optional[Dict[str, Any]] = None
+
+
+def _forget_progress_meta() -> None:
+    global _PROGRESS_META
+    _PROGRESS_META = None
+
+
+def load_progress_meta() -> Dict[str, Any]:
+    meta = load_json(PROGRESS_META_PATH)
+    if not isinstance(meta.get("generation"), int):
+        meta = {
+            "generation": 0,
+            "created_at": utc_now().isoformat().replace("+00:00", "Z"),
+            "index_version": PROGRESS_INDEX_VERSION,
+            "segments": {},
+        }
+    return meta
+
+
+def save_progress_meta(meta: Dict[str, Any]) -> None:
+    global _PROGRESS_META
+    PROGRESS_META_PATH.parent.mkdir(parents=True, exist_ok=True)
+    tmp = PROGRESS_META_PATH.with_suffix(".tmp")
+    tmp.write_text(json.dumps(meta, indent=2), encoding="utf-8")
+    os.replace(tmp, PROGRESS_META_PATH)
+    _PROGRESS_META = meta
+
+
+def index_events(path: Path, generation: int, start: int = 0):
+    """Yield index entries for the complete journal lines in path from byte offset start."""
+
+    opener = gzip.open if path.suffix == ".gz" else open
+    with opener(path, "rb") as f:
+        f.seek(start)
+        offset = start
+        for raw in f:
+            line_off = offset
+            offset += len(raw)
+            if not raw.endswith(b"\n"):
+                break  # torn write at the tail; log_event terminates it
+            try:
+                ev = json.loads(raw)
+            except ValueError:
+                continue
+            if isinstance(ev, dict):
+                yield index_entry(ev, generation, line_off)
+
+
+def iter_index_file(path: Path):
+    if not path.exists():
+        return
+    with path.open("r", encoding="utf-8") as f:
+        for line in f:
+            try:
+                e = json.loads(line)
+            except json.JSONDecodeError:
+                continue
+            if isinstance(e, dict):
+                yield e
+
+
+def shard_summary(entries) -> Dict[str, Any]:
+    """What a rotated index shard covers, so lookups can skip it unread."""
+
+    runs: Set[str] = set()
+    tasks: Set[str] = set()
+    stamps: List[str] = []
+    for e in entries:
+        if e.get("r"):
+            runs.add(str(e["r"]))
+        if e.get("t"):
+            tasks.add(str(e["t"]))
+        if e.get("ts"):
+            stamps.append(str(e["ts"]))
+    return {
+        "runs": sorted(runs),
+        "tasks": sorted(tasks),
+        "first_ts": min(stamps) if stamps else None,
+        "last_ts": max(stamps) if stamps else None,
+    }
+
+
+def write_index_file(path: Path, entries) -> None:
+    tmp = path.with_name(path.name + ".tmp")
+    tmp.parent.mkdir(parents=True, exist_ok=True)
+    with tmp.open("w", encoding="utf-8") as idx:
+        for e in entries:
+            idx.write(json.dumps(e) + "\n")
+    os.replace(tmp, path)
+
+
+def rebuild_progress_index() -> None:
+    """Recreate the index shards and the live index from the journal and its segments."""
+
+    meta = load_progress_meta()
+    segments: Dict[str, Any] = {}
+    if PROGRESS_SEGMENTS_DIR.exists():
+        for p in sorted(PROGRESS_SEGMENTS_DIR.glob("overnight_progress.*.jsonl.gz")):
+            try:
+                gen = int(p.name.split(".")[1])
+            except (IndexError, ValueError):
+                continue
+            entries = list(index_events(p, gen))
+            write_index_file(segment_index_path(gen), entries)
+            segments[str(gen)] = shard_summary(entries)
+    live = index_events(PROGRESS_PATH, int(meta["generation"])) if PROGRESS_PATH.exists() else []
+    write_index_file(PROGRESS_INDEX_PATH, live)
+    meta.update({"index_version": PROGRESS_INDEX_VERSION, "segments": segments})
+    save_progress_meta(meta)
+
+
+def last_line(path: Path, block: int = 4096) -> bytes:
+    """Last complete line of path without reading the whole file."""
+
+    with path.open("rb") as f:
+        end = f.seek(0, os.SEEK_END)
+        pos, tail = end, b""
+        while pos > 0:
+            pos = max(0, pos - block)
+            f.seek(pos)
+            tail = f.read(end - pos)
+            lines = tail.rstrip(b"\n").split(b"\n")
+            if len(lines) > 1 or pos == 0:
+                return lines[-1]
+    return b""
+
+
+def last_line_torn(path: Path) -> bool:
+    with path.open("rb") as f:
+        f.seek(-1, os.SEEK_END)
+        return f.read(1) != b"\n"
+
+
+def sync_live_index(generation: int) -> None:
+    """Index journal lines written after the last live index entry.
+
+    log_event writes the journal line first and the index entry second, so a
+    crash in between leaves the index one step behind; this catches it up.
+    """
+
+    if not PROGRESS_PATH.exists():
+        return
+    size = PROGRESS_PATH.stat().st_size
+    covered = 0
+    if PROGRESS_INDEX_PATH.exists():
+        try:
+            last = json.loads(last_line(PROGRESS_INDEX_PATH) or b"{}")
+        except ValueError:
+            last = {}
+        if isinstance(last.get("o"), int):
+            with PROGRESS_PATH.open("rb") as f:
+                f.seek(last["o"])
+                covered = last["o"] + len(f.readline())
+    if covered >= size:
+        return
+    with PROGRESS_INDEX_PATH.open("a", encoding="utf-8") as idx:
+        for e in index_events(PROGRESS_PATH, generation, covered):
+            idx.write(json.dumps(e) + "\n")
+
+
+def ensure_progress_index() -> Dict[str, Any]:
+    """Bring the index up to date with the journal; returns the progress meta."""
+
+    meta = load_progress_meta()
+    if PROGRESS_PATH.exists() and not PROGRESS_INDEX_PATH.exists():
+        # A journal from before the index existed.
+        rebuild_progress_index()
+        return load_progress_meta()
+    sync_live_index(int(meta["generation"]))
+    return meta
+
+
+def progress_meta() -> Dict[str, Any]:
+    """The progress meta; the index is checked against the journal once per process."""
+
+    if _PROGRESS_META is None:
+        save_progress_meta(ensure_progress_index())
+    return _PROGRESS_META
+
+
+def log_event(obj: Dict[str, Any]) -> None:
+    """Append a progress event, then record its byte offset in the live index."""
+
+    meta = progress_meta()
+
+    PROGRESS_PATH.parent.mkdir(parents=True, exist_ok=True)
+    line = (json.dumps(obj, ensure_ascii=False) + "\n").encode("utf-8")
+    with PROGRESS_PATH.open("ab") as f:
+        offset = f.tell()
+        if offset and last_line_torn(PROGRESS_PATH):
+            f.write(b"\n")
+            offset += 1
+        f.write(line)
+    append_jsonl(PROGRESS_INDEX_PATH, index_entry(obj, int(meta["generation"]), offset))
+
+
+def maybe_rotate_progress(cfg: Dict[str, Any]) -> Optional[Path]:
+    """Rotate the live progress file and its index into a segment if it is too big or old.
+
+    Only called before a run_start so a run never spans two segments. The
+    rotated index becomes a shard next to the segment; its run ids, task ids
+    and time range go into the meta so lookups only open shards that match.
+    """
+
+    if not PROGRESS_PATH.exists():
+        return None
+    meta = ensure_progress_index()
+
+    max_bytes = int(cfg.get("progress_rotate_bytes", DEFAULT_CONFIG["progress_rotate_bytes"]) or 0)
+    max_days = float(cfg.get("progress_rotate_days", DEFAULT_CONFIG["progress_rotate_days"]) or 0)
+    size = PROGRESS_PATH.stat().st_size
+    try:
+        created = datetime.fromisoformat(str(meta.get("created_at")).replace("Z", "+00:00"))
+        age_days = (utc_now() - created).total_seconds() / 86400
+    except ValueError:
+        age_days = 0.0
+
+    too_big = bool(max_bytes) and size >= max_bytes
+    too_old = bool(max_days) and age_days >= max_days and size > 0
+    if not (too_big or too_old):
+        return None
+
+    gen = int(meta["generation"])
+    PROGRESS_SEGMENTS_DIR.mkdir(parents=True, exist_ok=True)
+    segments = dict(meta.get("segments") or {})
+    segments[str(gen)] = shard_summary(iter_index_file(PROGRESS_INDEX_PATH))
+    os.replace(PROGRESS_INDEX_PATH, segment_index_path(gen))
+    staged = PROGRESS_SEGMENTS_DIR / f"overnight_progress.{gen:06d}.jsonl"
+    os.replace(PROGRESS_PATH, staged)
+    seg = gzip_file(staged)
+    save_progress_meta({
+        "generation": gen + 1,
+        "created_at": utc_now().isoformat().replace("+00:00", "Z"),
+        "index_version": PROGRESS_INDEX_VERSION,
+        "segments": segments,
+    })
+    return seg
+
+
+def read_index(run_id: Optional[str] = None, task_id: Optional[str] = None, since: Optional[str] = None) -> List[Dict[str, Any]]:
+    """Index entries matching the filters, oldest first.
+
+    Rotated shards whose summary cannot match are skipped without opening
+    them, so a lookup reads the live index plus the shards it needs.
+    """
+
+    if not (PROGRESS_PATH.exists() or PROGRESS_INDEX_PATH.exists() or PROGRESS_SEGMENTS_DIR.exists()):
+        return []
+    meta = ensure_progress_index()
+    paths: List[Path] = []
+    for gen, summary in sorted((meta.get("segments") or {}).items(), key=lambda kv: int(kv[0])):
+        if run_id and run_id not in summary.get("runs", ()):
+            continue
+        if task_id and task_id not in summary.get("tasks", ()):
+            continue
+        if since and summary.get("last_ts") and str(summary["last_ts"]) < since:
+            continue
+        paths.append(segment_index_path(int(gen)))
+    paths.append(PROGRESS_INDEX_PATH)
+
+    out: List[Dict[str, Any]] = []
+    for path in paths:
+        for e in iter_index_file(path):
+            if run_id and e.get("r") != run_id:
+                continue
+            if task_id and e.get("t") != task_id:
+                continue
+            if since and str(e.get("ts") or "") < since:
+                continue
+            out.append(e)
+    return out
+
+
+def read_indexed_events(entries: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Load the full events behind index entries, seeking within each segment."""
+
+    current_gen = int(load_progress_meta()["generation"])
+    by_gen: Dict[int, List[int]] = {}
+    for e in entries:
+        by_gen.setdefault(int(e["g"]), []).append(int(e["o"]))
+
+    events: List[Dict[str, Any]] = []
+    for gen, offsets in sorted(by_gen.items()):
+        if gen == current_gen:
+            path, opener = PROGRESS_PATH, open
+        else:
+            path, opener = segment_path(gen), gzip.open
+        if not path.exists():
+            continue
+        # gzip seeks forward cheaply; keep offsets ascending.
+        with opener(path, "rb") as f:
+            for off in sorted(offsets):
+                f.seek(off)
+                try:
+                    ev = json.loads(f.readline())
+                except ValueError:
+                    continue
+                if isinstance(ev, dict):
+                    events.append(ev)
+    return events
+
+
+class ConcurrencyController:
+    """Additive-increase / multiplicative-decrease limit for parallel tasks.
+
+    With adaptive_parallel off this is just the static max_parallel. When on,
+    the limit grows by one after a full round (`limit` completions) of healthy
+    results, and is cut by aimd_decrease_factor on a timeout, a rate-limit
+    looking failure, or host load above aimd_max_load_per_cpu. At most one cut
+    happens per round so a burst of failures from the same cause counts once.
+    Every change is emitted via `on_adjust` (a progress event).
+    """
+
+    def __init__(self, cfg: Dict[str, Any], on_adjust) -> None:
+        self.enabled = bool(cfg.get("adaptive_parallel", DEFAULT_CONFIG["adaptive_parallel"]))
+        self.floor = max(1, int(cfg.get("min_parallel", DEFAULT_CONFIG["min_parallel"]) or 1))
+        start = max(self.floor, int(cfg.get("max_parallel", 1) or 1))
+        self.ceiling = max(start, int(cfg.get("adaptive_max_parallel", DEFAULT_CONFIG["adaptive_max_parallel"]) or start)) if self.enabled else start
+        self.factor = float(cfg.get("aimd_decrease_factor", DEFAULT_CONFIG["aimd_decrease_factor"]))
+        self.max_error_rate = float(cfg.get("aimd_max_error_rate", DEFAULT_CONFIG["aimd_max_error_rate"]))
+        self.slow_fraction = float(cfg.get("aimd_slow_fraction", DEFAULT_CONFIG["aimd_slow_fraction"]))
+        self.max_load = float(cfg.get("aimd_max_load_per_cpu", DEFAULT_CONFIG["aimd_max_load_per_cpu"]))
+        self.limit = start
+        self.on_adjust = on_adjust
+        self.recent: List[bool] = []
+        self.healthy_streak = 0
+        self.since_cut = start
+        self.history: List[int] = [start]
+
+    def _set(self, new: int, reason: str) -> None:
+        new = min(self.ceiling, max(self.floor, new))
+        if new == self.limit:
+            return
+        old, self.limit = self.limit, new
+        self.history.append(new)
+        self.on_adjust(old, new, reason)
+
+    def _cut(self, reason: str) -> None:
+        if self.since_cut < self.limit:
+            return
+        self.since_cut = 0
+        self.healthy_streak = 0
+        self._set(int(self.limit * self.factor), reason)
+
+    def load_per_cpu(self) -> float:
+        try:
+            return os.getloadavg()[0] / max(1, os.cpu_count() or 1)
+        except (AttributeError, OSError):
+            return 0.0
+
+    def observe_load(self) -> None:
+        if not self.enabled:
+            return
+        load = self.load_per_cpu()
+        if load > self.max_load:
+            self._cut(f"load {load:.2f}/cpu")
+
+    def on_result(self, res: TaskResult, timeout_s: float) -> None:
+        if not self.enabled:
+            return
+        self.since_cut += 1
+        self.recent = (self.recent + [res.ok])[-10:]
+
+        if res.timed_out:
+            self._cut("timeout")
+            return
+        if not res.ok and RATE_LIMIT_RE.search(res.stderr or ""):
+            self._cut("rate limit")
+            return
+        self.observe_load()
+
+        error_rate = self.recent.count(False) / len(self.recent)
+        slow = timeout_s > 0 and res.duration_s > self.slow_fraction * timeout_s
+        if slow or error_rate > self.max_error_rate:
+            self.healthy_streak = 0
+            return
+        self.healthy_streak += 1
+        if self.healthy_streak >= self.limit:
+            self.healthy_streak = 0
+            self._set(self.limit + 1, "healthy round")
+
+    def summary(self) -> Dict[str, Any]:
+        return {
+            "adaptive": self.enabled,
+            "final": self.limit,
+            "min": min(self.history),
+            "max": max(self.history),
+            "adjustments": len(self.history) - 1,
+        }
+
+
+@dataclass
+class Lane:
+    name: str
+    base: str
+    generation: int = 0
+    tokens: int = 0
+    turns: int = 0
+    carry: str = ""
+    # Spec files already inlined into the current session.
+    specs: Set[str] = field(default_factory=set)
+
+    @property
+    def session_id(self) -> str:
+        return f"{self.base}-{self.name}" + (f"-{self.generation}" if self.generation else "")
+
+
+class LanePool:
+    """Agent sessions scoped to a worker slot or a named task chain.
+
+    Tasks without a `lane` take the lowest free slot lane, so parallel tasks
+    never share a session; tasks naming the same `lane` share one session
+    and run one at a time. Once a lane's turns have used lane_token_budget
+    tokens it rotates to a fresh session, and the next turn starts with a
+    short summary of the lane's last few tasks. Rotations are emitted via
+    `on_rotate` (a progress event).
+    """
+
+    def __init__(self, base: str, cfg: Dict[str, Any], on_rotate) -> None:
+        self.base = base
+        self.budget = int(cfg.get("lane_token_budget", DEFAULT_CONFIG["lane_token_budget"]) or 0)
+        self.carry_tasks = int(cfg.get("lane_carry_tasks", DEFAULT_CONFIG["lane_carry_tasks"]) or 0)
+        self.on_rotate = on_rotate
+        self.lanes: Dict[str, Lane] = {}
+        self.locks: Dict[str, asyncio.Lock] = {}
+        self.notes: Dict[str, List[str]] = {}
+
+    def _lane(self, name: str) -> Lane:
+        if name not in self.lanes:
+            self.lanes[name] = Lane(name=name, base=self.base)
+            self.locks[name] = asyncio.Lock()
+            self.notes[name] = []
+        return self.lanes[name]
+
+    async def acquire(self, task: Dict[str, Any]) -> Lane:
+        pinned = task.get("lane")
+        if pinned:
+            lane = self._lane(f"chain-{safe_name(str(pinned))}")
+        else:
+            i = 0
+            while f"lane{i}" in self.lanes and self.locks[f"lane{i}"].locked():
+                i += 1
+            lane = self._lane(f"lane{i}")
+        await self.locks[lane.name].acquire()
+        return lane
+
+    def take_carry(self, lane: Lane) -> str:
+        carry, lane.carry = lane.carry, ""
+        return carry
+
+    def release(self, lane: Lane, done: List[Tuple[Dict[str, Any], TaskResult, int]]) -> None:
+        """Account a finished turn (task, result, tokens) and rotate if over budget."""
+
+        lane.turns += 1
+        for task, res, tokens in done:
+            lane.tokens += tokens
+            first = (res.stdout or res.stderr or "").strip().splitlines()
+            status = "done" if res.ok else "NOT done"
+            self.notes[lane.name].append(f"- {res.name} ({res.task_id}): {status}" + (f" — {first[0][:200]}" if first else ""))
+        self.notes[lane.name] = self.notes[lane.name][-max(1, self.carry_tasks):]
+
+        if self.budget and lane.tokens >= self.budget:
+            old = lane.session_id
+            lane.generation += 1
+            lane.specs = set()
+            lane.carry = ""
+            if self.carry_tasks:
+                lane.carry = "Context carried over from the previous overnight session on this lane (recent tasks):\n" + "\n".join(self.notes[lane.name])
+            self.on_rotate(lane, old, lane.tokens)
+            lane.tokens = 0
+
+        self.locks[lane.name].release()
+
+    def summary(self) -> Dict[str, Any]:
+        return {
+            name: {"sessions": lane.generation + 1, "turns": lane.turns, "session_id": lane.session_id}
+            for name, lane in sorted(self.lanes.items())
+        }
+
+
+def seconds_until_stop(cfg: Dict[str, Any]) -> float:
+    tz = str(cfg.get("timezone") or DEFAULT_CONFIG["timezone"])
+    stop_h = int(cfg.get("stop_hour", DEFAULT_CONFIG["stop_hour"]))
+    n = now_tz(tz)
+    stop = n.replace(hour=stop_h, minute=0, second=0, microsecond=0)
+    if stop <= n:
+        stop += timedelta(days=1)
+    return (stop - n).total_seconds()
+
+
+def task_kind(task: Dict[str, Any]) -> str:
+    return "local" if str(task.get("type") or "codex").lower() == "local" else "agent"
+
+
+def task_value(task: Dict[str, Any]) -> float:
+    value = task.get("value")
+    if isinstance(value, (int, float)) and value > 0:
+        return float(value)
+    prio = int(task.get("priority", 9999) or 9999)
+    return 1.0 / max(prio, 1)
+
+
+def task_project(task: Dict[str, Any]) -> str:
+    return str(task.get("project") or task.get("repo") or "default")
+
+
+def project_weight(project: str, cfg: Dict[str, Any]) -> float:
+    weights = cfg.get("project_weights") if isinstance(cfg.get("project_weights"), dict) else {}
+    try:
+        return max(0.01, float(weights.get(project, 1.0)))
+    except (TypeError, ValueError):
+        return 1.0
+
+
+def parse_ts(value: Any) -> Optional[float]:
+    if not value:
+        return None
+    try:
+        dt = datetime.fromisoformat(str(value).replace("Z", "+00:00"))
+    except ValueError:
+        return None
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=timezone.utc)
+    return dt.timestamp()
+
+
+def load_task_ages(tasks: List[Dict[str, Any]], save: bool = True) -> Dict[str, float]:
+    """First-queued time (epoch) per task id: the task's `added`, else when first seen.
+
+    The registry only keeps ids still in the queue.
+    """
+
+    known = load_json(TASK_AGES_PATH).get("first_seen")
+    known = known if isinstance(known, dict) else {}
+    now = CLOCK()
+    ages: Dict[str, float] = {}
+    for t in tasks:
+        tid = str(t.get("id") or "")
+        if not tid:
+            continue
+        seen = [x for x in (parse_ts(known.get(tid)), parse_ts(t.get("added"))) if x is not None]
+        ages[tid] = min(seen) if seen else now
+    if save:
+        TASK_AGES_PATH.parent.mkdir(parents=True, exist_ok=True)
+        first_seen = {tid: datetime.fromtimestamp(ts, timezone.utc).isoformat().replace("+00:00", "Z") for tid, ts in ages.items()}
+        TASK_AGES_PATH.write_text(json.dumps({"first_seen": first_seen}, indent=2), encoding="utf-8")
+    return ages
+
+
+def aging_factors(ages: Dict[str, float], cfg: Dict[str, Any]) -> Dict[str, float]:
+    rate = float(cfg.get("priority_aging_per_day", DEFAULT_CONFIG["priority_aging_per_day"]) or 0.0)
+    cap = float(cfg.get("priority_aging_max", DEFAULT_CONFIG["priority_aging_max"]) or 1.0)
+    now = CLOCK()
+    return {tid: min(cap, 1.0 + rate * max(0.0, now - ts) / 86400) for tid, ts in ages.items()}
+
+
+def aged_score(task: Dict[str, Any], aging: Optional[Dict[str, float]] = None) -> Tuple[float, int]:
+    score, prio = score_task(task)
+    return score * (aging or {}).get(str(task.get("id") or ""), 1.0), prio
+
+
+class TaskEstimator:
+    """Duration / token estimates for planning.
+
+    Duration comes from the median of the task's past successful task_end
+    events, else a confident overnight_predictor estimate (similar tasks),
+    else its declared `effort` (minutes), else a per-type default. Tokens come
+    from the declared `est_tokens`, else the predictor, else a per-type
+    default. A calibration factor (actual / estimated, from this run's
+    completions) scales every estimate so the plan tracks how tonight is
+    actually going.
+    """
+
+    def __init__(self, cfg: Dict[str, Any], history: Dict[str, List[float]], predictor: Any = None) -> None:
+        self.cfg = cfg
+        self.history = history
+        self.predictor = predictor
+        self.min_confidence = float(cfg.get("predictor_min_confidence", DEFAULT_CONFIG["predictor_min_confidence"]))
+        self.ratios: List[float] = []
+        self._predictions: Dict[int, Any] = {}
+
+    @classmethod
+    def from_journal(cls, cfg: Dict[str, Any], task_ids: List[str]) -> "TaskEstimator":
+        wanted = set(task_ids)
+        entries = [e for e in read_index() if e.get("e") == "task_end" and e.get("t") in wanted]
+        history: Dict[str, List[float]] = {}
+        for ev in read_indexed_events(entries):
+            if ev.get("ok") and ev.get("cache") != "hit" and isinstance(ev.get("duration_s"), (int, float)):
+                history.setdefault(str(ev.get("task_id")), []).append(float(ev["duration_s"]))
+        predictor = None
+        if overnight_predictor is not None:
+            try:
+                predictor = overnight_predictor.load_fitted()
+            except Exception:
+                predictor = None
+        return cls(cfg, history, predictor)
+
+    def prediction(self, task: Dict[str, Any]) -> Any:
+        """Confident predictor output for task, or None."""
+
+        if self.predictor is None:
+            return None
+        key = id(task)
+        if key not in self._predictions:
+            pred = self.predictor.predict(task)
+            self._predictions[key] = pred if pred.samples and pred.confidence >= self.min_confidence else None
+        return self._predictions[key]
+
+    def base_seconds(self, task: Dict[str, Any], quantile: str = "p50") -> float:
+        past = self.history.get(str(task.get("id") or ""))
+        if past:
+            past = sorted(past)
+            return past[min(len(past) - 1, int(len(past) * (0.9 if quantile == "p90" else 0.5)))]
+        pred = self.prediction(task)
+        if pred is not None and pred.p50_s:
+            return float(pred.p90_s if quantile == "p90" else pred.p50_s)
+        effort = task.get("effort")
+        if isinstance(effort, (int, float)) and effort > 0:
+            return float(effort) * 60
+        key = f"default_{task_kind(task)}_minutes"
+        return float(self.cfg.get(key, DEFAULT_CONFIG[key])) * 60
+
+    def calibration(self) -> float:
+        if not self.ratios:
+            return 1.0
+        r = sorted(self.ratios)
+        return min(4.0, max(0.25, r[len(r) // 2]))
+
+    def seconds(self, task: Dict[str, Any]) -> float:
+        return self.base_seconds(task) * self.calibration()
+
+    def seconds_p90(self, task: Dict[str, Any]) -> float:
+        return self.base_seconds(task, "p90") * self.calibration()
+
+    def tokens(self, task: Dict[str, Any]) -> int:
+        est = task.get("est_tokens")
+        if isinstance(est, (int, float)) and est >= 0:
+            return int(est)
+        pred = self.prediction(task)
+        if pred is not None and pred.p50_tokens is not None:
+            return int(pred.p50_tokens)
+        key = f"default_{task_kind(task)}_tokens"
+        return int(self.cfg.get(key, DEFAULT_CONFIG[key]))
+
+    def observe(self, task: Dict[str, Any], res: TaskResult) -> None:
+        base = self.base_seconds(task)
+        if res.ok and res.cache != "hit" and base > 0 and res.duration_s > 0:
+            self.ratios.append(res.duration_s / base)
+
+
+def plan_tasks(
+    tasks: List[Dict[str, Any]],
+    est: TaskEstimator,
+    seconds_left: float,
+    lane_seconds: float,
+    tokens_left: Optional[int],
+    cfg: Dict[str, Any],
+    prefer: Optional[Set[str]] = None,
+    aging: Optional[Dict[str, float]] = None,
+) -> List[Dict[str, Any]]:
+    """Pick the subset of tasks with the most total value that fits.
+
+    Capacity is `lane_seconds` of free worker time (parallel slots times the
+    time left, minus what running tasks still need) plus `tokens_left`
+    (None = unbounded). Any task whose p90 estimate cannot finish before the
+    stop time on its own is dropped outright. Solved as a 0/1 knapsack over
+    discretized minutes and tokens; the chosen tasks are returned in
+    score_task order so the most valuable work still starts first. Task ids
+    in `prefer` (interrupted last night) get boosted value and go first;
+    `aging` multiplies value and score per task id.
+    """
+
+    prefer = prefer or set()
+    aging = aging or {}
+    boost = float(cfg.get("preempted_value_boost", DEFAULT_CONFIG["preempted_value_boost"]))
+
+    # The window check is conservative (p90); packing uses the median.
+    fits = [t for t in tasks if est.seconds_p90(t) <= seconds_left]
+    if not fits:
+        return []
+
+    bucket_s = max(60.0, float(cfg.get("plan_bucket_minutes", DEFAULT_CONFIG["plan_bucket_minutes"])) * 60)
+    time_cap_s = max(0.0, lane_seconds)
+    bucket_s = max(bucket_s, time_cap_s / PLAN_MAX_TIME_BUCKETS)
+    T = int(time_cap_s // bucket_s)
+
+    tok_weights = [est.tokens(t) for t in fits]
+    if tokens_left is None or not any(tok_weights):
+        K, tok_bucket = 0, 1.0
+    else:
+        tok_bucket = max(1.0, float(cfg.get("plan_token_bucket", DEFAULT_CONFIG["plan_token_bucket"])))
+        tok_bucket = max(tok_bucket, max(0, tokens_left) / PLAN_MAX_TOKEN_BUCKETS)
+        K = int(max(0, tokens_left) // tok_bucket)
+
+    items = []
+    for t, tok in zip(fits, tok_weights):
+        wt = int(math.ceil(est.seconds(t) / bucket_s))
+        wk = int(math.ceil(tok / tok_bucket)) if tokens_left is not None else 0
+        if wt <= T and wk <= K:
+            tid = str(t.get("id") or "")
+            v = task_value(t) * (boost if tid in prefer else 1.0) * aging.get(tid, 1.0)
+            items.append((t, wt, wk, v))
+
+    width = K + 1
+    dp = [0.0] * ((T + 1) * width)
+    keep: List[bytearray] = []
+    for _, wt, wk, v in items:
+        row = bytearray((T + 1) * width)
+        for a in range(T, wt - 1, -1):
+            base_a = a * width
+            prev_a = (a - wt) * width
+            for b in range(K, wk - 1, -1):
+                cand = dp[prev_a + b - wk] + v
+                if cand > dp[base_a + b]:
+                    dp[base_a + b] = cand
+                    row[base_a + b] = 1
+        keep.append(row)
+
+    chosen: List[Dict[str, Any]] = []
+    a, b = T, K
+    for i in range(len(items) - 1, -1, -1):
+        if keep[i][a * width + b]:
+            t, wt, wk, _ = items[i]
+            chosen.append(t)
+            a -= wt
+            b -= wk
+
+    return sorted(chosen, key=lambda t: (str(t.get("id") or "") in prefer, aged_score(t, aging)), reverse=True)
+
+
+def signal_task(task_id: str, sig: int) -> bool:
+    proc = RUNNING_PROCS.get(task_id)
+    if proc is None or proc.returncode is not None:
+        return False
+    try:
+        os.killpg(proc.pid, sig)
+        return True
+    except (ProcessLookupError, PermissionError):
+        return False
+
+
+async def nudge_agent(agent_id: str, session_id: str, timeout_s: float) -> None:
+    """Best-effort 'wrap up and commit now' message into a running agent session."""
+
+    try:
+        proc = await asyncio.create_subprocess_exec(
+            "openclaw", "agent", "--agent", agent_id, "--session-id", session_id,
+            "--message", WRAP_UP_NUDGE, "--json",
+            cwd=str(CLAWD),
+            stdout=asyncio.subprocess.DEVNULL,
+            stderr=asyncio.subprocess.DEVNULL,
+        )
+    except OSError:
+        return
+    try:
+        await asyncio.wait_for(proc.wait(), timeout=timeout_s)
+    except asyncio.TimeoutError:
+        pass
+    finally:
+        # Also on cancellation: never leave a nudge turn running.
+        if proc.returncode is None:
+            proc.kill()
+
+
+def load_preempted() -> Dict[str, Any]:
+    data = load_json(PREEMPTED_PATH)
+    return data.get("tasks") if isinstance(data.get("tasks"), dict) else {}
+
+
+def save_preempted(tasks: Dict[str, Any]) -> None:
+    PREEMPTED_PATH.parent.mkdir(parents=True, exist_ok=True)
+    PREEMPTED_PATH.write_text(json.dumps({"tasks": tasks}, indent=2), encoding="utf-8")
+
+
+class ProcessExecutor:
+    """How run_queue executes tasks: real processes and `openclaw` turns.
+
+    overnight_sim.py plugs in a fake with the same methods to replay a
+    night against a virtual clock.
+    """
+
+    async def run_local(self, task: Dict[str, Any], dry_run: bool, log_dir: Path, cfg: Dict[str, Any]) -> TaskResult:
+        return await run_local_task(task, dry_run, log_dir=log_dir, cfg=cfg)
+
+    async def run_agent(self, task: Dict[str, Any], dry_run: bool, **kw: Any) -> TaskResult:
+        return await run_agent_task(task, dry_run, **kw)
+
+    async def run_agent_batch(self, tasks: List[Dict[str, Any]], batch_id: str, dry_run: bool, **kw: Any) -> List[TaskResult]:
+        return await run_agent_batch(tasks, batch_id, dry_run, **kw)
+
+    def usage_tokens(self) -> int:
+        return get_usage_total_tokens()
+
+    def signal(self, key: str, sig: int) -> bool:
+        return signal_task(key, sig)
+
+    async def nudge(self, agent_id: str, session_id: str, timeout_s: float) -> None:
+        await nudge_agent(agent_id, session_id, timeout_s)
+
+
+def new_run_id() -> str:
+    return utc_now().strftime("%Y%m%dT%H%M%SZ")
+
+
+def iter_progress_events(path: Path):
+    if not path.exists():
+        return
+    with path.open("r", encoding="utf-8", errors="replace") as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                ev = json.loads(line)
+            except json.JSONDecodeError:
+                # A crash mid-write can leave a torn last line.
+                continue
+            if isinstance(ev, dict):
+                yield ev
+
+
+def load_run_journal(run_id: Optional[str] = None) -> Optional[Dict[str, Any]]:
+    """Rebuild a run's state from its progress events.
+
+    With no run_id, the most recent run_start is used. Returns None if no
+    matching run is found. Tasks with a task_start but no task_end were in
+    flight when the runner died and are treated as retryable.
+    """
+
+    # Rotation only happens at run_start, so the latest run is always in the
+    # live file; older runs are located through the index.
+    events = read_indexed_events(read_index(run_id=run_id)) if run_id else iter_progress_events(PROGRESS_PATH)
+
+    runs: Dict[str, Dict[str, Any]] = {}
+    last_id: Optional[str] = None
+    for ev in events:
+        rid = ev.get("run_id")
+        if not rid:
+            continue
+        kind = ev.get("event")
+        if kind == "run_start":
+            runs[rid] = {"run_start": ev, "succeeded": {}, "failed": {}, "in_flight": {}, "ended": False}
+            last_id = rid
+            continue
+        j = runs.get(rid)
+        if j is None:
+            continue
+        if kind == "task_start":
+            task = ev.get("task") or {}
+            tid = str(task.get("id") or "")
+            if tid:
+                j["in_flight"][tid] = task
+        elif kind == "task_end":
+            tid = str(ev.get("task_id") or "")
+            j["in_flight"].pop(tid, None)
+            if ev.get("ok"):
+                j["succeeded"][tid] = ev
+                j["failed"].pop(tid, None)
+            else:
+                j["failed"][tid] = ev
+        elif kind == "run_end":
+            j["ended"] = True
+
+    return runs.get(run_id or last_id or "")
+
+
+def window_night(cfg: Dict[str, Any]) -> str:
+    """YYYYMMDD of the evening the current run window started on."""
+
+    tz = str(cfg.get("timezone") or DEFAULT_CONFIG["timezone"])
+    start_h = int(cfg.get("start_hour", DEFAULT_CONFIG["start_hour"]))
+    stop_h = int(cfg.get("stop_hour", DEFAULT_CONFIG["stop_hour"]))
+    n = now_tz(tz)
+    if start_h > stop_h and n.hour < stop_h:
+        n -= timedelta(days=1)
+    return n.strftime("%Y%m%d")
+
+
+async def run_queue(dry_run: bool, resume: Optional[str] = None, executor: Optional[ProcessExecutor] = None, worker: bool = False) -> int:
     q = load_json(QUEUE_PATH)
     tasks = q.get("tasks") if isinstance(q.get("tasks"), list) else []
     cfg = DEFAULT_CONFIG.copy()
@@ -316,120 +2041,589 @@ async def run_queue(dry_run: bool) -> int:
         return 0
 
     agent_id = str(cfg.get("agent_id") or DEFAULT_CONFIG["agent_id"])
-    session_id = f"overnight-{now_tz(str(cfg.get('timezone'))).strftime('%Y%m%d')}"
+    executor = executor or ProcessExecutor()
+
+    leases = None
+    owner = night = ""
+    if worker:
+        if overnight_leases is None:
+            print("--worker needs scripts/overnight_leases.py next to this script.")
+            return 1
+        leases = overnight_leases.LeaseStore(Path(cfg.get("lease_db") or (STATE_DIR / "overnight_leases.sqlite")))
+        owner = overnight_leases.worker_id()
+        night = window_night(cfg)
+        # Every worker runs the union of the queues published for the night.
+        tasks = await asyncio.to_thread(leases.publish, night, tasks)
+    lease_s = float(cfg.get("lease_seconds", DEFAULT_CONFIG["lease_seconds"]))
+    lease_max_attempts = int(cfg.get("lease_max_attempts", DEFAULT_CONFIG["lease_max_attempts"]))
+    # task id -> process key (task or batch id) for tasks this worker holds a lease on.
+    held: Dict[str, str] = {}
+    lease_stats = {"claimed": 0, "skipped": 0, "reclaimed": 0, "lost": 0}
+    # A task can stay reclaimable over several polls; count it once.
+    reclaimed_ids: Set[str] = set()
 
-    base_rev = current_git_head()
-    start_tokens = get_usage_total_tokens()
+    completed: List[TaskResult] = []
+    errors: List[TaskResult] = []
 
-    run_state = {
-        "started_at": datetime.now(timezone.utc).isoformat().replace("+00:00", "Z"),
-        "timezone": cfg.get("timezone"),
-        "session_id": session_id,
-        "base_rev": base_rev,
-        "start_total_tokens": start_tokens,
-        "dry_run": bool(dry_run),
-    }
-    RUN_STATE_PATH.parent.mkdir(parents=True, exist_ok=True)
-    RUN_STATE_PATH.write_text(json.dumps(run_state, indent=2), encoding="utf-8")
+    if resume:
+        journal = load_run_journal(None if resume == "latest" else resume)
+        if journal is None:
+            print(f"No run found to resume ({resume}) in {PROGRESS_PATH}.")
+            return 1
+        prev = journal["run_start"]
+        if journal["ended"]:
+            print(f"Run {prev['run_id']} already finished; nothing to resume.")
+            return 0
+
+        # Carry the original run's identity and baselines forward so commits
+        # and the token budget are measured across the whole night.
+        run_id = str(prev["run_id"])
+        session_id = str(prev.get("session_id") or "")
+        base_rev = str(prev.get("base_rev") or "") or current_git_head()
+        start_tokens = int(prev.get("start_total_tokens") or 0) or executor.usage_tokens()
+        log_dir = Path(prev.get("log_dir") or (LOG_DIR / run_id))
+        run_state = {k: v for k, v in prev.items() if k != "event"}
+
+        done_ids = set(journal["succeeded"])
+        for tid, ev in journal["succeeded"].items():
+            completed.append(TaskResult(task_id=tid, name=str(ev.get("name") or tid), ok=True, duration_s=float(ev.get("duration_s") or 0.0)))
+        tasks = [t for t in tasks if str(t.get("id") or "") not in done_ids]
+
+        log_event({
+            "event": "run_resume",
+            "run_id": run_id,
+            "ts": utc_now().isoformat().replace("+00:00", "Z"),
+            "skipped_succeeded": sorted(done_ids),
+            "retrying_in_flight": sorted(journal["in_flight"]),
+            "retrying_failed": sorted(journal["failed"]),
+        })
+    else:
+        run_id = new_run_id()
+        session_id = f"overnight-{now_tz(str(cfg.get('timezone'))).strftime('%Y%m%d')}"
+        if worker:
+            # Workers on different hosts must not share agent sessions.
+            session_id += f"-{safe_name(owner)}"
+        base_rev = current_git_head()
+        start_tokens = executor.usage_tokens()
+        log_dir = LOG_DIR / run_id
+
+        run_state = {
+            "run_id": run_id,
+            "started_at": utc_now().isoformat().replace("+00:00", "Z"),
+            "timezone": cfg.get("timezone"),
+            "session_id": session_id,
+            "base_rev": base_rev,
+            "start_total_tokens": start_tokens,
+            "dry_run": bool(dry_run),
+            "log_dir": str(log_dir),
+        }
+        if worker:
+            run_state.update({"worker": owner, "night": night})
+        maybe_rotate_progress(cfg)
+        log_event({"event": "run_start", **run_state})
 
-    append_jsonl(PROGRESS_PATH, {"event": "run_start", **run_state})
+    RUN_STATE_PATH.parent.mkdir(parents=True, exist_ok=True)
+    # pid lets --follow notice a runner that died without a run_end.
+    RUN_STATE_PATH.write_text(json.dumps({**run_state, "pid": os.getpid()}, indent=2), encoding="utf-8")
 
     # Sort by score (desc)
-    tasks_sorted = sorted(tasks, key=score_task, reverse=True)
+    # Tasks cut off by last night's stop window go first.
+    preempted_before = load_preempted()
+    prefer = set(preempted_before)
+    # Old tasks gain value so low priorities cannot starve forever.
+    task_ages = load_task_ages(tasks, save=not dry_run)
+    aging = aging_factors(task_ages, cfg)
+    tasks_sorted = sorted(tasks, key=lambda t: (str(t.get("id") or "") in prefer, aged_score(t, aging)), reverse=True)
 
-    max_parallel = int(cfg.get("max_parallel", 1) or 1)
     max_tokens = int(cfg.get("max_tokens", DEFAULT_CONFIG["max_tokens"]) or DEFAULT_CONFIG["max_tokens"])
 
-    completed: List[TaskResult] = []
-    errors: List[TaskResult] = []
-
-    sem = asyncio.Semaphore(max_parallel)
+    def on_concurrency_adjust(old: int, new: int, reason: str) -> None:
+        log_event({
+            "event": "concurrency_adjust",
+            "run_id": run_id,
+            "ts": utc_now().isoformat().replace("+00:00", "Z"),
+            "from": old,
+            "to": new,
+            "reason": reason,
+        })
+
+    controller = ConcurrencyController(cfg, on_concurrency_adjust)
+
+    def on_lane_rotate(lane: Lane, old: str, tokens: int) -> None:
+        log_event({
+            "event": "lane_rotate",
+            "run_id": run_id,
+            "ts": utc_now().isoformat().replace("+00:00", "Z"),
+            "lane": lane.name,
+            "from": old,
+            "to": lane.session_id,
+            "tokens": tokens,
+        })
+
+    lanes = LanePool(session_id, cfg, on_lane_rotate)
+    specs = SpecCache()
+
+    # task id -> (task, started_at) for tasks currently executing.
+    active: Dict[str, Tuple[Dict[str, Any], float]] = {}
+    preempting: Set[str] = set()
+    # task/batch id -> agent session it is running in (for the wrap-up nudge).
+    active_sessions: Dict[str, str] = {}
+    batch_stats = {"batches": 0, "batched_tasks": 0}
+
+    async def window_supervisor() -> None:
+        """Preempt running tasks once the stop window is reached."""
+
+        while not should_stop_now(cfg):
+            await asyncio.sleep(min(60.0, max(1.0, seconds_until_stop(cfg))))
+
+        grace = float(cfg.get("stop_grace_seconds", DEFAULT_CONFIG["stop_grace_seconds"]))
+        kill_after = float(cfg.get("stop_kill_after_seconds", DEFAULT_CONFIG["stop_kill_after_seconds"]))
+        victims = dict(active)
+        log_event({
+            "event": "stop_window_preempt",
+            "run_id": run_id,
+            "ts": utc_now().isoformat().replace("+00:00", "Z"),
+            "running": sorted(victims),
+            "grace_seconds": grace,
+        })
+        preempting.update(victims)
+
+        agents = [tid for tid, (t, _) in victims.items() if str(t.get("type") or "codex").lower() != "local"]
+        for tid in victims:
+            if tid not in agents:
+                executor.signal(tid, signal.SIGTERM)
+        # One nudge per lane session; tasks in a lane run one at a time.
+        nudges = [asyncio.create_task(executor.nudge(agent_id, sid, grace)) for sid in sorted({active_sessions[tid] for tid in agents if tid in active_sessions})]
 
-    async def run_one(task: Dict[str, Any]) -> TaskResult:
-        async with sem:
-            t0 = datetime.now(timezone.utc).isoformat().replace("+00:00", "Z")
-            append_jsonl(PROGRESS_PATH, {"event": "task_start", "ts": t0, "task": task})
+        try:
+            await asyncio.sleep(grace)
+        finally:
+            # Nudges time out with the grace period; cancel any stragglers
+            # (or all of them if the run ends first) and collect them.
+            for n in nudges:
+                n.cancel()
+            await asyncio.gather(*nudges, return_exceptions=True)
+        for tid in agents:
+            executor.signal(tid, signal.SIGTERM)
+        await asyncio.sleep(kill_after)
+        for tid in victims:
+            executor.signal(tid, signal.SIGKILL)
+
+    def log_task_end(res: TaskResult, ttype: str, batch: Optional[Dict[str, Any]] = None) -> None:
+        t1 = utc_now().isoformat().replace("+00:00", "Z")
+        payload = {
+            "event": "task_end",
+            "run_id": run_id,
+            "ts": t1,
+            "task_id": res.task_id,
+            "name": res.name,
+            "type": ttype,
+            "ok": res.ok,
+            "duration_s": round(res.duration_s, 2),
+            # Already bounded to log_head_bytes + log_tail_bytes per stream.
+            "stdout": res.stdout,
+            "stderr": res.stderr,
+            "logs": res.log_paths or [],
+        }
+        if res.cache:
+            payload["cache"] = res.cache
+        if res.tokens is not None:
+            payload["tokens"] = res.tokens
+        if res.rusage:
+            payload["rusage"] = res.rusage
+        if res.commit_hashes:
+            payload["commits"] = res.commit_hashes
+        if res.interrupted:
+            payload["interrupted"] = True
+        if batch:
+            payload["batch"] = batch
+        log_event(payload)
+
+    async def run_one(task: Dict[str, Any]) -> List[TaskResult]:
+        # Concurrency is bounded by the dispatch loop below (controller.limit).
+        ttype = str(task.get("type") or "codex").lower()
+        lane = await lanes.acquire(task) if ttype != "local" else None
+        turn: List[Tuple[Dict[str, Any], TaskResult, int]] = []
+        try:
+            t0 = utc_now().isoformat().replace("+00:00", "Z")
+            start_ev = {"event": "task_start", "run_id": run_id, "ts": t0, "task": task}
+            if lane is not None:
+                start_ev["session_id"] = lane.session_id
+            log_event(start_ev)
 
-            ttype = str(task.get("type") or "codex").lower()
             timeout_minutes = int(task.get("timeout_minutes", 30) or 30)
+            started = CLOCK()
+            active[str(task.get("id") or "")] = (task, started)
             try:
-                if ttype == "local":
-                    coro = run_local_task(task, dry_run)
+                if lane is None:
+                    coro = executor.run_local(task, dry_run, log_dir=log_dir, cfg=cfg)
                 else:
-                    coro = run_agent_task(task, dry_run, agent_id=agent_id, session_id=session_id)
+                    active_sessions[str(task.get("id") or "")] = lane.session_id
+                    coro = executor.run_agent(task, dry_run, agent_id=agent_id, session_id=lane.session_id, log_dir=log_dir, cfg=cfg, carry=lanes.take_carry(lane), sent_specs=lane.specs, specs=specs)
 
                 res: TaskResult = await asyncio.wait_for(coro, timeout=timeout_minutes * 60)
             except asyncio.TimeoutError:
-                res = TaskResult(task_id=str(task.get("id")), name=str(task.get("name")), ok=False, stderr=f"timeout after {timeout_minutes}m")
+                logs = await finalize_logs(list(task_log_paths(log_dir, str(task.get("id") or ""))), cfg)
+                res = TaskResult(task_id=str(task.get("id")), name=str(task.get("name")), ok=False, stderr=f"timeout after {timeout_minutes}m", duration_s=CLOCK() - started, log_paths=logs, timed_out=True)
             except Exception as e:
-                res = TaskResult(task_id=str(task.get("id")), name=str(task.get("name")), ok=False, stderr=str(e))
-
-            t1 = datetime.now(timezone.utc).isoformat().replace("+00:00", "Z")
-            payload = {
-                "event": "task_end",
-                "ts": t1,
-                "task_id": res.task_id,
-                "name": res.name,
-                "ok": res.ok,
-                "duration_s": round(res.duration_s, 2),
-                "stdout": res.stdout[:8000],
-                "stderr": res.stderr[:8000],
-            }
-            append_jsonl(PROGRESS_PATH, payload)
-            return res
+                res = TaskResult(task_id=str(task.get("id")), name=str(task.get("name")), ok=False, stderr=str(e), duration_s=CLOCK() - started)
+
+            turn.append((task, res, res.tokens if res.tokens is not None else estimator.tokens(task)))
+        finally:
+            # Also on cancellation, or the lane stays locked for the night.
+            active.pop(str(task.get("id") or ""), None)
+            active_sessions.pop(str(task.get("id") or ""), None)
+            if lane is not None:
+                lanes.release(lane, turn)
+        if res.task_id in preempting and not res.ok:
+            res.interrupted = True
+        controller.on_result(res, timeout_minutes * 60)
+        log_task_end(res, ttype)
+        return [res]
+
+    async def run_batch(batch: List[Dict[str, Any]]) -> List[TaskResult]:
+        """One agent turn for several small tasks; each still gets task_start/task_end."""
+
+        ids = [str(t.get("id") or "") for t in batch]
+        batch_id = batch_proc_key(batch)
+        ttype = batch_key(batch[0])[0]
+        lane = await lanes.acquire(batch[0])
+        turn: List[Tuple[Dict[str, Any], TaskResult, int]] = []
+        try:
+            t0 = utc_now().isoformat().replace("+00:00", "Z")
+            for task in batch:
+                log_event({"event": "task_start", "run_id": run_id, "ts": t0, "task": task, "batch": batch_id, "session_id": lane.session_id})
+
+            timeout_minutes = max(int(t.get("timeout_minutes", 30) or 30) for t in batch)
+            started = CLOCK()
+            active[batch_id] = ({"id": batch_id, "type": ttype}, started)
+            active_sessions[batch_id] = lane.session_id
+            try:
+                coro = executor.run_agent_batch(batch, batch_id, dry_run, agent_id=agent_id, session_id=lane.session_id, log_dir=log_dir, cfg=cfg, carry=lanes.take_carry(lane), sent_specs=lane.specs, specs=specs)
+                results = await asyncio.wait_for(coro, timeout=timeout_minutes * 60)
+            except asyncio.TimeoutError:
+                logs = await finalize_logs(list(task_log_paths(log_dir, batch_id)), cfg)
+                results = [
+                    TaskResult(task_id=tid, name=str(t.get("name")), ok=False, stderr=f"batch timeout after {timeout_minutes}m", duration_s=(CLOCK() - started) / len(batch), log_paths=logs, timed_out=True)
+                    for tid, t in zip(ids, batch)
+                ]
+            except Exception as e:
+                results = [TaskResult(task_id=tid, name=str(t.get("name")), ok=False, stderr=str(e), duration_s=(CLOCK() - started) / len(batch)) for tid, t in zip(ids, batch)]
+            turn = [(t, r, r.tokens if r.tokens is not None else estimator.tokens(t)) for t, r in zip(batch, results)]
+        finally:
+            active.pop(batch_id, None)
+            active_sessions.pop(batch_id, None)
+            lanes.release(lane, turn)
+        elapsed = CLOCK() - started
+
+        for res in results:
+            if batch_id in preempting and not res.ok:
+                res.interrupted = True
+        # The batch held one slot, so the controller sees one outcome.
+        worst = next((r for r in results if not r.ok), results[0])
+        controller.on_result(replace(worst, duration_s=elapsed), timeout_minutes * 60)
+
+        info = {"id": batch_id, "size": len(batch), "duration_s": round(elapsed, 2)}
+        for res in results:
+            log_task_end(res, ttype, info)
+        batch_stats["batches"] += 1
+        batch_stats["batched_tasks"] += len(batch)
+        return results
+
+    planner = str(cfg.get("planner") or DEFAULT_CONFIG["planner"]).lower()
+    estimator = TaskEstimator.from_journal(cfg, [str(t.get("id") or "") for t in tasks_sorted])
+    backlog = list(tasks_sorted)
+    running: Dict[asyncio.Task, Tuple[List[Dict[str, Any]], float]] = {}
+    est_tokens_dispatched = 0
+    last_plan: Optional[List[str]] = None
+
+    supervisor = asyncio.create_task(window_supervisor() if not dry_run else asyncio.sleep(0))
+
+    async def lease_heartbeat() -> None:
+        interval = float(cfg.get("lease_heartbeat_seconds", DEFAULT_CONFIG["lease_heartbeat_seconds"]))
+        while True:
+            await asyncio.sleep(interval)
+            for tid in await asyncio.to_thread(leases.renew, night, list(held), owner, lease_s):
+                lease_stats["lost"] += 1
+                log_event({"event": "lease_lost", "run_id": run_id, "ts": utc_now().isoformat().replace("+00:00", "Z"), "task_id": tid, "worker": owner})
+                # Another worker may already be re-running it; stop ours.
+                key = held.pop(tid, None)
+                if key:
+                    executor.signal(key, signal.SIGTERM)
+
+    heartbeat = asyncio.create_task(lease_heartbeat()) if leases is not None else None
+
+    def reclaimable(snap: Dict[str, Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Tasks released, published late by another worker, or whose lease lapsed.
+
+        Built from the store's rows rather than our own queue, so tasks that
+        only another worker's queue had are picked up too.
+        """
+
+        out = [
+            st["task"]
+            for tid, st in snap.items()
+            if tid not in held and st["state"] in ("queued", "leased") and not st["live"]
+        ]
+        return sorted(out, key=lambda t: (str(t.get("id") or "") in prefer, aged_score(t, aging)), reverse=True)
+
+    batching = bool(cfg.get("batch_agent_tasks", DEFAULT_CONFIG["batch_agent_tasks"]))
+    batch_max = max(1, int(cfg.get("batch_max_tasks", DEFAULT_CONFIG["batch_max_tasks"]) or 1))
+    batch_max_s = float(cfg.get("batch_max_minutes", DEFAULT_CONFIG["batch_max_minutes"]) or 0) * 60
+
+    def batchable(task: Dict[str, Any]) -> bool:
+        return (
+            batching
+            and task_kind(task) == "agent"
+            and task.get("batch", True) is not False
+            and estimator.seconds(task) <= batch_max_s
+        )
 
-    pending: List[asyncio.Task] = []
+    fair_share = bool(cfg.get("fair_share", DEFAULT_CONFIG["fair_share"]))
+    run_t0 = CLOCK()
+    # task id -> seconds from run start until dispatch; project -> run seconds.
+    waited: Dict[str, float] = {}
+    served: Dict[str, float] = {}
+
+    def fair_pick(cands: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """Head of the least-served project still under its share of slots.
+
+        Candidates are value-ordered, so within a project the best task goes
+        first; carried-over interrupted tasks keep their head start.
+        """
+
+        if not fair_share or str(cands[0].get("id") or "") in prefer:
+            return cands[0]
+        pending = {task_project(t) for t in backlog}
+        if len(pending) <= 1:
+            return cands[0]
+        busy: Dict[str, int] = {}
+        for ts, _ in running.values():
+            for t in ts:
+                busy[task_project(t)] = busy.get(task_project(t), 0) + 1
+        total_w = sum(project_weight(p, cfg) for p in pending | set(busy))
+        heads: Dict[str, Dict[str, Any]] = {}
+        for t in cands:
+            heads.setdefault(task_project(t), t)
+        under = [p for p in heads if busy.get(p, 0) < max(1, math.ceil(controller.limit * project_weight(p, cfg) / total_w))]
+        pick = min(under or list(heads), key=lambda p: (busy.get(p, 0) / project_weight(p, cfg), served.get(p, 0.0) / project_weight(p, cfg)))
+        return heads[pick]
+
+    async def collect(done) -> None:
+        for d in done:
+            results = d.result()
+            batch, _ = running.pop(d)
+            for task, res in zip(batch, results):
+                served[task_project(task)] = served.get(task_project(task), 0.0) + res.duration_s
+                # Batched durations are an even share of one turn, not a
+                # measurement of the task, so keep them out of calibration.
+                if len(batch) == 1:
+                    estimator.observe(task, res)
+                (completed if res.ok else errors).append(res)
+                if leases is not None and held.pop(res.task_id, None) is not None:
+                    if res.interrupted:
+                        await asyncio.to_thread(leases.release, night, res.task_id, owner)
+                    else:
+                        await asyncio.to_thread(leases.finish, night, res.task_id, owner, res.ok, {"run_id": run_id, "duration_s": round(res.duration_s, 2)})
+
+    while True:
+        if not backlog and leases is not None and not should_stop_now(cfg):
+            snap = await asyncio.to_thread(leases.snapshot, night)
+            backlog = reclaimable(snap)
+            reclaimed_ids.update(str(t.get("id")) for t in backlog)
+            lease_stats["reclaimed"] = len(reclaimed_ids)
+            if not backlog and (running or any(st["live"] for st in snap.values())):
+                # Other workers still hold leases; their tasks come back here
+                # if a worker dies and its lease lapses.
+                poll = float(cfg.get("lease_poll_seconds", DEFAULT_CONFIG["lease_poll_seconds"]))
+                if running:
+                    done, _ = await asyncio.wait(list(running), timeout=poll, return_when=asyncio.FIRST_COMPLETED)
+                    await collect(done)
+                else:
+                    await asyncio.sleep(poll)
+                continue
+        if not backlog:
+            break
 
-    for task in tasks_sorted:
         if should_stop_now(cfg) and not dry_run:
-            append_jsonl(PROGRESS_PATH, {"event": "stop_window_reached", "ts": datetime.now(timezone.utc).isoformat().replace("+00:00", "Z")})
+            log_event({"event": "stop_window_reached", "run_id": run_id, "ts": utc_now().isoformat().replace("+00:00", "Z")})
             break
 
         # Token budget check (best-effort)
+        cur_tokens = 0
         if not dry_run:
-            cur_tokens = get_usage_total_tokens()
+            cur_tokens = executor.usage_tokens()
             if cur_tokens and start_tokens and (cur_tokens - start_tokens) >= max_tokens:
-                append_jsonl(PROGRESS_PATH, {
+                log_event({
                     "event": "token_budget_reached",
-                    "ts": datetime.now(timezone.utc).isoformat().replace("+00:00", "Z"),
+                    "run_id": run_id,
+                    "ts": utc_now().isoformat().replace("+00:00", "Z"),
                     "start_total_tokens": start_tokens,
                     "current_total_tokens": cur_tokens,
                     "budget": max_tokens,
                 })
                 break
 
-        pending.append(asyncio.create_task(run_one(task)))
-
-        # Keep the pending list bounded so we can stop in-between.
-        if len(pending) >= max_parallel:
-            done, still = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
-            pending = list(still)
-            for d in done:
-                res = d.result()
-                (completed if res.ok else errors).append(res)
+        if planner == "knapsack":
+            # Re-plan against what is left: lane-seconds not already promised
+            # to running tasks, and the budget not already spent or committed.
+            now = CLOCK()
+            seconds_left = seconds_until_stop(cfg)
+            busy = sum(max(0.0, sum(estimator.seconds(t) for t in ts) - (now - t0)) for ts, t0 in running.values())
+            measured = (cur_tokens - start_tokens) if cur_tokens and start_tokens else 0
+            tokens_left = max_tokens - max(measured, est_tokens_dispatched)
+            plan = plan_tasks(backlog, estimator, seconds_left, controller.limit * seconds_left - busy, tokens_left, cfg, prefer, aging)
+            plan_ids = [str(t.get("id") or "") for t in plan]
+            if plan_ids != last_plan:
+                last_plan = plan_ids
+                log_event({
+                    "event": "plan",
+                    "run_id": run_id,
+                    "ts": utc_now().isoformat().replace("+00:00", "Z"),
+                    "selected": plan_ids,
+                    "deferred": [str(t.get("id") or "") for t in backlog if t not in plan],
+                    "seconds_left": round(seconds_left),
+                    "tokens_left": tokens_left,
+                    "calibration": round(estimator.calibration(), 3),
+                })
+            if not plan:
+                if running:
+                    # Nothing fits right now; a completion may free capacity
+                    # or improve estimates.
+                    done, _ = await asyncio.wait(list(running), return_when=asyncio.FIRST_COMPLETED)
+                    await collect(done)
+                    continue
+                break
+            task = fair_pick(plan)
+            pool = [t for t in plan if t is not task]
+        else:
+            task = fair_pick(backlog)
+            pool = [t for t in backlog if t is not task]
+
+        # Small compatible agent tasks ride along in the same turn.
+        batch = [task]
+        if batchable(task):
+            for other in pool:
+                if len(batch) >= batch_max:
+                    break
+                if batchable(other) and batch_key(other) == batch_key(task):
+                    batch.append(other)
+        for t in batch:
+            backlog.remove(t)
+        if planner == "knapsack":
+            # Only log a new plan when it changes for reasons other than
+            # dispatching its head.
+            last_plan = [tid for tid, t in zip(plan_ids, plan) if t not in batch]
+
+        if leases is not None:
+            # Tasks another worker holds (or finished) are simply dropped here.
+            claimed = [t for t in batch if await asyncio.to_thread(leases.claim, night, str(t.get("id") or ""), owner, lease_s, lease_max_attempts)]
+            lease_stats["claimed"] += len(claimed)
+            lease_stats["skipped"] += len(batch) - len(claimed)
+            if not claimed:
+                continue
+            batch, task = claimed, claimed[0]
+            for t in batch:
+                held[str(t.get("id") or "")] = batch_proc_key(batch)
+
+        for t in batch:
+            waited[str(t.get("id") or "")] = CLOCK() - run_t0
+        controller.observe_load()
+        running[asyncio.create_task(run_one(task) if len(batch) == 1 else run_batch(batch))] = (batch, CLOCK())
+        est_tokens_dispatched += sum(estimator.tokens(t) for t in batch)
+
+        # Keep the running set bounded so we can stop in-between. The bound
+        # is re-read every time since the controller may have moved it.
+        while len(running) >= controller.limit:
+            done, _ = await asyncio.wait(list(running), return_when=asyncio.FIRST_COMPLETED)
+            await collect(done)
 
     # drain
-    if pending:
-        done, _ = await asyncio.wait(pending)
-        for d in done:
-            res = d.result()
-            (completed if res.ok else errors).append(res)
+    if running:
+        done, _ = await asyncio.wait(list(running))
+        await collect(done)
+    supervisor.cancel()
+    if heartbeat is not None:
+        heartbeat.cancel()
+
+    # Remember what the stop window cut off so the next run starts with it.
+    finished_ids = {r.task_id for r in completed}
+    carry = {tid: info for tid, info in preempted_before.items() if tid not in finished_ids and tid not in {r.task_id for r in errors}}
+    for r in errors:
+        if r.interrupted:
+            carry[r.task_id] = {
+                "run_id": run_id,
+                "interrupted_at": utc_now().isoformat().replace("+00:00", "Z"),
+                "elapsed_s": round(r.duration_s, 1),
+                "logs": r.log_paths or [],
+            }
+    if not dry_run:
+        save_preempted(carry)
 
-    end_tokens = get_usage_total_tokens()
+    end_tokens = executor.usage_tokens()
     commits = git_commits_since(base_rev)
 
+    projects: Dict[str, Dict[str, Any]] = {}
+    outcome = {r.task_id: r.ok for r in completed + errors}
+    run_h = max(CLOCK() - run_t0, 1.0) / 3600
+    for t in tasks_sorted:
+        tid = str(t.get("id") or "")
+        p = projects.setdefault(task_project(t), {"tasks": 0, "completed": 0, "failed": 0, "not_run": 0, "waits": [], "ages": [], "queued_ages": []})
+        p["tasks"] += 1
+        age_d = max(0.0, run_t0 - task_ages.get(tid, run_t0)) / 86400
+        p["ages"].append(age_d)
+        if tid in outcome:
+            p["completed" if outcome[tid] else "failed"] += 1
+        else:
+            p["not_run"] += 1
+            p["queued_ages"].append(age_d)
+        if tid in waited:
+            p["waits"].append(waited[tid])
+    for name, p in projects.items():
+        waits, ages, queued_ages = p.pop("waits"), p.pop("ages"), p.pop("queued_ages")
+        p.update({
+            "weight": project_weight(name, cfg),
+            "served_s": round(served.get(name, 0.0), 1),
+            "throughput_per_h": round(p["completed"] / run_h, 2),
+            "mean_wait_s": round(sum(waits) / len(waits), 1) if waits else None,
+            "max_wait_s": round(max(waits), 1) if waits else None,
+            "mean_age_days": round(sum(ages) / len(ages), 2) if ages else None,
+            "oldest_waiting_days": round(max(queued_ages), 2) if queued_ages else None,
+        })
+
+    cache_hits = sum(1 for r in completed + errors if r.cache == "hit")
+    cache_misses = sum(1 for r in completed + errors if r.cache == "miss")
+
     run_end = {
         "event": "run_end",
-        "ended_at": datetime.now(timezone.utc).isoformat().replace("+00:00", "Z"),
+        "run_id": run_id,
+        "ended_at": utc_now().isoformat().replace("+00:00", "Z"),
         "completed": [{"id": r.task_id, "name": r.name} for r in completed],
         "errors": [{"id": r.task_id, "name": r.name, "stderr": r.stderr} for r in errors],
+        "interrupted": [r.task_id for r in errors if r.interrupted],
         "commits": commits,
         "start_total_tokens": start_tokens,
         "end_total_tokens": end_tokens,
         "delta_tokens": (end_tokens - start_tokens) if end_tokens and start_tokens else None,
         "dry_run": bool(dry_run),
+        "parallelism": controller.summary(),
+        "lanes": lanes.summary(),
+        "worker": {"id": owner, "night": night, **lease_stats} if leases is not None else None,
+        "resources": summarize_resources(completed + errors),
+        "projects": projects,
+        "prompts": specs.summary(),
+        "batching": {
+            "batches": batch_stats["batches"],
+            "batched_tasks": batch_stats["batched_tasks"],
+            "turns_saved": batch_stats["batched_tasks"] - batch_stats["batches"],
+        },
+        "cache": {
+            "hits": cache_hits,
+            "misses": cache_misses,
+            "hit_rate": round(cache_hits / (cache_hits + cache_misses), 3) if (cache_hits + cache_misses) else None,
+        },
     }
-    append_jsonl(PROGRESS_PATH, run_end)
+    log_event(run_end)
 
     # Update run state file for morning_summary.py
     run_state.update({
@@ -439,10 +2633,15 @@ async def run_queue(dry_run: bool) -> int:
         "commits": commits,
         "end_total_tokens": end_tokens,
         "delta_tokens": run_end["delta_tokens"],
+        "projects": projects,
     })
     RUN_STATE_PATH.write_text(json.dumps(run_state, indent=2), encoding="utf-8")
 
     print(f"Completed: {len(completed)} | Errors: {len(errors)} | Commits: {len(commits)}")
+    if len(projects) > 1:
+        for name, p in sorted(projects.items()):
+            wait = f" | mean wait {p['mean_wait_s']}s" if p["mean_wait_s"] is not None else ""
+            print(f"  {name}: {p['completed']}/{p['tasks']} done, {p['not_run']} not run{wait}")
     if errors:
         print("Errors:")
         for e in errors[:5]:
@@ -451,15 +2650,197 @@ async def run_queue(dry_run: bool) -> int:
     return 0 if not errors else 2
 
 
+def report(run_id: Optional[str] = None, task_id: Optional[str] = None, since: Optional[str] = None) -> int:
+    """Answer history questions from the sidecar index without scanning the journal."""
+
+    if task_id:
+        entries = [e for e in read_index(run_id=run_id, task_id=task_id, since=since) if e.get("e") == "task_end"]
+        if not entries:
+            print(f"No task_end events for task {task_id}.")
+            return 1
+        for ev in read_indexed_events(entries):
+            status = "ok" if ev.get("ok") else "FAIL"
+            err = str(ev.get("stderr") or "").strip().splitlines()
+            tail = f" — {err[-1][:160]}" if err and not ev.get("ok") else ""
+            print(f"{ev.get('ts')} run={ev.get('run_id')} {status} {ev.get('duration_s')}s{tail}")
+        return 0
+
+    if run_id:
+        entries = [e for e in read_index(run_id=run_id) if e.get("e") in ("run_start", "run_resume", "task_end", "run_end", "stop_window_reached", "token_budget_reached", "run_interrupt")]
+        if not entries:
+            print(f"No events for run {run_id}.")
+            return 1
+        for ev in read_indexed_events(entries):
+            kind = ev.get("event")
+            if kind == "task_end":
+                status = "ok" if ev.get("ok") else "FAIL"
+                print(f"  {status:4} {ev.get('task_id')} ({ev.get('duration_s')}s)")
+            elif kind == "run_end":
+                print(f"{kind} {ev.get('ended_at')}: completed={len(ev.get('completed') or [])} errors={len(ev.get('errors') or [])} delta_tokens={ev.get('delta_tokens')}")
+            else:
+                print(f"{kind} {ev.get('ts') or ev.get('started_at') or ''}")
+        return 0
+
+    entries = [e for e in read_index(since=since) if e.get("e") in ("run_start", "run_end")]
+    if not entries:
+        print("No runs found.")
+        return 1
+    runs: Dict[str, Dict[str, Any]] = {}
+    for ev in read_indexed_events(entries):
+        r = runs.setdefault(str(ev.get("run_id")), {})
+        r[str(ev.get("event"))] = ev
+    for rid, r in runs.items():
+        start = (r.get("run_start") or {}).get("started_at", "?")
+        end = r.get("run_end")
+        if end:
+            print(f"{rid} started={start} completed={len(end.get('completed') or [])} errors={len(end.get('errors') or [])} commits={len(end.get('commits') or [])}")
+        else:
+            print(f"{rid} started={start} (no run_end; resumable)")
+    return 0
+
+
+def find_task_logs(task_id: str) -> Tuple[Optional[Path], Optional[Path]]:
+    """Return the newest (stdout, stderr) log pair for task_id, live or compressed."""
+
+    if not LOG_DIR.exists():
+        return None, None
+    out_name, err_name = (p.name for p in task_log_paths(LOG_DIR, task_id))
+    for run_dir in sorted((d for d in LOG_DIR.iterdir() if d.is_dir()), reverse=True):
+        for suffix in ("", ".gz"):
+            out_p = run_dir / (out_name + suffix)
+            err_p = run_dir / (err_name + suffix)
+            if out_p.exists() or err_p.exists():
+                return out_p, err_p
+    return None, None
+
+
+def runner_alive(run_id: str) -> bool:
+    """False once the runner that owns run_id is known to be gone."""
+
+    state = load_json(RUN_STATE_PATH)
+    if state.get("run_id") != run_id:
+        return True  # another run took over the state file; rely on the journal
+    if state.get("ended_at"):
+        return False
+    try:
+        os.kill(int(state["pid"]), 0)
+    except (KeyError, TypeError, ValueError):
+        return True  # state written before pids were recorded
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def task_finished(run_id: str, task_id: str) -> bool:
+    """True once the journal closes task_id in run_id (or the whole run)."""
+
+    for e in read_index(run_id=run_id):
+        kind = e.get("e")
+        if kind in ("run_end", "run_interrupt") or (kind == "task_end" and e.get("t") == task_id):
+            return True
+    return False
+
+
+def follow_task(task_id: str, poll_s: float = 0.5, check_s: float = 2.0) -> int:
+    """Tail a task's logs live until the journal ends the task or its runner dies.
+
+    Also stops when the runner removes the plain logs after compressing them.
+    With compress_logs off the files stay, so the journal (task_end, run_end,
+    run_interrupt) and the runner's pid in overnight_run.json decide.
+    """
+
+    out_p, err_p = find_task_logs(task_id)
+    if out_p is None or err_p is None:
+        print(f"No logs found for task {task_id} under {LOG_DIR}.", file=sys.stderr)
+        return 1
+
+    if out_p.suffix == ".gz":
+        # Task already finished: dump the compressed logs.
+        for p, sink in ((out_p, sys.stdout), (err_p, sys.stderr)):
+            if p.exists():
+                with gzip.open(p, "rt", encoding="utf-8", errors="replace") as f:
+                    shutil.copyfileobj(f, sink)
+        return 0
+
+    handles = []
+    for p, sink in ((out_p, sys.stdout), (err_p, sys.stderr)):
+        try:
+            handles.append((p, p.open("r", encoding="utf-8", errors="replace"), sink))
+        except FileNotFoundError:
+            pass
+
+    run_id = out_p.parent.name
+    next_check = 0.0
+    done = False
+    try:
+        while True:
+            got = False
+            for _, fh, sink in handles:
+                data = fh.read()
+                if data:
+                    sink.write(data)
+                    sink.flush()
+                    got = True
+            if got:
+                continue
+            # The task is over: everything written before that has been read.
+            if done:
+                return 0
+            # The runner removes the plain log once it is compressed, so a
+            # missing file plus no new data means the task finished.
+            if not any(p.exists() for p, _, _ in handles):
+                return 0
+            if time.monotonic() >= next_check:
+                next_check = time.monotonic() + check_s
+                if task_finished(run_id, task_id):
+                    done = True
+                    continue
+                if not runner_alive(run_id):
+                    print(f"Runner for {run_id} is gone; stopping.", file=sys.stderr)
+                    done = True
+                    continue
+            time.sleep(poll_s)
+    except KeyboardInterrupt:
+        return 130
+    finally:
+        for _, fh, _ in handles:
+            fh.close()
+
+
 def main() -> None:
     ap = argparse.ArgumentParser(description="OC-014 overnight queue runner")
     ap.add_argument("--dry-run", action="store_true", help="Do not execute tasks; just log what would happen")
+    ap.add_argument("--follow", metavar="TASK_ID", help="Tail a running task's stdout/stderr logs and exit when it finishes")
+    ap.add_argument(
+        "--resume",
+        nargs="?",
+        const="latest",
+        metavar="RUN_ID",
+        help="Resume an interrupted run from overnight_progress.jsonl (default: most recent run)",
+    )
+    ap.add_argument("--worker", action="store_true", help="Share the night's queue with other hosts through the lease store (lease_db)")
+    ap.add_argument("--report", action="store_true", help="Summarize history from the progress index (see --run/--task/--since)")
+    ap.add_argument("--run", metavar="RUN_ID", help="With --report: show one run")
+    ap.add_argument("--task", metavar="TASK_ID", help="With --report: show every recorded outcome for a task")
+    ap.add_argument("--since", metavar="DATE", help="With --report: only include events at or after this ISO date")
     args = ap.parse_args()
 
+    if args.report:
+        raise SystemExit(report(run_id=args.run, task_id=args.task, since=args.since))
+
+    if args.follow:
+        raise SystemExit(follow_task(args.follow))
+
+    if args.worker and args.dry_run:
+        ap.error("--worker cannot be combined with --dry-run (claims would mark tasks done)")
+
     try:
-        rc = asyncio.run(run_queue(dry_run=args.dry_run))
+        rc = asyncio.run(run_queue(dry_run=args.dry_run, resume=args.resume, worker=args.worker))
     except KeyboardInterrupt:
-        append_jsonl(PROGRESS_PATH, {"event": "run_interrupt", "ts": datetime.now(timezone.utc).isoformat().replace("+00:00", "Z")})
+        run_id = load_json(RUN_STATE_PATH).get("run_id")
+        log_event({"event": "run_interrupt", "run_id": run_id, "ts": utc_now().isoformat().replace("+00:00", "Z")})
         rc = 130
     raise SystemExit(rc)
 
@@ -0,0 +1,284 @@
+#!/usr/bin/env python3
+"""overnight_queue_store.py — transactional updates to state/overnight_queue.json.
+
+Producers (daily_review.py) and the runner (overnight_builder.py) share the
+queue file's `items` list. Every change goes through QueueStore, which:
+
+  - takes an exclusive flock on <queue>.lock for the whole read-modify-write
+    (readers take a shared lock), so concurrent enqueue/complete never lose
+    each other's items
+  - appends the operation to a write-ahead log (<queue>.wal, fsynced) before
+    touching the queue, then writes the new document to a temp file and
+    renames it over the queue (atomic commit); the document's `seq` records
+    the last applied operation
+  - on the next open, replays WAL operations newer than `seq` (a crash
+    between the log write and the rename), then truncates the log
+
+Item lifecycle: enqueue (status QUEUED, id assigned if missing) -> claim
+(RUNNING, claimed_by/claimed_at) -> complete (removed; the builder's results
+store is the durable record) or requeue (back to QUEUED). Items without a
+status count as QUEUED. Other top-level keys (`tasks`, `config` used by
+overnight_queue.py) are preserved.
+
+Usage:
+  python3 scripts/advanced/overnight_queue_store.py --status [--queue PATH]
+  python3 scripts/advanced/overnight_queue_store.py --requeue-stale [--max-age-hours 12]
+"""
+
+from __future__ import annotations
+
+import argparse
+import contextlib
+import fcntl
+import json
+import os
+import socket
+import uuid
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional
+
+CLAWD = Path(os.environ.get("OPENCLAW_WORKSPACE", str(Path.home() / ".openclaw" / "workspace")))
+DEFAULT_QUEUE_PATH = CLAWD / "state" / "overnight_queue.json"
+
+QUEUED = "QUEUED"
+RUNNING = "RUNNING"
+
+
+def _ts() -> str:
+    return datetime.now(timezone.utc).isoformat().replace("+00:00", "Z")
+
+
+def owner_id() -> str:
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+def _owner_alive(owner: str) -> bool:
+    """False only when the owner is provably gone (same host, dead pid)."""
+
+    host, _, pid = owner.rpartition(":")
+    if host != socket.gethostname() or not pid.isdigit():
+        return True
+    try:
+        os.kill(int(pid), 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def _fsync_dir(path: Path) -> None:
+    try:
+        fd = os.open(str(path), os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+
+def _item_status(item: Dict[str, Any]) -> str:
+    return str(item.get("status") or QUEUED).upper()
+
+
+class QueueStore:
+    def __init__(self, path: Path = DEFAULT_QUEUE_PATH) -> None:
+        self.path = Path(path)
+        self.lock_path = self.path.with_name(self.path.name + ".lock")
+        self.wal_path = self.path.with_name(self.path.name + ".wal")
+
+    # -- plumbing -----------------------------------------------------------
+
+    @contextlib.contextmanager
+    def _locked(self, exclusive: bool) -> Iterator[None]:
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        fd = os.open(str(self.lock_path), os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+            yield
+        finally:
+            fcntl.flock(fd, fcntl.LOCK_UN)
+            os.close(fd)
+
+    def _load(self) -> Dict[str, Any]:
+        try:
+            data = json.loads(self.path.read_text(encoding="utf-8"))
+        except FileNotFoundError:
+            data = {}
+        except (OSError, ValueError) as exc:
+            raise RuntimeError(f"{self.path} is unreadable: {exc}") from exc
+        if not isinstance(data, dict):
+            data = {}
+        if not isinstance(data.get("items"), list):
+            data["items"] = []
+        return data
+
+    def _pending_wal(self, doc: Dict[str, Any]) -> List[Dict[str, Any]]:
+        if not self.wal_path.exists():
+            return []
+        seq = int(doc.get("seq") or 0)
+        ops = []
+        for line in self.wal_path.read_text(encoding="utf-8").splitlines():
+            try:
+                op = json.loads(line)
+            except ValueError:
+                continue  # torn last line: that operation never committed
+            if isinstance(op, dict) and int(op.get("seq") or 0) > seq:
+                ops.append(op)
+        return ops
+
+    def _commit(self, doc: Dict[str, Any]) -> None:
+        tmp = self.path.with_name(self.path.name + ".tmp")
+        with tmp.open("w", encoding="utf-8") as f:
+            f.write(json.dumps(doc, indent=2, ensure_ascii=False) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, self.path)
+        _fsync_dir(self.path.parent)
+
+    def _recover(self) -> Dict[str, Any]:
+        """Load the queue, applying any logged-but-uncommitted operations."""
+
+        doc = self._load()
+        pending = self._pending_wal(doc)
+        for op in pending:
+            self._apply(doc, op)
+            doc["seq"] = op["seq"]
+        if pending:
+            self._commit(doc)
+        if self.wal_path.exists():
+            self.wal_path.unlink()
+        return doc
+
+    def _transact(self, op: Dict[str, Any]) -> Any:
+        with self._locked(exclusive=True):
+            doc = self._recover()
+            op = {**op, "seq": int(doc.get("seq") or 0) + 1, "ts": _ts()}
+            with self.wal_path.open("a", encoding="utf-8") as wal:
+                wal.write(json.dumps(op, ensure_ascii=False) + "\n")
+                wal.flush()
+                os.fsync(wal.fileno())
+            result = self._apply(doc, op)
+            doc["seq"] = op["seq"]
+            doc["updated"] = op["ts"]
+            self._commit(doc)
+            self.wal_path.unlink()
+            return result
+
+    # Operations are pure functions of (doc, op) so WAL replay is exact.
+    def _apply(self, doc: Dict[str, Any], op: Dict[str, Any]) -> Any:
+        items: List[Dict[str, Any]] = doc["items"]
+        kind = op.get("op")
+        ids = set(op.get("ids") or [])
+        if kind == "enqueue":
+            known = {str(it.get("id")) for it in items if isinstance(it, dict) and it.get("id")}
+            added = [it for it in op["items"] if str(it.get("id")) not in known]
+            items.extend(added)
+            return added
+        if kind == "claim":
+            claimed = []
+            for it in items:
+                if isinstance(it, dict) and str(it.get("id")) in ids and _item_status(it) == QUEUED:
+                    it.update({"status": RUNNING, "claimed_by": op["owner"], "claimed_at": op["ts"]})
+                    claimed.append(it)
+            return claimed
+        if kind == "complete":
+            before = len(items)
+            doc["items"] = [it for it in items if not (isinstance(it, dict) and str(it.get("id")) in ids)]
+            return before - len(doc["items"])
+        if kind == "requeue":
+            n = 0
+            for it in items:
+                if isinstance(it, dict) and str(it.get("id")) in ids and _item_status(it) == RUNNING:
+                    it["status"] = QUEUED
+                    it.pop("claimed_by", None)
+                    it.pop("claimed_at", None)
+                    n += 1
+            return n
+        raise ValueError(f"unknown queue operation {kind!r}")
+
+    # -- API ----------------------------------------------------------------
+
+    def read(self) -> Dict[str, Any]:
+        """Snapshot of the queue document (recovering first if a WAL is left over)."""
+
+        if self.wal_path.exists():
+            with self._locked(exclusive=True):
+                return self._recover()
+        with self._locked(exclusive=False):
+            return self._load()
+
+    def items(self, status: Optional[str] = None) -> List[Dict[str, Any]]:
+        out = [it for it in self.read()["items"] if isinstance(it, dict)]
+        return [it for it in out if _item_status(it) == status] if status else out
+
+    def enqueue(self, items: Iterable[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Append items (status QUEUED, id assigned if missing); duplicate ids are skipped."""
+
+        prepared = []
+        for it in items:
+            it = dict(it)
+            it.setdefault("id", f"q-{uuid.uuid4().hex[:10]}")
+            it.setdefault("added", _ts())
+            it.setdefault("status", QUEUED)
+            prepared.append(it)
+        return self._transact({"op": "enqueue", "items": prepared})
+
+    def claim(self, ids: Iterable[str], owner: Optional[str] = None) -> List[Dict[str, Any]]:
+        """Mark the QUEUED items among `ids` RUNNING for `owner`; returns those claimed."""
+
+        return self._transact({"op": "claim", "ids": [str(i) for i in ids], "owner": owner or owner_id()})
+
+    def complete(self, ids: Iterable[str]) -> int:
+        return self._transact({"op": "complete", "ids": [str(i) for i in ids]})
+
+    def requeue(self, ids: Iterable[str]) -> int:
+        return self._transact({"op": "requeue", "ids": [str(i) for i in ids]})
+
+    def requeue_stale(self, max_age_s: float = 12 * 3600, alive: Callable[[str], bool] = _owner_alive) -> int:
+        """Requeue RUNNING items whose owner died or whose claim is older than max_age_s."""
+
+        now = datetime.now(timezone.utc)
+        stale = []
+        for it in self.items(RUNNING):
+            try:
+                age = (now - datetime.fromisoformat(str(it.get("claimed_at")).replace("Z", "+00:00"))).total_seconds()
+            except ValueError:
+                age = max_age_s
+            if age >= max_age_s or not alive(str(it.get("claimed_by") or "")):
+                stale.append(str(it.get("id")))
+        return self.requeue(stale) if stale else 0
+
+
+def main() -> int:
+    ap = argparse.ArgumentParser(description="Inspect or repair the overnight queue")
+    ap.add_argument("--queue", default=str(DEFAULT_QUEUE_PATH))
+    ap.add_argument("--status", action="store_true")
+    ap.add_argument("--requeue-stale", action="store_true", help="Return dead or expired claims to QUEUED")
+    ap.add_argument("--max-age-hours", type=float, default=12.0)
+    ap.add_argument("--json", action="store_true")
+    args = ap.parse_args()
+
+    store = QueueStore(Path(args.queue).expanduser())
+    if args.requeue_stale:
+        print(f"Requeued {store.requeue_stale(args.max_age_hours * 3600)} item(s).")
+    items = store.items()
+    if args.json:
+        print(json.dumps(items, indent=2, ensure_ascii=False))
+        return 0
+    counts: Dict[str, int] = {}
+    for it in items:
+        counts[_item_status(it)] = counts.get(_item_status(it), 0) + 1
+    print(f"{store.path}: " + (", ".join(f"{k}={v}" for k, v in sorted(counts.items())) or "empty"))
+    for it in items:
+        who = f" claimed_by={it['claimed_by']}" if it.get("claimed_by") else ""
+        print(f"  {_item_status(it):7} {it.get('id')}{who}")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,382 @@
+#!/usr/bin/env python3
+"""overnight_results.py — append-only results store for overnight_builder.py.
+
+Replaces the single state/overnight_build_results.json document (rewritten in
+full every run, capped at 2000 entries) with a directory of JSONL segments:
+
+  state/overnight_build_results/
+    index.json                   small tail index: segments + where the last run starts
+    results.000007.jsonl         live segment, appended to
+    results.000006.jsonl.gz      sealed segments (gzipped when compress is on)
+
+  - append: a run's entries are appended to the live segment (in one write,
+    or item by item under the same run_id) and the index records the run's
+    (segment, offset, count), so reading the latest run is one seek,
+    independent of history size
+  - rotate: before appending, a live segment over segment_bytes is sealed;
+    sealing trims raw_reply to reply_keep_chars and gzips it
+  - compact: whole oldest segments are dropped while the rest still hold at
+    least keep_entries entries (the old 2000-run cap, without rewrites)
+
+Writers (append, compact, migrate) hold an exclusive flock on .lock and
+re-read index.json under it; readers take a shared one. A legacy
+overnight_build_results.json next to the store is imported by migrate() (the
+builder calls it before a run) as the first sealed segment and renamed to
+*.json.migrated; until then readers see its entries read-only.
+
+Usage:
+  python3 scripts/advanced/overnight_results.py --status
+  python3 scripts/advanced/overnight_results.py --latest [--json]
+  python3 scripts/advanced/overnight_results.py --compact
+  python3 scripts/advanced/overnight_results.py --migrate
+"""
+
+from __future__ import annotations
+
+import argparse
+import contextlib
+import fcntl
+import gzip
+import json
+import os
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional
+
+CLAWD = Path(os.environ.get("OPENCLAW_WORKSPACE", str(Path.home() / ".openclaw" / "workspace")))
+DEFAULT_RESULTS_DIR = CLAWD / "state" / "overnight_build_results"
+
+SEGMENT_BYTES = 4 * 1024 * 1024
+KEEP_ENTRIES = 2000
+REPLY_KEEP_CHARS = 4000
+
+
+def _ts() -> str:
+    return datetime.now(timezone.utc).isoformat().replace("+00:00", "Z")
+
+
+def store_dir(path: Path) -> Path:
+    """Accept either the store directory or the legacy .json path."""
+
+    path = Path(path)
+    return path.with_suffix("") if path.suffix == ".json" else path
+
+
+class ResultsStore:
+    def __init__(
+        self,
+        root: Path = DEFAULT_RESULTS_DIR,
+        *,
+        segment_bytes: int = SEGMENT_BYTES,
+        keep_entries: int = KEEP_ENTRIES,
+        compress: bool = True,
+        reply_keep_chars: int = REPLY_KEEP_CHARS,
+    ) -> None:
+        self.root = store_dir(root)
+        self.index_path = self.root / "index.json"
+        self.lock_path = self.root / ".lock"
+        self.legacy_path = self.root.with_suffix(".json")
+        self.segment_bytes = segment_bytes
+        self.keep_entries = keep_entries
+        self.compress = compress
+        self.reply_keep_chars = reply_keep_chars
+        self.index = self._snapshot()
+
+    # -- index --------------------------------------------------------------
+
+    @contextlib.contextmanager
+    def _locked(self, exclusive: bool) -> Iterator[None]:
+        if not exclusive and not self.root.exists():
+            # Nothing to read yet; readers never create the store.
+            yield
+            return
+        self.root.mkdir(parents=True, exist_ok=True)
+        fd = os.open(str(self.lock_path), os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+            yield
+        finally:
+            fcntl.flock(fd, fcntl.LOCK_UN)
+            os.close(fd)
+
+    def _load_index(self) -> Dict[str, Any]:
+        try:
+            data = json.loads(self.index_path.read_text(encoding="utf-8"))
+            if isinstance(data, dict) and isinstance(data.get("segments"), list):
+                return data
+        except (OSError, ValueError):
+            pass
+        return {"generation": 0, "segments": [], "last_run": None, "last_run_at": None}
+
+    def _snapshot(self) -> Dict[str, Any]:
+        with self._locked(exclusive=False):
+            return self._load_index()
+
+    def legacy_pending(self) -> bool:
+        return self.legacy_path.exists() and not self.index_path.exists()
+
+    def _save_index(self) -> None:
+        self.root.mkdir(parents=True, exist_ok=True)
+        tmp = self.index_path.with_suffix(".tmp")
+        tmp.write_text(json.dumps(self.index, indent=2) + "\n", encoding="utf-8")
+        os.replace(tmp, self.index_path)
+
+    def _segment(self, gen: int) -> Optional[Dict[str, Any]]:
+        for seg in self.index["segments"]:
+            if seg["gen"] == gen:
+                return seg
+        return None
+
+    def _path(self, seg: Dict[str, Any]) -> Path:
+        return self.root / seg["file"]
+
+    def _live(self) -> Dict[str, Any]:
+        seg = self._segment(int(self.index["generation"]))
+        if seg is None or seg.get("sealed"):
+            gen = int(self.index["generation"]) + (1 if seg is not None else 0)
+            seg = {"gen": gen, "file": f"results.{gen:06d}.jsonl", "count": 0, "bytes": 0, "sealed": False, "first_finished": None, "last_finished": None}
+            self.index["generation"] = gen
+            self.index["segments"].append(seg)
+        return seg
+
+    # -- writes -------------------------------------------------------------
+
+    def _read_legacy(self) -> Optional[Dict[str, Any]]:
+        try:
+            data = json.loads(self.legacy_path.read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            return None
+        return data if isinstance(data, dict) else None
+
+    def _legacy_entries(self) -> List[Dict[str, Any]]:
+        data = self._read_legacy() if self.legacy_pending() else None
+        runs = data.get("runs") if data and isinstance(data.get("runs"), list) else []
+        return [r for r in runs if isinstance(r, dict)]
+
+    def migrate(self) -> bool:
+        """Import a legacy overnight_build_results.json once; returns True if it did."""
+
+        with self._locked(exclusive=True):
+            if not self.legacy_pending():
+                return False
+            self.index = self._load_index()
+            data = self._read_legacy()
+            if data is None:
+                return False
+            entries = self._legacy_entries()
+            if entries:
+                self._append(entries)
+                self._seal(self._live())
+                # Legacy entries carry one run_id each; the old summary showed the last 20.
+                self.index["last_run"]["count"] = min(20, len(entries))
+            self.index["last_run_at"] = data.get("last_run_at")
+            self._save_index()
+            os.replace(self.legacy_path, self.legacy_path.with_name(self.legacy_path.name + ".migrated"))
+            return True
+
+    def append_run(self, entries: List[Dict[str, Any]]) -> None:
+        """Append a run's entries; they stay contiguous in one segment.
+
+        Entries whose run_id matches the latest run extend it (a run that
+        records results as they finish).
+        """
+
+        if not entries:
+            return
+        with self._locked(exclusive=True):
+            # Another process may have appended since our snapshot.
+            self.index = self._load_index()
+            self._append(entries)
+            self._compact()
+
+    def _append(self, entries: List[Dict[str, Any]]) -> None:
+        seg = self._live()
+        last = self.index.get("last_run") or {}
+        run_id = entries[-1].get("run_id")
+        extend = bool(run_id) and last.get("run_id") == run_id and last.get("gen") == seg["gen"] and last.get("offset") is not None
+        if seg["bytes"] >= self.segment_bytes and not extend:
+            self._seal(seg)
+            seg = self._live()
+        data = "".join(json.dumps(e, ensure_ascii=False) + "\n" for e in entries).encode("utf-8")
+        with self._path(seg).open("ab") as f:
+            offset = f.tell()
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        finished = sorted(str(e.get("finished_at") or "") for e in entries if e.get("finished_at"))
+        if finished:
+            seg["first_finished"] = seg["first_finished"] or finished[0]
+            seg["last_finished"] = max(seg["last_finished"] or "", finished[-1])
+        seg["count"] += len(entries)
+        seg["bytes"] = offset + len(data)
+        if extend:
+            self.index["last_run"]["count"] += len(entries)
+        else:
+            self.index["last_run"] = {"gen": seg["gen"], "offset": offset, "count": len(entries), "run_id": run_id}
+        self.index["last_run_at"] = _ts()
+        self._save_index()
+
+    def _seal(self, seg: Dict[str, Any]) -> None:
+        """Close a live segment: trim replies and (optionally) gzip it."""
+
+        src = self._path(seg)
+        if not src.exists():
+            seg["sealed"] = True
+            return
+        name = src.name + (".gz" if self.compress else ".sealed")
+        tmp = self.root / (name + ".tmp")
+        opener = gzip.open if self.compress else open
+        with src.open("rb") as fin, opener(tmp, "wb") as fout:
+            for raw in fin:
+                try:
+                    entry = json.loads(raw)
+                except ValueError:
+                    continue
+                reply = entry.get("raw_reply") if isinstance(entry, dict) else None
+                if isinstance(reply, str) and self.reply_keep_chars and len(reply) > self.reply_keep_chars:
+                    entry["raw_reply"] = reply[: self.reply_keep_chars]
+                    entry["raw_reply_truncated"] = len(reply)
+                fout.write((json.dumps(entry, ensure_ascii=False) + "\n").encode("utf-8"))
+        dst = self.root / name.replace(".sealed", "")
+        if dst == src:
+            os.replace(tmp, src)
+        else:
+            os.replace(tmp, dst)
+            src.unlink()
+        last = self.index.get("last_run") or {}
+        if last.get("gen") == seg["gen"]:
+            # Offsets changed with the rewrite; the run is the segment's tail.
+            self.index["last_run"] = {**last, "offset": None}
+        seg.update({"file": dst.name, "sealed": True, "bytes": dst.stat().st_size})
+
+    def compact(self) -> int:
+        """Drop whole oldest segments beyond keep_entries; returns entries removed."""
+
+        with self._locked(exclusive=True):
+            self.index = self._load_index()
+            return self._compact()
+
+    def _compact(self) -> int:
+        removed = 0
+        segs = self.index["segments"]
+        while len(segs) > 1 and sum(s["count"] for s in segs[1:]) >= self.keep_entries:
+            seg = segs.pop(0)
+            try:
+                self._path(seg).unlink()
+            except FileNotFoundError:
+                pass
+            removed += seg["count"]
+        if removed:
+            self._save_index()
+        return removed
+
+    # -- reads --------------------------------------------------------------
+
+    def _open(self, seg: Dict[str, Any]):
+        path = self._path(seg)
+        return gzip.open(path, "rb") if path.suffix == ".gz" else path.open("rb")
+
+    def _read_segment(self, seg: Dict[str, Any], offset: int = 0) -> Iterator[Dict[str, Any]]:
+        if not self._path(seg).exists():
+            return
+        with self._open(seg) as f:
+            if offset:
+                f.seek(offset)
+            for raw in f:
+                try:
+                    entry = json.loads(raw)
+                except ValueError:
+                    continue
+                if isinstance(entry, dict):
+                    yield entry
+
+    def iter_entries(self, finished_after: str = "") -> Iterator[Dict[str, Any]]:
+        """All entries oldest first, skipping segments finished before `finished_after`."""
+
+        self.index = self._snapshot()
+        if self.legacy_pending():
+            yield from (e for e in self._legacy_entries() if not finished_after or str(e.get("finished_at") or "") > finished_after)
+            return
+        for seg in list(self.index["segments"]):
+            if finished_after and seg.get("last_finished") and seg["last_finished"] <= finished_after:
+                continue
+            yield from self._read_segment(seg)
+
+    def latest_run(self) -> List[Dict[str, Any]]:
+        self.index = self._snapshot()
+        if self.legacy_pending():
+            return self._legacy_entries()[-20:]
+        last = self.index.get("last_run")
+        if not last:
+            return []
+        seg = self._segment(int(last["gen"]))
+        if seg is None:
+            return []
+        if last.get("offset") is not None:
+            return list(self._read_segment(seg, int(last["offset"])))[: int(last["count"])]
+        return list(self._read_segment(seg))[-int(last["count"]) :]
+
+    def tail(self, n: int) -> List[Dict[str, Any]]:
+        """The last `n` entries, reading only as many segments as needed."""
+
+        self.index = self._snapshot()
+        if self.legacy_pending():
+            return self._legacy_entries()[-n:] if n else []
+        out: List[Dict[str, Any]] = []
+        for seg in reversed(self.index["segments"]):
+            out = list(self._read_segment(seg))[-(n - len(out)) :] + out
+            if len(out) >= n:
+                break
+        return out[-n:] if n else []
+
+    def status(self) -> Dict[str, Any]:
+        self.index = self._snapshot()
+        return {
+            "root": str(self.root),
+            "entries": sum(s["count"] for s in self.index["segments"]),
+            "bytes": sum(s["bytes"] for s in self.index["segments"]),
+            "segments": len(self.index["segments"]),
+            "last_run": self.index.get("last_run"),
+            "last_run_at": self.index.get("last_run_at"),
+            "legacy_pending": self.legacy_pending(),
+        }
+
+
+def main() -> int:
+    ap = argparse.ArgumentParser(description="Inspect the overnight_builder results store")
+    ap.add_argument("--dir", default=str(DEFAULT_RESULTS_DIR))
+    ap.add_argument("--status", action="store_true")
+    ap.add_argument("--latest", action="store_true", help="Print the entries of the latest run")
+    ap.add_argument("--compact", action="store_true", help="Drop segments beyond the retention")
+    ap.add_argument("--migrate", action="store_true", help="Import a legacy overnight_build_results.json into the store")
+    ap.add_argument("--keep", type=int, default=KEEP_ENTRIES, help=f"Entries to retain (default {KEEP_ENTRIES})")
+    ap.add_argument("--json", action="store_true")
+    args = ap.parse_args()
+
+    store = ResultsStore(Path(args.dir), keep_entries=args.keep)
+    if args.migrate or args.compact:
+        if store.migrate():
+            print(f"Imported {store.legacy_path.name}.")
+    if args.compact:
+        print(f"Removed {store.compact()} entries.")
+    if args.latest:
+        run = store.latest_run()
+        if args.json:
+            print(json.dumps(run, indent=2, ensure_ascii=False))
+        else:
+            for r in run:
+                tid = (r.get("task") or {}).get("id", "(no-id)")
+                print(f"{r.get('status', '?'):8} {tid} {r.get('duration_seconds')}s")
+        return 0
+    st = store.status()
+    if args.json:
+        print(json.dumps(st, indent=2))
+        return 0
+    print(f"{st['root']}: {st['entries']} entries in {st['segments']} segment(s), {st['bytes']} bytes; last run at {st['last_run_at']}")
+    if st["legacy_pending"]:
+        print(f"{store.legacy_path} is not migrated yet (run --migrate, or the next builder run will).")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
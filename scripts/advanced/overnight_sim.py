@@ -0,0 +1,398 @@
+#!/usr/bin/env python3
+"""overnight_sim.py — discrete-event simulator for overnight_queue.py scheduling.
+
+Runs the real overnight_queue.run_queue() (planner, AIMD controller, lanes,
+batching, stop-window preemption) against a virtual clock and a fake executor,
+so a whole night takes well under a second. Nothing is spawned and the real
+journal is not touched: each simulated night writes to a throwaway state dir.
+
+Task outcomes (duration, success, tokens) are sampled from:
+  - history (default): the task's own past task_end events, else a lognormal
+    fitted to overnight_predictor.py's p50/p90 for similar tasks, else the
+    synthetic model below
+  - synthetic: lognormal around the task's declared `effort` / `est_tokens`
+    (or the per-type defaults) with --spread, failing with --fail-rate
+
+Reported per policy variant (mean over --runs seeds): makespan, value finished
+before stop_hour, completed / failed / interrupted / never-started tasks, idle
+slot-hours and utilization, tokens used against max_tokens.
+
+Usage:
+  python3 scripts/advanced/overnight_sim.py
+  python3 scripts/advanced/overnight_sim.py --runs 50 --seed 7
+  python3 scripts/advanced/overnight_sim.py --source synthetic --fail-rate 0.2
+  python3 scripts/advanced/overnight_sim.py --variant max_parallel=2 --variant max_parallel=4,planner=greedy
+  python3 scripts/advanced/overnight_sim.py --start 2026-10-20T22:00 --json
+
+Notes:
+- The simulated planner only sees predictor / declared estimates; per-task
+  journal medians are not copied into the throwaway journal.
+- Preempted agents are modelled as stopping immediately on SIGTERM/SIGKILL;
+  the wrap-up nudge has no effect.
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import contextlib
+import io
+import json
+import math
+import random
+import selectors
+import statistics
+import sys
+import tempfile
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+import overnight_queue as oq
+
+try:
+    import overnight_predictor
+except Exception:  # pragma: no cover
+    overnight_predictor = None  # type: ignore
+
+# Stand-in for check_usage.py's session total so token deltas are non-zero.
+BASE_TOTAL_TOKENS = 1_000_000
+# z-score of the 90th percentile, for fitting a lognormal to p50/p90.
+Z90 = 1.2816
+
+
+class VirtualClock:
+    """Seconds elapsed since `start` (an epoch timestamp).
+
+    The event loop runs on the small elapsed value: asyncio's clock
+    resolution is below float precision at epoch magnitudes.
+    """
+
+    def __init__(self, start: float) -> None:
+        self.start = start
+        self.elapsed = 0.0
+
+    def time(self) -> float:
+        return self.start + self.elapsed
+
+
+class _VirtualSelector(selectors.DefaultSelector):
+    """Never sleeps on timers: jumps the clock to the next one instead.
+
+    Real readiness (the loop's self-pipe, thread callbacks) is still polled,
+    and with no timer pending the select blocks as usual.
+    """
+
+    def __init__(self, clock: VirtualClock) -> None:
+        super().__init__()
+        self.clock = clock
+
+    def select(self, timeout: Optional[float] = None):
+        if timeout is None:
+            return super().select(None)
+        events = super().select(0)
+        if not events and timeout > 0:
+            self.clock.elapsed += timeout
+        return events
+
+
+class VirtualEventLoop(asyncio.SelectorEventLoop):
+    def __init__(self, clock: VirtualClock) -> None:
+        self.clock = clock
+        super().__init__(_VirtualSelector(clock))
+
+    def time(self) -> float:
+        return self.clock.elapsed
+
+
+@dataclass
+class Outcome:
+    duration_s: float
+    ok: bool
+    tokens: int
+
+
+class Sampler:
+    def __init__(self, source: str, cfg: Dict[str, Any], fail_rate: float, spread: float, history: List[Dict[str, Any]], predictor: Any = None) -> None:
+        self.source = source
+        self.fail_rate = fail_rate
+        self.spread = spread
+        self.predictor = predictor
+        # Declared effort / est_tokens / per-type defaults, without history.
+        self.fallback = oq.TaskEstimator(cfg, {}, None)
+        self.by_id: Dict[str, List[Tuple[float, bool, Optional[int]]]] = {}
+        fails: Dict[str, List[bool]] = {}
+        for ev in history:
+            if ev.get("cache") == "hit" or ev.get("interrupted") or not isinstance(ev.get("duration_s"), (int, float)):
+                continue
+            tid = str(ev.get("task_id") or "")
+            tokens = ev.get("tokens") if isinstance(ev.get("tokens"), int) else None
+            self.by_id.setdefault(tid, []).append((float(ev["duration_s"]), bool(ev.get("ok")), tokens))
+            fails.setdefault(str(ev.get("type") or "codex"), []).append(not ev.get("ok"))
+        # Per-type failure rate from history, used when a task has no past runs.
+        self.type_fail = {t: sum(v) / len(v) for t, v in fails.items() if len(v) >= 5}
+
+    def _lognormal(self, rng: random.Random, median: float, sigma: float) -> float:
+        return median * math.exp(rng.gauss(0.0, sigma)) if median > 0 else 0.0
+
+    def sample(self, task: Dict[str, Any], rng: random.Random) -> Outcome:
+        ttype = str(task.get("type") or "codex").lower()
+        est_tokens = self.fallback.tokens(task)
+        if self.source == "history":
+            past = self.by_id.get(str(task.get("id") or ""))
+            if past:
+                duration_s, ok, tokens = rng.choice(past)
+                return Outcome(duration_s, ok, tokens if tokens is not None else est_tokens)
+            fail = self.type_fail.get(ttype, self.fail_rate)
+            pred = self.predictor.predict(task) if self.predictor is not None else None
+            if pred is not None and pred.samples and pred.p50_s:
+                sigma = math.log(max(pred.p90_s or pred.p50_s, pred.p50_s) / pred.p50_s) / Z90 or self.spread
+                tokens = est_tokens
+                if pred.p50_tokens:
+                    t_sigma = math.log(max(pred.p90_tokens or pred.p50_tokens, pred.p50_tokens) / pred.p50_tokens) / Z90
+                    tokens = int(self._lognormal(rng, pred.p50_tokens, t_sigma))
+                return Outcome(self._lognormal(rng, pred.p50_s, sigma), rng.random() >= fail, tokens)
+        else:
+            fail = self.fail_rate
+        return Outcome(
+            self._lognormal(rng, self.fallback.base_seconds(task), self.spread),
+            rng.random() >= fail,
+            int(self._lognormal(rng, est_tokens, self.spread)),
+        )
+
+
+class FakeExecutor(oq.ProcessExecutor):
+    """Sleeps on the virtual clock instead of running anything."""
+
+    def __init__(self, sampler: Sampler, rng: random.Random, clock: VirtualClock) -> None:
+        self.sampler = sampler
+        self.rng = rng
+        self.clock = clock
+        self.tokens_used = 0
+        self.busy_s = 0.0
+        self.turns = 0
+        self._stop: Dict[str, asyncio.Event] = {}
+
+    async def _run(self, key: str, outcomes: List[Outcome]) -> Tuple[float, bool, float]:
+        """Occupy one slot for the outcomes' total duration; returns (elapsed, killed, fraction done)."""
+
+        total = sum(o.duration_s for o in outcomes)
+        stop = self._stop[key] = asyncio.Event()
+        start = self.clock.elapsed
+        killed = False
+        self.turns += 1
+        try:
+            await asyncio.wait_for(stop.wait(), timeout=total)
+            killed = True
+        except asyncio.TimeoutError:
+            pass
+        finally:
+            self._stop.pop(key, None)
+            elapsed = self.clock.elapsed - start
+            self.busy_s += elapsed
+            done = min(1.0, elapsed / total) if total > 0 else 1.0
+            self.tokens_used += int(sum(o.tokens for o in outcomes) * done)
+        return elapsed, killed, done
+
+    def _result(self, task: Dict[str, Any], o: Outcome, duration_s: float, killed: bool, done: float) -> oq.TaskResult:
+        ok = o.ok and not killed
+        return oq.TaskResult(
+            task_id=str(task.get("id") or ""),
+            name=str(task.get("name") or task.get("id")),
+            ok=ok,
+            stdout="simulated",
+            stderr="" if ok else ("terminated" if killed else "simulated failure"),
+            duration_s=duration_s,
+            tokens=int(o.tokens * done),
+        )
+
+    async def run_local(self, task: Dict[str, Any], dry_run: bool, log_dir: Path, cfg: Dict[str, Any]) -> oq.TaskResult:
+        o = self.sampler.sample(task, self.rng)
+        elapsed, killed, done = await self._run(str(task.get("id") or ""), [o])
+        return self._result(task, o, elapsed, killed, done)
+
+    async def run_agent(self, task: Dict[str, Any], dry_run: bool, **kw: Any) -> oq.TaskResult:
+        return await self.run_local(task, dry_run, kw.get("log_dir"), kw.get("cfg") or {})
+
+    async def run_agent_batch(self, tasks: List[Dict[str, Any]], batch_id: str, dry_run: bool, **kw: Any) -> List[oq.TaskResult]:
+        outcomes = [self.sampler.sample(t, self.rng) for t in tasks]
+        elapsed, killed, done = await self._run(batch_id, outcomes)
+        return [self._result(t, o, elapsed / len(tasks), killed, done) for t, o in zip(tasks, outcomes)]
+
+    def usage_tokens(self) -> int:
+        return BASE_TOTAL_TOKENS + self.tokens_used
+
+    def signal(self, key: str, sig: int) -> bool:
+        stop = self._stop.get(key)
+        if stop is None:
+            return False
+        stop.set()
+        return True
+
+    async def nudge(self, agent_id: str, session_id: str, timeout_s: float) -> None:
+        return None
+
+
+def _ts(value: Any) -> Optional[float]:
+    try:
+        return datetime.fromisoformat(str(value).replace("Z", "+00:00")).timestamp()
+    except ValueError:
+        return None
+
+
+def simulate(queue: Dict[str, Any], overrides: Dict[str, Any], sampler: Sampler, start_ts: float, seed: int) -> Dict[str, Any]:
+    """Run one virtual night and return its metrics."""
+
+    tasks = [t for t in queue.get("tasks") or [] if isinstance(t, dict)]
+    cfg = oq.DEFAULT_CONFIG.copy()
+    cfg.update(queue.get("config") if isinstance(queue.get("config"), dict) else {})
+    cfg.update(overrides)
+
+    clock = VirtualClock(start_ts)
+    executor = FakeExecutor(sampler, random.Random(seed), clock)
+    real_state, real_clock = oq.STATE_DIR, oq.CLOCK
+    with tempfile.TemporaryDirectory(prefix="overnight_sim_") as tmp:
+        oq.use_state_dir(Path(tmp))
+        oq.CLOCK = clock.time
+        loop = VirtualEventLoop(clock)
+        try:
+            oq.QUEUE_PATH.write_text(json.dumps({"config": cfg, "tasks": tasks}), encoding="utf-8")
+            stop_ts = start_ts + oq.seconds_until_stop(cfg)
+            with contextlib.redirect_stdout(io.StringIO()):
+                loop.run_until_complete(oq.run_queue(False, executor=executor))
+            events = list(oq.iter_progress_events(oq.PROGRESS_PATH))
+        finally:
+            loop.close()
+            oq.CLOCK = real_clock
+            oq.use_state_dir(real_state)
+
+    run_start = next((e for e in events if e.get("event") == "run_start"), {})
+    t0 = _ts(run_start.get("started_at")) or start_ts
+    ends = [e for e in events if e.get("event") == "task_end"]
+    started = {str((e.get("task") or {}).get("id") or "") for e in events if e.get("event") == "task_start"}
+    by_id = {str(t.get("id") or ""): t for t in tasks}
+
+    t_end = max([_ts(e.get("ts")) or t0 for e in ends] + [t0])
+    value_before_stop = sum(oq.task_value(by_id.get(str(e.get("task_id")), {})) for e in ends if e.get("ok") and (_ts(e.get("ts")) or 0) <= stop_ts)
+    value_total = sum(oq.task_value(t) for t in tasks)
+
+    # Slot capacity follows the controller's limit over time.
+    limit = max(1, int(cfg.get("max_parallel", 1) or 1))
+    if cfg.get("adaptive_parallel"):
+        limit = max(int(cfg.get("min_parallel", 1) or 1), limit)
+    capacity, last = 0.0, t0
+    for e in events:
+        if e.get("event") == "concurrency_adjust":
+            at = min(_ts(e.get("ts")) or last, t_end)
+            capacity += limit * max(0.0, at - last)
+            last, limit = at, int(e.get("to") or limit)
+    capacity += limit * max(0.0, t_end - last)
+
+    max_tokens = int(cfg.get("max_tokens") or 0)
+    return {
+        "makespan_h": (t_end - t0) / 3600,
+        "value_before_stop": value_before_stop,
+        "value_fraction": value_before_stop / value_total if value_total else 0.0,
+        "completed": sum(1 for e in ends if e.get("ok")),
+        "failed": sum(1 for e in ends if not e.get("ok") and not e.get("interrupted")),
+        "interrupted": sum(1 for e in ends if e.get("interrupted")),
+        "not_started": sum(1 for tid in by_id if tid not in started),
+        "turns": executor.turns,
+        "idle_slot_h": max(0.0, capacity - executor.busy_s) / 3600,
+        "utilization": executor.busy_s / capacity if capacity else 0.0,
+        "tokens": executor.tokens_used,
+        "budget_used": executor.tokens_used / max_tokens if max_tokens else 0.0,
+    }
+
+
+def parse_variant(text: str) -> Dict[str, Any]:
+    out: Dict[str, Any] = {}
+    for part in filter(None, (p.strip() for p in text.split(","))):
+        key, _, raw = part.partition("=")
+        try:
+            out[key.strip()] = json.loads(raw)
+        except json.JSONDecodeError:
+            out[key.strip()] = raw
+    return out
+
+
+def default_start(cfg: Dict[str, Any]) -> float:
+    """Next start_hour in the configured timezone."""
+
+    tz = str(cfg.get("timezone") or oq.DEFAULT_CONFIG["timezone"])
+    n = oq.now_tz(tz)
+    start = n.replace(hour=int(cfg.get("start_hour", oq.DEFAULT_CONFIG["start_hour"])), minute=0, second=0, microsecond=0)
+    if start <= n:
+        start += timedelta(days=1)
+    return start.timestamp()
+
+
+def main() -> int:
+    ap = argparse.ArgumentParser(description="Simulate overnight_queue scheduling on a virtual clock")
+    ap.add_argument("--queue", default=str(oq.QUEUE_PATH), help="queue file to simulate")
+    ap.add_argument("--source", choices=["history", "synthetic"], default="history")
+    ap.add_argument("--runs", type=int, default=10, help="simulated nights per variant")
+    ap.add_argument("--seed", type=int, default=0)
+    ap.add_argument("--fail-rate", type=float, default=0.1)
+    ap.add_argument("--spread", type=float, default=0.5, help="lognormal sigma for synthetic durations/tokens")
+    ap.add_argument("--start", help="virtual start time (ISO, queue timezone); default next start_hour")
+    ap.add_argument("--variant", action="append", default=[], help="config overrides, e.g. max_parallel=4,planner=greedy")
+    ap.add_argument("--json", action="store_true")
+    args = ap.parse_args()
+
+    queue = oq.load_json(Path(args.queue))
+    if not queue.get("tasks"):
+        print(f"No tasks found in {args.queue}.", file=sys.stderr)
+        return 1
+    cfg = oq.DEFAULT_CONFIG.copy()
+    cfg.update(queue.get("config") if isinstance(queue.get("config"), dict) else {})
+
+    if args.start:
+        start = datetime.fromisoformat(args.start)
+        if start.tzinfo is None and oq.ZoneInfo is not None:
+            start = start.replace(tzinfo=oq.ZoneInfo(str(cfg.get("timezone") or oq.DEFAULT_CONFIG["timezone"])))
+        start_ts = start.timestamp()
+    else:
+        start_ts = default_start(cfg)
+
+    history: List[Dict[str, Any]] = []
+    predictor = None
+    if args.source == "history":
+        history = oq.read_indexed_events([e for e in oq.read_index() if e.get("e") == "task_end"])
+        if overnight_predictor is not None:
+            try:
+                predictor = overnight_predictor.load_fitted()
+            except Exception:
+                predictor = None
+    sampler = Sampler(args.source, cfg, args.fail_rate, args.spread, history, predictor)
+
+    report: Dict[str, Any] = {}
+    for text in args.variant or [""]:
+        overrides = parse_variant(text)
+        runs = [simulate(queue, overrides, sampler, start_ts, args.seed + i) for i in range(max(1, args.runs))]
+        report[text or "baseline"] = {k: statistics.fmean(r[k] for r in runs) for k in runs[0]}
+
+    if args.json:
+        print(json.dumps({
+            "start": datetime.fromtimestamp(start_ts, timezone.utc).isoformat().replace("+00:00", "Z"),
+            "source": args.source,
+            "runs": args.runs,
+            "variants": report,
+        }, indent=2))
+        return 0
+
+    print(f"{len(queue['tasks'])} tasks, {args.runs} runs per variant, source={args.source}")
+    head = f"{'variant':30} {'makespan':>9} {'value<stop':>10} {'done':>5} {'fail':>5} {'intr':>5} {'unrun':>5} {'idle slot-h':>11} {'util':>5} {'budget':>6}"
+    print(head)
+    print("-" * len(head))
+    for name, m in report.items():
+        print(
+            f"{name[:30]:30} {m['makespan_h']:8.2f}h {m['value_fraction']:9.0%} {m['completed']:5.1f} {m['failed']:5.1f} "
+            f"{m['interrupted']:5.1f} {m['not_started']:5.1f} {m['idle_slot_h']:11.2f} {m['utilization']:5.0%} {m['budget_used']:6.0%}"
+        )
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,57 @@
+"""Micro-batched agent turns: grouping keys and the per-task results in the reply.
+
+Run: python3 -m pytest tests/
+"""
+
+from __future__ import annotations
+
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "scripts" / "advanced"))
+
+import overnight_queue as oq  # noqa: E402
+
+
+def test_trailing_results_object_is_parsed():
+    reply = (
+        "Did both.\n"
+        '{"results": [{"id": "a", "ok": true, "summary": "x", "commits": ["abc"]},'
+        ' {"id": "b", "ok": false, "summary": "blocked"}]}\n'
+    )
+    got = oq.parse_batch_reply(reply)
+    assert set(got) == {"a", "b"}
+    assert got["a"]["commits"] == ["abc"]
+    assert got["b"]["ok"] is False
+
+
+def test_last_results_object_wins_over_an_echoed_template():
+    reply = (
+        'Format: {"results": [{"id": "<task id>", "ok": true|false}]}\n'
+        'Example: {"results": [{"id": "a", "ok": false}]}\n'
+        'Final: {"results": [{"id": "a", "ok": true}]} thanks'
+    )
+    assert oq.parse_batch_reply(reply) == {"a": {"id": "a", "ok": True}}
+
+
+def test_garbage_and_entries_without_ids_are_ignored():
+    assert oq.parse_batch_reply("no json here") == {}
+    assert oq.parse_batch_reply('{"results": "nope"}') == {}
+    assert oq.parse_batch_reply('{"results": [{"ok": true}, "x", {"id": 7, "ok": true}]}') == {"7": {"id": 7, "ok": True}}
+
+
+def test_batch_keys():
+    a = {"id": "a", "type": "codex", "repo": "r", "project": "p"}
+    b = {"id": "b", "type": "Codex", "repo": "r", "project": "p"}
+    c = {"id": "c", "type": "codex", "repo": "r", "project": "q"}
+    assert oq.batch_key(a) == oq.batch_key(b) != oq.batch_key(c)
+    assert oq.batch_proc_key([a]) == "a"
+    assert oq.batch_proc_key([a, b, c]) == "batch-a+2"
+
+
+def test_batch_message_lists_every_task():
+    msg = oq.build_batch_message([{"id": "a", "name": "A"}, {"id": "b", "name": "B", "prompt": "be brief"}])
+    assert "=== TASK 1/2 id=a ===" in msg
+    assert "=== TASK 2/2 id=b ===" in msg
+    assert "be brief" in msg
+    assert msg.rstrip().endswith("use ok=false for anything not completed.")
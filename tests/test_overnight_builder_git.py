@@ -0,0 +1,134 @@
+"""GitBatch.commits_between must agree with `git log --oneline a..b`.
+
+Run: python3 -m pytest tests/
+"""
+
+from __future__ import annotations
+
+import itertools
+import os
+import random
+import shutil
+import subprocess
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "scripts" / "advanced"))
+
+import overnight_builder  # noqa: E402
+
+pytestmark = pytest.mark.skipif(shutil.which("git") is None, reason="git not installed")
+
+BASE_TS = 1_760_000_000
+
+
+def _git(repo: Path, *args: str, ts: int = BASE_TS) -> str:
+    env = {
+        **os.environ,
+        "GIT_AUTHOR_NAME": "t",
+        "GIT_AUTHOR_EMAIL": "t@example.com",
+        "GIT_COMMITTER_NAME": "t",
+        "GIT_COMMITTER_EMAIL": "t@example.com",
+        "GIT_AUTHOR_DATE": f"@{ts} +0000",
+        "GIT_COMMITTER_DATE": f"@{ts} +0000",
+        "GIT_CONFIG_GLOBAL": os.devnull,
+        "GIT_CONFIG_NOSYSTEM": "1",
+    }
+    return subprocess.run(["git", *args], cwd=str(repo), env=env, check=True, capture_output=True, text=True).stdout.strip()
+
+
+def _commit(repo: Path, name: str, ts: int) -> str:
+    (repo / f"{name}.txt").write_text(name + "\n")
+    _git(repo, "add", "-A")
+    _git(repo, "commit", "-q", "-m", f"commit {name}", ts=ts)
+    return _git(repo, "rev-parse", "HEAD")
+
+
+def _merge(repo: Path, other: str, name: str, ts: int) -> str:
+    _git(repo, "merge", "-q", "--no-ff", "-m", f"merge {name}", other, ts=ts)
+    return _git(repo, "rev-parse", "HEAD")
+
+
+def _expected(repo: Path, a: str, b: str) -> list:
+    out = _git(repo, "log", "--oneline", "--no-decorate", f"{a}..{b}")
+    return out.splitlines() if out else []
+
+
+@pytest.fixture
+def batch(tmp_path, monkeypatch):
+    def no_fallback(*args, **kwargs):
+        raise AssertionError("commits_between fell back to `git log`")
+
+    # A fallback would make every comparison trivially pass.
+    monkeypatch.setattr(overnight_builder, "_git_commits_between", no_fallback)
+    repo = tmp_path / "repo"
+    repo.mkdir()
+    _git(repo, "init", "-q", "-b", "main")
+    made = []
+    yield repo, made, lambda: overnight_builder.GitBatch(repo)
+    for g in made:
+        g.close()
+
+
+def _check_all_pairs(repo: Path, shas: list, g) -> None:
+    for a, b in itertools.permutations(shas, 2):
+        assert g.commits_between(a, b) == _expected(repo, a, b), (a, b)
+
+
+def test_linear_and_merged_branches(batch):
+    repo, made, make = batch
+    c = [_commit(repo, "root", BASE_TS)]
+    c.append(_commit(repo, "m1", BASE_TS + 10))
+    _git(repo, "checkout", "-q", "-b", "side")
+    c.append(_commit(repo, "s1", BASE_TS + 20))
+    c.append(_commit(repo, "s2", BASE_TS + 30))
+    _git(repo, "checkout", "-q", "main")
+    c.append(_commit(repo, "m2", BASE_TS + 25))
+    c.append(_merge(repo, "side", "side", BASE_TS + 40))
+    c.append(_commit(repo, "m3", BASE_TS + 50))
+    g = make()
+    made.append(g)
+    _check_all_pairs(repo, c, g)
+
+
+def test_out_of_order_commit_dates(batch):
+    """Commits whose committer date is older than their parents' (clock skew, rebases)."""
+
+    repo, made, make = batch
+    c = [_commit(repo, "root", BASE_TS + 1000)]
+    c.append(_commit(repo, "m1", BASE_TS + 500))
+    _git(repo, "checkout", "-q", "-b", "side")
+    c.append(_commit(repo, "s1", BASE_TS + 2000))
+    c.append(_commit(repo, "s2", BASE_TS + 100))
+    _git(repo, "checkout", "-q", "main")
+    c.append(_commit(repo, "m2", BASE_TS + 3000))
+    c.append(_merge(repo, "side", "side", BASE_TS + 50))
+    c.append(_commit(repo, "m3", BASE_TS + 4000))
+    c.append(_commit(repo, "m4", BASE_TS + 10))
+    g = make()
+    made.append(g)
+    _check_all_pairs(repo, c, g)
+
+
+@pytest.mark.parametrize("seed", [3, 7, 11, 23, 42])
+def test_criss_cross_merges_with_random_dates(batch, seed):
+    repo, made, make = batch
+    rng = random.Random(seed)
+    shas = [_commit(repo, "root", BASE_TS)]
+    _git(repo, "branch", "b")
+    _git(repo, "branch", "c")
+    branches = ["main", "b", "c"]
+    for i in range(24):
+        br = rng.choice(branches)
+        _git(repo, "checkout", "-q", br)
+        ts = BASE_TS + rng.randint(-600, 3600)
+        if i % 4 == 3:
+            other = rng.choice([x for x in branches if x != br])
+            shas.append(_merge(repo, other, f"{other}-into-{br}-{i}", ts))
+        else:
+            shas.append(_commit(repo, f"{br}{i}", ts))
+    g = make()
+    made.append(g)
+    _check_all_pairs(repo, shas, g)
@@ -0,0 +1,97 @@
+"""Error classification, reset-time parsing and backoff for builder retries.
+
+Run: python3 -m pytest tests/
+"""
+
+from __future__ import annotations
+
+import json
+import sys
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "scripts" / "advanced"))
+
+import overnight_builder  # noqa: E402
+
+NOW = datetime(2026, 3, 10, 10, 0, 0)
+
+
+@pytest.mark.parametrize(
+    "text, kind",
+    [
+        ("Error: unknown agent 'codex'", "no_agent"),
+        ("HTTP 429 Too Many Requests", "rate_limit"),
+        ("Rate limit reached for requests; quota resets soon", "rate_limit"),
+        ("You have hit your usage limit. Try again in 2h.", "exhausted"),
+        ("insufficient_credit", "exhausted"),
+        ("502 Bad Gateway", "transient"),
+        ("ECONNRESET while streaming", "transient"),
+        ("SyntaxError: invalid syntax", None),
+        ("", None),
+    ],
+)
+def test_classify_error(text, kind):
+    assert overnight_builder.classify_error(text) == kind
+
+
+@pytest.mark.parametrize(
+    "text, expected",
+    [
+        ("usage limit; try again in 2h 30m", NOW + timedelta(hours=2, minutes=30)),
+        ("quota exhausted, retry in 45 seconds", NOW + timedelta(seconds=45)),
+        ("limit resets in 1 hour and 5 minutes", NOW + timedelta(hours=1, minutes=5)),
+        ("usage limit resets at 14:30", NOW.replace(hour=14, minute=30)),
+        ("usage limit resets at 9:15", (NOW + timedelta(days=1)).replace(hour=9, minute=15)),
+        ("usage limit resets at 3:05 pm", NOW.replace(hour=15, minute=5)),
+        ("usage limit resets in 3d", NOW + timedelta(days=1)),
+    ],
+)
+def test_exhausted_until(text, expected):
+    assert overnight_builder.exhausted_until(text, now=NOW) == expected
+
+
+def test_exhausted_until_iso_is_converted_to_local_time():
+    at = datetime(2026, 3, 10, 18, 0, tzinfo=timezone.utc)
+    now = at.astimezone().replace(tzinfo=None) - timedelta(hours=1)
+    got = overnight_builder.exhausted_until("usage limit resets at 2026-03-10T18:00:00Z", now=now)
+    assert got == at.astimezone().replace(tzinfo=None)
+
+
+@pytest.mark.parametrize("text", ["usage limit reached", "resets at 2020-01-01T00:00:00", "resets at 99:99"])
+def test_exhausted_until_without_a_usable_time(text):
+    assert overnight_builder.exhausted_until(text, now=NOW) is None
+
+
+def test_backoff_is_jittered_and_capped():
+    policy = overnight_builder.RetryPolicy(max_retries=5, base_s=10, cap_s=60)
+    for attempt, ceiling in [(0, 10), (1, 20), (2, 40), (3, 60), (8, 60)]:
+        delays = [policy.delay(attempt) for _ in range(200)]
+        assert all(0 <= d <= ceiling for d in delays)
+        assert max(delays) > ceiling / 2
+
+
+@pytest.fixture
+def codex_status(tmp_path, monkeypatch):
+    path = tmp_path / "codex_status.json"
+    monkeypatch.setattr(overnight_builder, "CODEX_STATUS_PATH", path)
+    return path
+
+
+def test_codex_available(codex_status):
+    assert not overnight_builder.codex_available()
+    past = (datetime.now() - timedelta(minutes=5)).isoformat(timespec="seconds")
+    future = (datetime.now(timezone.utc) + timedelta(hours=1)).isoformat()
+    for state, expected in [
+        ({"available": True}, True),
+        ({"exhausted": True}, False),
+        ({"available": False}, False),
+        ({"available": False, "resets_at": past}, True),
+        ({"available": False, "resets_at": future}, False),
+        ({"available": False, "resets_at": "soon"}, False),
+        ({"something": "else"}, False),
+    ]:
+        codex_status.write_text(json.dumps(state))
+        assert overnight_builder.codex_available() is expected, state
@@ -0,0 +1,84 @@
+"""cache_key changes whenever anything a cached local task depends on changes.
+
+Run: python3 -m pytest tests/
+"""
+
+from __future__ import annotations
+
+import os
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "scripts" / "advanced"))
+
+import overnight_queue as oq  # noqa: E402
+
+
+@pytest.fixture
+def ws(tmp_path, monkeypatch):
+    ws = tmp_path / "ws"
+    (ws / "src").mkdir(parents=True)
+    (ws / "src" / "a.py").write_text("a = 1\n")
+    monkeypatch.setattr(oq, "CLAWD", ws)
+    monkeypatch.setattr(oq, "CACHE_DIR", tmp_path / "cache")
+    monkeypatch.setattr(oq, "current_git_head", lambda: "head-1")
+    return ws
+
+
+def test_key_is_stable(ws):
+    assert oq.cache_key("make", ["src/*.py"]) == oq.cache_key("make", ["src/*.py"])
+
+
+def test_command_and_head_are_part_of_the_key(ws, monkeypatch):
+    key = oq.cache_key("make", ["src/*.py"])
+    assert oq.cache_key("make test", ["src/*.py"]) != key
+    monkeypatch.setattr(oq, "current_git_head", lambda: "head-2")
+    assert oq.cache_key("make", ["src/*.py"]) != key
+
+
+def test_input_edits_and_new_files_invalidate(ws):
+    key = oq.cache_key("make", ["src/**/*.py"])
+    (ws / "src" / "a.py").write_text("a = 2\n")
+    edited = oq.cache_key("make", ["src/**/*.py"])
+    assert edited != key
+    (ws / "src" / "pkg").mkdir()
+    (ws / "src" / "pkg" / "b.py").write_text("")
+    assert oq.cache_key("make", ["src/**/*.py"]) != edited
+
+
+def test_unmatched_files_do_not_invalidate(ws):
+    key = oq.cache_key("make", ["src/*.py"])
+    (ws / "src" / "notes.txt").write_text("x")
+    assert oq.cache_key("make", ["src/*.py"]) == key
+
+
+def test_absolute_inputs_are_hashed(ws, tmp_path):
+    outside = tmp_path / "data"
+    outside.mkdir()
+    (outside / "in.csv").write_text("1\n")
+    key = oq.cache_key("make", [str(outside / "*.csv")])
+    assert key != oq.cache_key("make", [])
+    (outside / "in.csv").write_text("2\n")
+    assert oq.cache_key("make", [str(outside / "*.csv")]) != key
+
+
+def test_home_relative_inputs_are_hashed(ws, tmp_path, monkeypatch):
+    home = tmp_path / "home"
+    home.mkdir()
+    (home / "cfg.toml").write_text("a = 1\n")
+    monkeypatch.setenv("HOME", str(home))
+    key = oq.cache_key("make", ["~/cfg.toml"])
+    (home / "cfg.toml").write_text("a = 2\n")
+    assert oq.cache_key("make", ["~/cfg.toml"]) != key
+
+
+def test_eviction_drops_least_recently_used(ws):
+    for i, key in enumerate(["old", "mid", "new"]):
+        oq.cache_put(key, {"ok": True, "pad": "x" * 100}, max_bytes=10_000)
+        os.utime(oq.CACHE_DIR / f"{key}.json", (1000 + i, 1000 + i))
+    assert oq.cache_get("old") is not None  # touching it makes "mid" the oldest
+    size = (oq.CACHE_DIR / "new.json").stat().st_size
+    oq.evict_cache(2 * size)
+    assert sorted(p.stem for p in oq.CACHE_DIR.glob("*.json")) == ["new", "old"]
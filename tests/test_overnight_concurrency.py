@@ -0,0 +1,96 @@
+"""ConcurrencyController: additive increase per healthy round, multiplicative cuts.
+
+Run: python3 -m pytest tests/
+"""
+
+from __future__ import annotations
+
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "scripts" / "advanced"))
+
+import overnight_queue as oq  # noqa: E402
+
+CFG = {
+    "adaptive_parallel": True,
+    "max_parallel": 4,
+    "min_parallel": 1,
+    "adaptive_max_parallel": 6,
+    "aimd_decrease_factor": 0.5,
+    "aimd_max_error_rate": 0.25,
+    "aimd_slow_fraction": 0.8,
+    "aimd_max_load_per_cpu": 1.5,
+}
+
+
+@pytest.fixture
+def ctl(monkeypatch):
+    adjustments = []
+    c = oq.ConcurrencyController(CFG, lambda old, new, reason: adjustments.append((old, new, reason)))
+    monkeypatch.setattr(c, "load_per_cpu", lambda: 0.1)
+    c.adjustments = adjustments
+    return c
+
+
+def _ok(duration: float = 1.0) -> oq.TaskResult:
+    return oq.TaskResult("t", "t", True, duration_s=duration)
+
+
+def test_grows_by_one_per_healthy_round(ctl):
+    for _ in range(4):
+        ctl.on_result(_ok(), timeout_s=100)
+    assert ctl.limit == 5
+    for _ in range(5):
+        ctl.on_result(_ok(), timeout_s=100)
+    assert ctl.limit == 6
+    for _ in range(20):
+        ctl.on_result(_ok(), timeout_s=100)
+    assert ctl.limit == 6  # adaptive_max_parallel
+    assert [a[2] for a in ctl.adjustments] == ["healthy round", "healthy round"]
+
+
+def test_timeout_halves_once_per_round(ctl):
+    ctl.on_result(oq.TaskResult("t", "t", False, timed_out=True), timeout_s=100)
+    assert ctl.limit == 2
+    ctl.on_result(oq.TaskResult("t", "t", False, timed_out=True), timeout_s=100)
+    assert ctl.limit == 2  # same burst, not a second cut
+    ctl.on_result(oq.TaskResult("t", "t", False, timed_out=True), timeout_s=100)
+    assert ctl.limit == 1
+    assert ctl.adjustments == [(4, 2, "timeout"), (2, 1, "timeout")]
+
+
+def test_rate_limit_failure_cuts(ctl):
+    ctl.on_result(oq.TaskResult("t", "t", False, stderr="HTTP 429 Too Many Requests"), timeout_s=100)
+    assert ctl.adjustments == [(4, 2, "rate limit")]
+
+
+def test_slow_results_do_not_grow(ctl):
+    for _ in range(8):
+        ctl.on_result(_ok(duration=90), timeout_s=100)
+    assert ctl.limit == 4
+    assert not ctl.adjustments
+
+
+def test_high_error_rate_does_not_grow(ctl):
+    for ok in [False, True, True, True, True]:
+        ctl.on_result(oq.TaskResult("t", "t", ok, stderr="boom"), timeout_s=100)
+    # Only the last two fall under aimd_max_error_rate; a round needs four.
+    assert ctl.limit == 4
+    assert ctl.healthy_streak == 2
+
+
+def test_high_load_cuts(ctl, monkeypatch):
+    monkeypatch.setattr(ctl, "load_per_cpu", lambda: 3.0)
+    ctl.observe_load()
+    assert ctl.adjustments == [(4, 2, "load 3.00/cpu")]
+
+
+def test_disabled_is_static():
+    c = oq.ConcurrencyController({**CFG, "adaptive_parallel": False}, lambda *a: pytest.fail("adjusted"))
+    for _ in range(10):
+        c.on_result(oq.TaskResult("t", "t", False, timed_out=True), timeout_s=100)
+    assert c.limit == 4
+    assert c.summary() == {"adaptive": False, "final": 4, "min": 4, "max": 4, "adjustments": 0}
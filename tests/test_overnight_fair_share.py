@@ -0,0 +1,103 @@
+"""Fair-share dispatch across projects and priority aging in overnight_queue.
+
+Run: python3 -m pytest tests/
+"""
+
+from __future__ import annotations
+
+import contextlib
+import io
+import json
+import random
+import sys
+from datetime import datetime, timezone
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "scripts" / "advanced"))
+
+import overnight_queue as oq  # noqa: E402
+import overnight_sim  # noqa: E402
+
+DAY = 86400.0
+START = datetime(2026, 10, 20, 22, 0, tzinfo=timezone.utc).timestamp()
+
+
+@pytest.fixture
+def state(tmp_path):
+    old = oq.STATE_DIR
+    oq.use_state_dir(tmp_path)
+    yield tmp_path
+    oq.use_state_dir(old)
+
+
+def test_aging_grows_with_wait_and_is_capped(monkeypatch):
+    monkeypatch.setattr(oq, "CLOCK", lambda: START)
+    ages = {"new": START, "week": START - 7 * DAY, "ancient": START - 400 * DAY}
+    f = oq.aging_factors(ages, {"priority_aging_per_day": 0.1, "priority_aging_max": 5.0})
+    assert f["new"] == 1.0
+    assert f["week"] == pytest.approx(1.7)
+    assert f["ancient"] == 5.0
+    assert oq.aging_factors(ages, {"priority_aging_per_day": 0, "priority_aging_max": 5.0})["ancient"] == 1.0
+
+    task = {"id": "week", "priority": 2}
+    assert oq.aged_score(task, f) == (pytest.approx(0.5 * 1.7), -2)
+    assert oq.aged_score(task) == (0.5, -2)
+
+
+def test_task_ages_remember_first_seen(state, monkeypatch):
+    monkeypatch.setattr(oq, "CLOCK", lambda: START)
+    tasks = [{"id": "a"}, {"id": "b", "added": "2026-10-01T00:00:00Z"}]
+    ages = oq.load_task_ages(tasks)
+    assert ages["a"] == START
+    assert ages["b"] == datetime(2026, 10, 1, tzinfo=timezone.utc).timestamp()
+
+    monkeypatch.setattr(oq, "CLOCK", lambda: START + DAY)
+    later = oq.load_task_ages([{"id": "a"}, {"id": "c"}])
+    assert later == {"a": START, "c": START + DAY}
+    # Ids no longer queued are dropped from the registry.
+    assert set(json.loads(oq.TASK_AGES_PATH.read_text())["first_seen"]) == {"a", "c"}
+    assert oq.load_task_ages([{"id": "z"}], save=False) == {"z": START + DAY}
+    assert "z" not in json.loads(oq.TASK_AGES_PATH.read_text())["first_seen"]
+
+
+def test_project_weights():
+    cfg = {"project_weights": {"big": 3, "zero": 0, "bad": "x"}}
+    assert oq.project_weight("big", cfg) == 3.0
+    assert oq.project_weight("zero", cfg) == 0.01
+    assert oq.project_weight("bad", cfg) == 1.0
+    assert oq.project_weight("other", cfg) == 1.0
+    assert oq.task_project({"repo": "r"}) == "r" and oq.task_project({}) == "default"
+
+
+def _first_starts(state: Path, fair_share: bool) -> list:
+    """Project of each task in dispatch order, for one virtual night."""
+
+    tasks = [{"id": f"a{i}", "type": "local", "project": "a", "value": 10, "effort": 10} for i in range(4)]
+    tasks += [{"id": f"b{i}", "type": "local", "project": "b", "value": 1, "effort": 10} for i in range(2)]
+    cfg = {**oq.DEFAULT_CONFIG, "timezone": "UTC", "max_parallel": 2, "fair_share": fair_share, "priority_aging_per_day": 0}
+    oq.QUEUE_PATH.write_text(json.dumps({"config": cfg, "tasks": tasks}))
+
+    clock = overnight_sim.VirtualClock(START)
+    sampler = overnight_sim.Sampler("synthetic", cfg, 0.0, 0.0, [])
+    executor = overnight_sim.FakeExecutor(sampler, random.Random(0), clock)
+    loop = overnight_sim.VirtualEventLoop(clock)
+    real_clock, oq.CLOCK = oq.CLOCK, clock.time
+    try:
+        with contextlib.redirect_stdout(io.StringIO()):
+            loop.run_until_complete(oq.run_queue(False, executor=executor))
+    finally:
+        loop.close()
+        oq.CLOCK = real_clock
+    starts = [e["task"] for e in oq.iter_progress_events(oq.PROGRESS_PATH) if e.get("event") == "task_start"]
+    assert len(starts) == 6
+    return [t["project"] for t in starts]
+
+
+def test_fair_share_gives_each_project_a_slot(state):
+    assert _first_starts(state, fair_share=True)[:2] == ["a", "b"]
+
+
+def test_without_fair_share_value_order_wins(state):
+    assert _first_starts(state, fair_share=False)[:4] == ["a", "a", "a", "a"]
@@ -0,0 +1,133 @@
+"""Hedger: when a straggler gets a second attempt, and that the slot always comes back.
+
+Run: python3 -m pytest tests/
+"""
+
+from __future__ import annotations
+
+import asyncio
+import os
+import shutil
+import subprocess
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "scripts" / "advanced"))
+
+import overnight_builder  # noqa: E402
+from overnight_predictor import Prediction  # noqa: E402
+
+
+class _Predictor:
+    def __init__(self, pred: Prediction) -> None:
+        self.pred = pred
+
+    def predict(self, item, model=None):
+        return self.pred
+
+
+CONFIDENT = Prediction(p50_s=0.02, p90_s=0.05, p50_tokens=1000, p90_tokens=2000, confidence=0.9, samples=5)
+
+
+def test_plan_needs_samples_and_room_before_the_timeout():
+    h = overnight_builder.Hedger(_Predictor(CONFIDENT), "m", min_samples=3, min_after_s=0.05)
+    assert h.plan({"id": "a"}, timeout_s=600) is CONFIDENT
+    assert h.plan({"id": "a"}, timeout_s=0) is None
+
+    few = Prediction(0.02, 0.05, None, None, 0.9, 2)
+    assert overnight_builder.Hedger(_Predictor(few), "m", min_samples=3).plan({"id": "a"}, 600) is None
+    none = Prediction(None, None, None, None, 0.0, 0)
+    assert overnight_builder.Hedger(_Predictor(none), "m").plan({"id": "a"}, 600) is None
+    # The hedge would only start after min_after_s, which is past the timeout.
+    assert overnight_builder.Hedger(_Predictor(CONFIDENT), "m", min_after_s=700).plan({"id": "a"}, 600) is None
+
+
+def test_take_and_give_back():
+    async def go():
+        h = overnight_builder.Hedger(_Predictor(CONFIDENT), "m")
+        assert not h.take()  # no slot_free hook: never hedge
+        h.slot_free = lambda: True
+        assert h.take() and h.take()
+        assert h.active == 2
+        h.give_back()
+        assert h.active == 1 and h.freed.is_set()
+
+    asyncio.run(go())
+
+
+@pytest.fixture
+def repo(tmp_path, monkeypatch):
+    if shutil.which("git") is None:
+        pytest.skip("git not installed")
+    for k, v in {"GIT_AUTHOR_NAME": "t", "GIT_AUTHOR_EMAIL": "t@example.com", "GIT_COMMITTER_NAME": "t", "GIT_COMMITTER_EMAIL": "t@example.com", "GIT_CONFIG_GLOBAL": os.devnull, "GIT_CONFIG_NOSYSTEM": "1"}.items():
+        monkeypatch.setenv(k, v)
+    repo = tmp_path / "repo"
+    repo.mkdir()
+    subprocess.run(["git", "init", "-q", "-b", "main"], cwd=repo, check=True)
+    (repo / "README").write_text("x\n")
+    subprocess.run(["git", "add", "-A"], cwd=repo, check=True)
+    subprocess.run(["git", "commit", "-q", "-m", "init"], cwd=repo, check=True)
+    monkeypatch.setattr(overnight_builder, "LOGS_DIR", tmp_path / "logs")
+    monkeypatch.setattr(overnight_builder, "CODEX_STATUS_PATH", tmp_path / "codex_status.json")
+    return repo
+
+
+async def _fake_attempt(att, *, item, **kw):
+    if att.label == "primary":
+        await asyncio.sleep(30)
+    att.status = "success"
+    att.agent = "codex"
+    att.model = "hedge-model"
+
+
+def _run(repo: Path, tmp_path: Path, hedger) -> tuple:
+    async def go():
+        pool = overnight_builder.WorktreePool(repo, tmp_path / "pool")
+        git = overnight_builder.GitBatch(repo)
+        try:
+            res = await asyncio.wait_for(
+                overnight_builder.run_one_item(
+                    item={"id": "slow"}, agent_name="codex", timeout_s=600, repo_root=repo, dry_run=False, pool=pool, git=git, hedger=hedger
+                ),
+                timeout=20,
+            )
+        finally:
+            git.close()
+        return res, pool
+
+    return asyncio.run(go())
+
+
+def test_hedge_wins_and_gives_its_slot_back(repo, tmp_path, monkeypatch):
+    monkeypatch.setattr(overnight_builder, "_run_attempt", _fake_attempt)
+    hedger = overnight_builder.Hedger(_Predictor(CONFIDENT), "m", min_after_s=0.05)
+    hedger.slot_free = lambda: True
+
+    res, pool = _run(repo, tmp_path, hedger)
+
+    assert res.status == "success"
+    assert res.hedge["winner"] == "hedge" and res.hedge["model"] == "hedge-model"
+    assert res.hedge["extra_tokens"] == 1000 and res.hedge["extra_tokens_estimated"]
+    assert hedger.active == 0
+    assert len(pool.free) == 2
+    branches = subprocess.run(["git", "branch", "--list", "overnight/*"], cwd=repo, capture_output=True, text=True).stdout
+    assert branches.strip() == ""
+
+
+def test_no_free_slot_means_no_hedge(repo, tmp_path, monkeypatch):
+    async def fake(att, *, item, **kw):
+        await asyncio.sleep(0.3)
+        att.status = "success"
+
+    monkeypatch.setattr(overnight_builder, "_run_attempt", fake)
+    asked = []
+    hedger = overnight_builder.Hedger(_Predictor(CONFIDENT), "m", min_after_s=0.05)
+    hedger.slot_free = lambda: asked.append(1) and False
+
+    res, pool = _run(repo, tmp_path, hedger)
+
+    assert res.status == "success" and res.hedge is None
+    assert asked and hedger.active == 0
+    assert len(pool.free) == 1
@@ -0,0 +1,94 @@
+"""LeaseStore claim / renew / expiry across workers sharing one SQLite file.
+
+Run: python3 -m pytest tests/
+"""
+
+from __future__ import annotations
+
+import sys
+import types
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "scripts" / "advanced"))
+
+import overnight_leases  # noqa: E402
+
+NIGHT = "20260101"
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1_000_000.0]
+    monkeypatch.setattr(overnight_leases, "time", types.SimpleNamespace(time=lambda: now[0]))
+    return now
+
+
+@pytest.fixture
+def stores(tmp_path, clock):
+    db = tmp_path / "leases.sqlite"
+    a, b = overnight_leases.LeaseStore(db), overnight_leases.LeaseStore(db)
+    a.publish(NIGHT, [{"id": "t1"}, {"id": "t2"}])
+    yield a, b
+    a.close()
+    b.close()
+
+
+def test_publish_is_a_union(stores):
+    a, b = stores
+    tasks = b.publish(NIGHT, [{"id": "t2", "name": "ignored"}, {"id": "t3"}])
+    assert [t["id"] for t in tasks] == ["t1", "t2", "t3"]
+    assert "name" not in tasks[1]  # existing rows win
+    assert b.publish("20260102", []) == []
+
+
+def test_claim_is_exclusive_until_the_lease_lapses(stores, clock):
+    a, b = stores
+    assert a.claim(NIGHT, "t1", "A", lease_s=60, max_attempts=3)
+    assert not b.claim(NIGHT, "t1", "B", lease_s=60, max_attempts=3)
+    clock[0] += 61
+    assert b.snapshot(NIGHT)["t1"]["live"] is False
+    assert b.claim(NIGHT, "t1", "B", lease_s=60, max_attempts=3)
+    snap = a.snapshot(NIGHT)["t1"]
+    assert snap["owner"] == "B" and snap["attempts"] == 2 and snap["live"]
+
+
+def test_renew_extends_and_reports_lost_leases(stores, clock):
+    a, b = stores
+    a.claim(NIGHT, "t1", "A", lease_s=60, max_attempts=3)
+    a.claim(NIGHT, "t2", "A", lease_s=60, max_attempts=3)
+    clock[0] += 50
+    assert a.renew(NIGHT, ["t1", "t2"], "A", lease_s=60) == []
+    clock[0] += 50
+    assert not b.claim(NIGHT, "t1", "B", lease_s=60, max_attempts=3)
+
+    clock[0] += 61
+    assert b.claim(NIGHT, "t2", "B", lease_s=60, max_attempts=3)
+    assert a.renew(NIGHT, ["t1", "t2"], "A", lease_s=60) == ["t2"]
+    assert a.renew(NIGHT, [], "A", lease_s=60) == []
+
+
+def test_max_attempts_marks_failed(stores, clock):
+    a, b = stores
+    for owner in ("A", "B"):
+        assert a.claim(NIGHT, "t1", owner, lease_s=10, max_attempts=2)
+        clock[0] += 11
+    assert not b.claim(NIGHT, "t1", "B", lease_s=10, max_attempts=2)
+    snap = a.snapshot(NIGHT)["t1"]
+    assert snap["state"] == "failed" and snap["owner"] is None
+    clock[0] += 1000
+    assert not a.claim(NIGHT, "t1", "A", lease_s=10, max_attempts=5)
+
+
+def test_finish_and_release(stores):
+    a, b = stores
+    a.claim(NIGHT, "t1", "A", lease_s=60, max_attempts=3)
+    assert not b.finish(NIGHT, "t1", "B", ok=True)
+    assert a.finish(NIGHT, "t1", "A", ok=True, info={"commits": 1})
+    assert not b.claim(NIGHT, "t1", "B", lease_s=60, max_attempts=3)
+
+    a.claim(NIGHT, "t2", "A", lease_s=60, max_attempts=3)
+    assert a.release(NIGHT, "t2", "A")
+    assert b.snapshot(NIGHT)["t2"]["state"] == "queued"
+    assert b.claim(NIGHT, "t2", "B", lease_s=60, max_attempts=3)
@@ -0,0 +1,118 @@
+"""Outbox: coalescing, supersedes, pacing, retries and dead-lettering.
+
+Run: python3 -m pytest tests/
+"""
+
+from __future__ import annotations
+
+import sys
+import types
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "scripts" / "advanced"))
+
+import overnight_notify  # noqa: E402
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """Virtual time: sleep() advances the clock instead of waiting."""
+
+    now = [1_000_000.0]
+    sleeps = []
+
+    def sleep(s):
+        sleeps.append(s)
+        now[0] += s
+
+    monkeypatch.setattr(overnight_notify, "time", types.SimpleNamespace(time=lambda: now[0], sleep=sleep))
+    return sleeps
+
+
+@pytest.fixture
+def outbox(tmp_path, clock):
+    return overnight_notify.Outbox(tmp_path / "spool", min_interval_s=30, max_attempts=3)
+
+
+def _texts(outbox) -> list:
+    return [m["text"] for _, m in outbox._queued()]
+
+
+def test_coalesce_appends_to_an_unsent_message(outbox):
+    outbox.enqueue("digest 1", run_id="r1", kind="digest", coalesce=True)
+    outbox.enqueue("digest 2", run_id="r1", kind="digest", coalesce=True)
+    outbox.enqueue("other run", run_id="r2", kind="digest", coalesce=True)
+    assert _texts(outbox) == ["digest 1\n\ndigest 2", "other run"]
+    assert outbox._queued()[0][1]["coalesced"] == 2
+
+
+def test_supersedes_drops_unsent_messages_of_that_kind(outbox):
+    outbox.enqueue("start", run_id="r1", kind="start")
+    outbox.enqueue("digest", run_id="r1", kind="digest")
+    outbox.enqueue("digest elsewhere", run_id="r2", kind="digest")
+    outbox.enqueue("summary", run_id="r1", kind="summary", supersedes="digest")
+    assert _texts(outbox) == ["start", "digest elsewhere", "summary"]
+
+
+def test_drain_sends_in_order_and_paces(outbox, clock):
+    for t in ("a", "b", "c"):
+        outbox.enqueue(t)
+    sent = []
+    assert outbox.drain(send=sent.append) == 3
+    assert sent == ["a", "b", "c"]
+    assert [round(s) for s in clock] == [30, 30]
+    assert outbox.status()["queued"] == 0 and outbox.status()["sent"] == 3
+
+
+def test_failed_send_retries_then_succeeds(outbox, clock):
+    outbox.enqueue("a")
+    outbox.enqueue("b")
+    calls = []
+
+    def flaky(text):
+        calls.append(text)
+        if len(calls) == 1:
+            raise RuntimeError("Too Many Requests: retry after 7")
+
+    assert outbox.drain(send=flaky) == 2
+    # The retry holds back the message behind it so order is kept.
+    assert calls == ["a", "a", "b"]
+    assert clock[0] == pytest.approx(8)
+
+
+def test_message_is_dead_lettered_after_max_attempts(outbox, clock):
+    outbox.enqueue("doomed")
+    outbox.enqueue("fine")
+    sent = []
+
+    def send(text):
+        if text == "doomed":
+            raise RuntimeError("chat not found")
+        sent.append(text)
+
+    assert outbox.drain(send=send) == 1
+    assert sent == ["fine"]
+    st = outbox.status()
+    assert st["dead"] == 1 and st["queued"] == 0
+    dead = outbox._read(next(outbox.dead.glob("*.json")))
+    assert dead["attempts"] == 3 and dead["last_error"] == "chat not found"
+    # Backoff doubled between attempts.
+    assert [round(s) for s in clock if s >= 30][:2] == [30, 60]
+
+    assert outbox.requeue_dead() == 1
+    assert _texts(outbox) == ["doomed"]
+
+
+def test_inflight_from_a_killed_drainer_is_resent(outbox):
+    path = outbox.enqueue("lost")
+    path.rename(path.with_suffix(".inflight"))
+    sent = []
+    assert outbox.drain(send=sent.append) == 1
+    assert sent == ["lost"]
+
+
+def test_only_one_drainer(outbox):
+    with outbox._locked(".drain.lock"):
+        assert outbox.drain(send=lambda t: None) == -1
@@ -0,0 +1,85 @@
+"""plan_tasks packs the most value into the window, where greedy score order does not.
+
+Run: python3 -m pytest tests/
+"""
+
+from __future__ import annotations
+
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "scripts" / "advanced"))
+
+import overnight_queue as oq  # noqa: E402
+
+CFG = {"plan_bucket_minutes": 5, "plan_token_bucket": 1000}
+
+
+def _task(tid: str, value: float, minutes: float, tokens: int = 0) -> dict:
+    return {"id": tid, "type": "codex", "value": value, "effort": minutes, "est_tokens": tokens}
+
+
+def _greedy(tasks: list, lane_seconds: float) -> list:
+    left, out = lane_seconds, []
+    for t in sorted(tasks, key=oq.score_task, reverse=True):
+        if t["effort"] * 60 <= left:
+            out.append(t)
+            left -= t["effort"] * 60
+    return out
+
+
+def _value(tasks: list) -> float:
+    return sum(t["value"] for t in tasks)
+
+
+def _ids(tasks: list) -> list:
+    return [t["id"] for t in tasks]
+
+
+def test_knapsack_beats_greedy():
+    tasks = [_task("big", 5, 40), _task("b", 3, 30), _task("c", 3, 30)]
+    est = oq.TaskEstimator(CFG, {})
+
+    greedy = _greedy(tasks, 3600)
+    plan = oq.plan_tasks(tasks, est, seconds_left=3600, lane_seconds=3600, tokens_left=None, cfg=CFG)
+
+    assert _ids(greedy) == ["big"]
+    assert sorted(_ids(plan)) == ["b", "c"]
+    assert _value(plan) > _value(greedy)
+
+
+def test_token_budget_is_a_second_dimension():
+    tasks = [_task("a", 4, 10, tokens=9000), _task("b", 3, 10, tokens=5000), _task("c", 3, 10, tokens=5000)]
+    est = oq.TaskEstimator(CFG, {})
+    plan = oq.plan_tasks(tasks, est, seconds_left=3600, lane_seconds=3600, tokens_left=10_000, cfg=CFG)
+    assert sorted(_ids(plan)) == ["b", "c"]
+
+
+def test_tasks_that_cannot_finish_before_stop_are_dropped():
+    tasks = [_task("long", 100, 90), _task("short", 1, 10)]
+    est = oq.TaskEstimator(CFG, {})
+    # Plenty of lane time across workers, but only an hour of wall clock.
+    plan = oq.plan_tasks(tasks, est, seconds_left=3600, lane_seconds=4 * 3600, tokens_left=None, cfg=CFG)
+    assert _ids(plan) == ["short"]
+
+
+def test_history_overrides_declared_effort():
+    tasks = [_task("a", 2, 10), _task("b", 1, 10)]
+    est = oq.TaskEstimator(CFG, {"a": [3000.0, 3300.0, 3200.0]})
+    plan = oq.plan_tasks(tasks, est, seconds_left=3600, lane_seconds=1800, tokens_left=None, cfg=CFG)
+    assert _ids(plan) == ["b"]
+
+
+def test_chosen_tasks_run_preferred_then_by_score():
+    tasks = [_task("a", 1, 10), _task("b", 2, 10), _task("c", 3, 10)]
+    est = oq.TaskEstimator(CFG, {})
+    plan = oq.plan_tasks(tasks, est, seconds_left=3600, lane_seconds=3600, tokens_left=None, cfg=CFG, prefer={"a"})
+    assert _ids(plan) == ["a", "c", "b"]
+
+
+def test_calibration_scales_estimates():
+    est = oq.TaskEstimator(CFG, {})
+    t = _task("a", 1, 10)
+    est.observe(t, oq.TaskResult("a", "a", True, duration_s=1200))
+    assert est.calibration() == 2.0
+    assert est.seconds(t) == 1200
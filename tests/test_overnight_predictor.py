@@ -0,0 +1,100 @@
+"""Predictor: incremental refits from both runners' history, and predictions.
+
+Run: python3 -m pytest tests/
+"""
+
+from __future__ import annotations
+
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "scripts" / "advanced"))
+
+import overnight_predictor as op  # noqa: E402
+import overnight_queue as oq  # noqa: E402
+import overnight_results  # noqa: E402
+
+
+@pytest.fixture
+def state(tmp_path, monkeypatch):
+    old = oq.STATE_DIR
+    oq.use_state_dir(tmp_path)
+    for name in ("PROGRESS_PATH", "PROGRESS_META_PATH", "PROGRESS_SEGMENTS_DIR"):
+        monkeypatch.setattr(op, name, getattr(oq, name))
+    monkeypatch.setattr(op, "RESULTS_PATH", tmp_path / "overnight_build_results")
+    monkeypatch.setattr(op, "CLAWD", tmp_path)
+    yield tmp_path
+    oq.use_state_dir(old)
+
+
+def _queue_run(run_id: str, durations: dict) -> None:
+    oq.log_event({"event": "run_start", "run_id": run_id})
+    for tid, dur in durations.items():
+        oq.log_event({"event": "task_start", "run_id": run_id, "task": {"id": tid, "type": "local", "name": f"lint {tid}"}})
+        oq.log_event({"event": "task_end", "run_id": run_id, "task_id": tid, "ok": dur is not None, "duration_s": dur or 1.0, "tokens": 0})
+
+
+def test_refit_is_incremental_across_rotation(state):
+    _queue_run("r1", {"a": 10.0, "b": None})
+    p = op.Predictor()
+    assert p.refit() == 1  # the failed task is not a sample
+    assert p.refit() == 0
+
+    oq.maybe_rotate_progress({"progress_rotate_bytes": 1, "progress_rotate_days": 0})
+    _queue_run("r2", {"a": 20.0, "c": 30.0})
+    assert p.refit() == 2
+    assert p.progress_mark["gen"] == 1
+
+    # A saved model picks up where it stopped.
+    p.save(state / "model.json")
+    _queue_run("r3", {"a": 40.0})
+    again = op.Predictor.load(state / "model.json")
+    assert again.refit() == 1
+    assert again.refit(full=True) == 4
+
+
+def test_builder_results_are_read_past_the_watermark(state):
+    store = overnight_results.ResultsStore(op.RESULTS_PATH)
+    store.append_run([
+        {"task": {"id": "x", "spec": "fix the parser"}, "status": "success", "finished_at": "2026-01-01T00:00:00Z", "duration_seconds": 300, "tokens": 9000, "agent": "codex"},
+        {"task": {"id": "y"}, "status": "fail", "finished_at": "2026-01-01T00:01:00Z", "duration_seconds": 5},
+    ])
+    p = op.Predictor()
+    assert p.refit() == 1
+    assert p.results_mark == "2026-01-01T00:01:00Z"
+    store.append_run([{"task": {"id": "z"}, "status": "success", "finished_at": "2026-01-02T00:00:00Z", "duration_seconds": 60}])
+    assert p.refit() == 1
+    assert [s["src"] for s in p.samples] == ["builder", "builder"]
+
+
+def test_predict_weights_similar_tasks():
+    p = op.Predictor()
+    for i, dur in enumerate([100, 110, 120, 130, 1000]):
+        feats = op.features({"id": f"t{i}", "type": "codex", "name": "refactor parser module", "spec": "x" * 500})
+        p.add_sample(feats, dur, 10_000 + i, "builder")
+    p.add_sample(op.features({"id": "own", "type": "local"}), 7, None, "queue")
+
+    pred = p.predict({"id": "new", "type": "codex", "name": "refactor parser tests", "spec": "y" * 600})
+    assert pred.samples == 5
+    assert 100 <= pred.p50_s <= 130 < pred.p90_s
+    assert pred.p50_tokens is not None and 0 < pred.confidence <= 1
+
+    own = p.predict({"id": "own", "type": "local"})
+    assert own.p50_s == 7 and own.p50_tokens is None
+
+    assert p.predict({"id": "q", "type": "other", "repo": "elsewhere", "spec": "z" * 100000}).samples == 0
+
+
+@pytest.mark.parametrize(
+    "payload, tokens",
+    [
+        ({"usage": {"total_tokens": 42}}, 42),
+        ({"result": {"meta": {"usage": {"inputTokens": 3, "outputTokens": 4}}}}, 7),
+        ({"runs": [{"x": 1}, {"usage": {"input": 1, "output": 2}}]}, 3),
+        ({"reply": "no usage"}, None),
+    ],
+)
+def test_extract_usage_tokens(payload, tokens):
+    assert op.extract_usage_tokens(payload) == tokens
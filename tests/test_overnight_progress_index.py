@@ -0,0 +1,134 @@
+"""Journal rotation and the sidecar index behind --report and --resume RUN_ID.
+
+Run: python3 -m pytest tests/
+"""
+
+from __future__ import annotations
+
+import gzip
+import json
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "scripts" / "advanced"))
+
+import overnight_queue as oq  # noqa: E402
+
+ROTATE_NOW = {"progress_rotate_bytes": 1, "progress_rotate_days": 0}
+
+
+@pytest.fixture
+def state(tmp_path):
+    old = oq.STATE_DIR
+    oq.use_state_dir(tmp_path)
+    yield tmp_path
+    oq.use_state_dir(old)
+
+
+def _run(run_id: str, *task_ids: str) -> None:
+    oq.log_event({"event": "run_start", "run_id": run_id, "ts": f"2026-01-0{run_id[-1]}T00:00:00Z"})
+    for tid in task_ids:
+        oq.log_event({"event": "task_start", "run_id": run_id, "task": {"id": tid}})
+        oq.log_event({"event": "task_end", "run_id": run_id, "task_id": tid, "ok": True})
+
+
+def _index() -> list:
+    return list(oq.iter_index_file(oq.PROGRESS_INDEX_PATH))
+
+
+def test_index_offsets_point_at_their_lines(state):
+    _run("r1", "a", "b")
+    entries = _index()
+    assert [e["e"] for e in entries] == ["run_start", "task_start", "task_end", "task_start", "task_end"]
+    with oq.PROGRESS_PATH.open("rb") as f:
+        for e in entries:
+            f.seek(e["o"])
+            ev = json.loads(f.readline())
+            assert ev["event"] == e["e"]
+            assert oq.event_task_id(ev) == e.get("t", "")
+            assert e["g"] == 0 and e["r"] == "r1"
+
+
+def test_meta_starts_at_version_one(state):
+    _run("r1", "a")
+    meta = json.loads(oq.PROGRESS_META_PATH.read_text())
+    assert meta["index_version"] == oq.PROGRESS_INDEX_VERSION == 1
+    assert meta["generation"] == 0
+
+
+def test_rotation_moves_journal_and_index_into_a_segment(state):
+    _run("r1", "a")
+    seg = oq.maybe_rotate_progress(ROTATE_NOW)
+
+    assert seg == oq.segment_path(0) and seg.exists()
+    assert oq.segment_index_path(0).exists()
+    assert not oq.PROGRESS_PATH.exists() and not oq.PROGRESS_INDEX_PATH.exists()
+    meta = oq.load_progress_meta()
+    assert meta["generation"] == 1
+    assert meta["segments"]["0"]["runs"] == ["r1"]
+    assert meta["segments"]["0"]["tasks"] == ["a"]
+    with gzip.open(seg, "rt") as f:
+        assert json.loads(f.readline())["run_id"] == "r1"
+
+    _run("r2", "b")
+    assert {e["g"] for e in _index()} == {1}
+    assert oq.maybe_rotate_progress({"progress_rotate_bytes": 0, "progress_rotate_days": 0}) is None
+
+
+def test_lookups_span_segments(state):
+    _run("r1", "a")
+    oq.maybe_rotate_progress(ROTATE_NOW)
+    _run("r2", "b")
+
+    old = oq.read_index(run_id="r1")
+    assert old and all(e["g"] == 0 for e in old)
+    events = oq.read_indexed_events(old)
+    assert [ev["event"] for ev in events] == ["run_start", "task_start", "task_end"]
+    assert set(oq.load_run_journal("r1")["succeeded"]) == {"a"}
+
+    assert {e["r"] for e in oq.read_index(task_id="b")} == {"r2"}
+    assert {e["r"] for e in oq.read_index(since="2026-01-02")} == {"r2"}
+
+
+def test_shards_that_cannot_match_are_not_opened(state):
+    _run("r1", "a")
+    oq.maybe_rotate_progress(ROTATE_NOW)
+    _run("r2", "b")
+    oq.segment_index_path(0).write_text("not json\n")
+
+    assert {e["r"] for e in oq.read_index(run_id="r2")} == {"r2"}
+    assert oq.read_index(run_id="r1") == []
+
+
+def test_missing_index_is_rebuilt(state):
+    _run("r1", "a")
+    oq.maybe_rotate_progress(ROTATE_NOW)
+    _run("r2", "b")
+    live = _index()
+    shard = list(oq.iter_index_file(oq.segment_index_path(0)))
+
+    oq.PROGRESS_INDEX_PATH.unlink()
+    oq.segment_index_path(0).unlink()
+    oq._forget_progress_meta()
+
+    oq.ensure_progress_index()
+    assert list(oq.iter_index_file(oq.segment_index_path(0))) == shard
+    assert _index() == live
+    assert oq.load_progress_meta()["segments"]["0"]["runs"] == ["r1"]
+
+
+def test_index_catches_up_after_a_lost_entry(state):
+    _run("r1", "a")
+    # A crash between the journal write and the index write.
+    with oq.PROGRESS_PATH.open("ab") as f:
+        offset = f.tell()
+        f.write(b'{"event": "run_end", "run_id": "r1"}\n')
+    oq._forget_progress_meta()
+
+    oq.log_event({"event": "run_start", "run_id": "r2"})
+    entries = _index()
+    assert [e["e"] for e in entries[-2:]] == ["run_end", "run_start"]
+    assert entries[-2]["o"] == offset
+    assert oq.load_run_journal("r1")["ended"]
@@ -0,0 +1,58 @@
+"""HeadTailBuffer keeps a bounded head and tail of a task's output.
+
+Run: python3 -m pytest tests/
+"""
+
+from __future__ import annotations
+
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "scripts" / "advanced"))
+
+import overnight_queue  # noqa: E402
+
+HeadTailBuffer = overnight_queue.HeadTailBuffer
+
+
+def test_short_output_is_kept_whole():
+    buf = HeadTailBuffer(8, 8)
+    buf.feed(b"hello ")
+    buf.feed(b"world")
+    assert not buf.truncated
+    assert buf.total == 11
+    assert buf.text() == "hello world"
+
+
+def test_long_output_keeps_head_and_tail():
+    buf = HeadTailBuffer(4, 6)
+    for i in range(100):
+        buf.feed(f"{i:03d}\n".encode())
+    assert buf.truncated
+    assert bytes(buf.head) == b"000\n"
+    assert bytes(buf.tail) == b"8\n099\n"
+    assert len(buf.head) + len(buf.tail) == 10
+    text = buf.text(Path("/logs/t.stdout.log"))
+    assert text == "000\n\n... [390 bytes omitted; full log: /logs/t.stdout.log] ...\n8\n099"
+
+
+def test_chunk_split_across_head_and_tail():
+    buf = HeadTailBuffer(3, 3)
+    buf.feed(b"abcdefghij")
+    assert bytes(buf.head) == b"abc"
+    assert bytes(buf.tail) == b"hij"
+    assert buf.text() == "abc\n... [4 bytes omitted] ...\nhij"
+
+
+def test_zero_tail_keeps_only_head():
+    buf = HeadTailBuffer(2, 0)
+    buf.feed(b"xyz")
+    assert bytes(buf.head) == b"xy"
+    assert not buf.tail
+    assert buf.truncated
+
+
+def test_invalid_utf8_is_replaced():
+    buf = HeadTailBuffer(16, 16)
+    buf.feed("é".encode()[:1] + b"ok")
+    assert buf.text() == "�ok"
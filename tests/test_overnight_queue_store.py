@@ -0,0 +1,116 @@
+"""QueueStore: locked read-modify-write, WAL replay and stale-claim recovery.
+
+Run: python3 -m pytest tests/
+"""
+
+from __future__ import annotations
+
+import json
+import socket
+import sys
+import threading
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "scripts" / "advanced"))
+
+import overnight_queue_store as qs  # noqa: E402
+
+
+@pytest.fixture
+def store(tmp_path):
+    path = tmp_path / "overnight_queue.json"
+    path.write_text(json.dumps({"tasks": [{"id": "nightly"}], "config": {"max_parallel": 2}}))
+    return qs.QueueStore(path)
+
+
+def test_enqueue_assigns_ids_and_skips_duplicates(store):
+    added = store.enqueue([{"id": "a"}, {"title": "no id"}])
+    assert [it["status"] for it in added] == [qs.QUEUED, qs.QUEUED]
+    assert added[1]["id"].startswith("q-")
+    assert store.enqueue([{"id": "a", "title": "again"}]) == []
+    doc = store.read()
+    assert [it["id"] for it in doc["items"]] == ["a", added[1]["id"]]
+    assert doc["tasks"] == [{"id": "nightly"}] and doc["config"] == {"max_parallel": 2}
+    assert doc["seq"] == 2
+    assert not store.wal_path.exists()
+
+
+def test_claim_complete_requeue(store):
+    store.enqueue([{"id": "a"}, {"id": "b"}, {"id": "c", "status": None}])
+    claimed = store.claim(["a", "c", "missing"], owner="host:1")
+    assert [it["id"] for it in claimed] == ["a", "c"]
+    assert store.claim(["a"], owner="host:2") == []
+    assert [it["id"] for it in store.items(qs.RUNNING)] == ["a", "c"]
+
+    assert store.requeue(["c", "b"]) == 1
+    assert store.complete(["a"]) == 1
+    items = store.items()
+    assert [(it["id"], it["status"]) for it in items] == [("b", qs.QUEUED), ("c", qs.QUEUED)]
+    assert "claimed_by" not in items[1]
+
+
+def test_requeue_stale(store):
+    store.enqueue([{"id": "dead"}, {"id": "live"}, {"id": "old"}])
+    store.claim(["dead"], owner=f"{socket.gethostname()}:999999999")
+    store.claim(["live"], owner=qs.owner_id())
+    store.claim(["old"], owner="elsewhere:1")
+    doc = json.loads(store.path.read_text())
+    doc["items"][2]["claimed_at"] = "2020-01-01T00:00:00Z"
+    store.path.write_text(json.dumps(doc))
+
+    assert store.requeue_stale(max_age_s=3600) == 2
+    assert [it["id"] for it in store.items(qs.RUNNING)] == ["live"]
+
+
+def test_concurrent_enqueues_are_not_lost(store):
+    def producer(n: int) -> None:
+        for i in range(10):
+            qs.QueueStore(store.path).enqueue([{"id": f"p{n}-{i}"}])
+
+    threads = [threading.Thread(target=producer, args=(n,)) for n in range(4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert len(store.items()) == 40
+    assert store.read()["seq"] == 40
+
+
+def test_crash_before_rename_is_replayed(store, monkeypatch):
+    store.enqueue([{"id": "a"}])
+
+    def crash(src, dst):
+        raise OSError("power cut")
+
+    monkeypatch.setattr(qs.os, "replace", crash)
+    with pytest.raises(OSError):
+        store.claim(["a"], owner="host:1")
+    monkeypatch.undo()
+
+    # The queue file still has the old document; the WAL has the claim.
+    assert json.loads(store.path.read_text())["items"][0]["status"] == qs.QUEUED
+    assert store.wal_path.exists()
+
+    items = qs.QueueStore(store.path).items()
+    assert items[0]["status"] == qs.RUNNING and items[0]["claimed_by"] == "host:1"
+    assert not store.wal_path.exists()
+    assert store.read()["seq"] == 2
+
+
+def test_torn_wal_line_is_ignored(store):
+    store.enqueue([{"id": "a"}])
+    with store.wal_path.open("w") as wal:
+        wal.write(json.dumps({"op": "complete", "ids": ["a"], "seq": 1}) + "\n")  # already applied
+        wal.write('{"op": "complete", "ids": ["a"], "se')
+    assert [it["id"] for it in store.items()] == ["a"]
+    assert not store.wal_path.exists()
+
+
+def test_unreadable_queue_raises(store):
+    store.path.write_text("{not json")
+    with pytest.raises(RuntimeError, match="unreadable"):
+        store.enqueue([{"id": "a"}])
+    assert store.path.read_text() == "{not json"
+    assert not store.wal_path.exists()
@@ -0,0 +1,104 @@
+"""ResultsStore: append, seal, compact and the reads the builder and reviews use.
+
+Run: python3 -m pytest tests/
+"""
+
+from __future__ import annotations
+
+import gzip
+import json
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "scripts" / "advanced"))
+
+import overnight_results  # noqa: E402
+
+ResultsStore = overnight_results.ResultsStore
+
+
+def _run(run_id: str, n: int, day: int, reply: str = "ok") -> list:
+    return [
+        {"run_id": run_id, "id": f"{run_id}-{i}", "finished_at": f"2026-01-{day:02d}T00:00:{i:02d}Z", "raw_reply": reply}
+        for i in range(n)
+    ]
+
+
+def _ids(entries: list) -> list:
+    return [e["id"] for e in entries]
+
+
+def test_latest_run_and_extension(tmp_path):
+    store = ResultsStore(tmp_path / "results")
+    store.append_run(_run("r1", 3, 1))
+    store.append_run(_run("r2", 2, 2))
+    assert _ids(store.latest_run()) == ["r2-0", "r2-1"]
+
+    store.append_run([{"run_id": "r2", "id": "r2-late", "finished_at": "2026-01-02T01:00:00Z"}])
+    assert _ids(ResultsStore(tmp_path / "results").latest_run()) == ["r2-0", "r2-1", "r2-late"]
+    assert store.status()["entries"] == 6
+    assert _ids(store.tail(4)) == ["r1-2", "r2-0", "r2-1", "r2-late"]
+
+
+def test_full_segment_is_sealed_and_trimmed(tmp_path):
+    store = ResultsStore(tmp_path / "results", segment_bytes=1, reply_keep_chars=10)
+    store.append_run(_run("r1", 2, 1, reply="x" * 50))
+    store.append_run(_run("r2", 1, 2))
+
+    segs = store.index["segments"]
+    assert [s["sealed"] for s in segs] == [True, False]
+    assert segs[0]["file"] == "results.000000.jsonl.gz"
+    assert not (store.root / "results.000000.jsonl").exists()
+    with gzip.open(store.root / segs[0]["file"], "rt") as f:
+        first = json.loads(f.readline())
+    assert first["raw_reply"] == "x" * 10 and first["raw_reply_truncated"] == 50
+
+    assert _ids(store.latest_run()) == ["r2-0"]
+    assert _ids(store.iter_entries()) == ["r1-0", "r1-1", "r2-0"]
+
+
+def test_sealed_latest_run_is_read_from_the_tail(tmp_path):
+    store = ResultsStore(tmp_path / "results", compress=False)
+    store.append_run(_run("r1", 2, 1))
+    store.append_run(_run("r2", 2, 2))
+    store._seal(store._live())
+    store._save_index()
+    assert store.index["last_run"]["offset"] is None
+    assert _ids(ResultsStore(tmp_path / "results").latest_run()) == ["r2-0", "r2-1"]
+
+
+def test_compact_keeps_at_least_keep_entries(tmp_path):
+    store = ResultsStore(tmp_path / "results", segment_bytes=1, keep_entries=4)
+    for day in range(1, 6):
+        store.append_run(_run(f"r{day}", 2, day))
+    # Each run sealed its predecessor; appends compacted down to keep_entries.
+    assert [s["gen"] for s in store.index["segments"]] == [3, 4]
+    assert store.status()["entries"] == 4
+    assert not (store.root / "results.000000.jsonl.gz").exists()
+    assert store.compact() == 0
+
+
+def test_iter_entries_skips_segments_finished_before(tmp_path):
+    store = ResultsStore(tmp_path / "results", segment_bytes=1)
+    for day in (1, 2, 3):
+        store.append_run(_run(f"r{day}", 2, day))
+    (store.root / "results.000000.jsonl.gz").write_bytes(b"not gzip")  # must not be opened
+
+    got = list(store.iter_entries(finished_after="2026-01-01T23:59:59Z"))
+    assert _ids(got) == ["r2-0", "r2-1", "r3-0", "r3-1"]
+
+
+def test_legacy_json_is_read_then_migrated(tmp_path):
+    legacy = tmp_path / "overnight_build_results.json"
+    legacy.write_text(json.dumps({"last_run_at": "2025-12-31T00:00:00Z", "runs": [{"id": f"old-{i}"} for i in range(25)]}))
+    store = ResultsStore(legacy)
+    assert store.legacy_pending()
+    assert len(store.latest_run()) == 20
+
+    assert store.migrate()
+    assert not store.migrate()
+    assert not legacy.exists() and (tmp_path / "overnight_build_results.json.migrated").exists()
+    assert len(store.latest_run()) == 20
+    assert store.status()["entries"] == 25
+    store.append_run(_run("r1", 1, 1))
+    assert _ids(store.tail(2)) == ["old-24", "r1-0"]
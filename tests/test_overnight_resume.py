@@ -0,0 +1,88 @@
+"""load_run_journal rebuilds a crashed run from overnight_progress.jsonl.
+
+Run: python3 -m pytest tests/
+"""
+
+from __future__ import annotations
+
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "scripts" / "advanced"))
+
+import overnight_queue as oq  # noqa: E402
+
+
+@pytest.fixture
+def state(tmp_path):
+    old = oq.STATE_DIR
+    oq.use_state_dir(tmp_path)
+    yield tmp_path
+    oq.use_state_dir(old)
+
+
+def _start(run_id: str, tid: str) -> None:
+    oq.log_event({"event": "task_start", "run_id": run_id, "task": {"id": tid, "type": "local"}})
+
+
+def _end(run_id: str, tid: str, ok: bool) -> None:
+    oq.log_event({"event": "task_end", "run_id": run_id, "task_id": tid, "ok": ok})
+
+
+def test_unfinished_tasks_are_in_flight(state):
+    oq.log_event({"event": "run_start", "run_id": "r1"})
+    _start("r1", "a")
+    _end("r1", "a", True)
+    _start("r1", "b")
+    _start("r1", "c")
+    _end("r1", "c", False)
+
+    j = oq.load_run_journal()
+    assert set(j["succeeded"]) == {"a"}
+    assert set(j["failed"]) == {"c"}
+    assert set(j["in_flight"]) == {"b"}
+    assert j["in_flight"]["b"]["type"] == "local"
+    assert not j["ended"]
+
+
+def test_retry_success_clears_failure(state):
+    oq.log_event({"event": "run_start", "run_id": "r1"})
+    _start("r1", "a")
+    _end("r1", "a", False)
+    _start("r1", "a")
+    _end("r1", "a", True)
+    oq.log_event({"event": "run_end", "run_id": "r1"})
+
+    j = oq.load_run_journal("r1")
+    assert set(j["succeeded"]) == {"a"}
+    assert not j["failed"]
+    assert j["ended"]
+
+
+def test_latest_run_is_default(state):
+    oq.log_event({"event": "run_start", "run_id": "r1"})
+    _start("r1", "a")
+    oq.log_event({"event": "run_start", "run_id": "r2"})
+    _start("r2", "b")
+
+    assert oq.load_run_journal()["run_start"]["run_id"] == "r2"
+    assert set(oq.load_run_journal("r1")["in_flight"]) == {"a"}
+    assert oq.load_run_journal("missing") is None
+
+
+def test_torn_tail_is_skipped_and_terminated(state):
+    oq.log_event({"event": "run_start", "run_id": "r1"})
+    _start("r1", "a")
+    with oq.PROGRESS_PATH.open("ab") as f:
+        f.write(b'{"event": "task_end", "run_id": "r1", "task_id": "a", "ok": tr')
+
+    assert set(oq.load_run_journal()["in_flight"]) == {"a"}
+
+    # The next event starts on its own line instead of gluing onto the torn one.
+    _end("r1", "a", True)
+    j = oq.load_run_journal()
+    assert set(j["succeeded"]) == {"a"}
+    assert not j["in_flight"]
+    assert oq.load_run_journal("r1")["succeeded"].keys() == {"a"}
@@ -0,0 +1,133 @@
+"""SessionPool recycling, and a smoke run of overnight_builder.py against fake_openclaw.py.
+
+Run: python3 -m pytest tests/
+"""
+
+from __future__ import annotations
+
+import json
+import os
+import shutil
+import subprocess
+import sys
+from pathlib import Path
+
+import pytest
+
+ADVANCED = Path(__file__).resolve().parents[1] / "scripts" / "advanced"
+sys.path.insert(0, str(ADVANCED))
+
+import overnight_builder  # noqa: E402
+
+FAKE = ADVANCED / "fake_openclaw.py"
+
+
+@pytest.fixture
+def pool(tmp_path):
+    return overnight_builder.SessionPool(tmp_path / "sessions.json", max_context_tokens=1000)
+
+
+def test_idle_session_is_reused(pool):
+    s1 = pool.acquire("codex")
+    pool.release(s1, ok=True, tokens=100, chars=0)
+    s2 = pool.acquire("codex")
+    assert s2 is s1 and s2["turns"] == 1
+    assert pool.stats == {"warm": 1, "fresh": 1, "retired": 0}
+
+
+def test_busy_sessions_are_not_shared(pool):
+    s1 = pool.acquire("codex")
+    s2 = pool.acquire("codex")
+    s3 = pool.acquire("opus")
+    assert len({s1["id"], s2["id"], s3["id"]}) == 3
+    assert s3["id"].startswith("overnight:opus:")
+    pool.release(s2, ok=True, tokens=None, chars=400)
+    assert s2["context"] == 100  # estimated from message size without usage
+    assert pool.acquire("codex") is s2
+
+
+def test_failed_or_full_sessions_are_retired(pool):
+    s1 = pool.acquire("codex")
+    s2 = pool.acquire("codex")
+    pool.release(s1, ok=False, tokens=10, chars=0)
+    pool.release(s2, ok=True, tokens=1000, chars=0)
+    assert pool.sessions == [] and pool.stats["retired"] == 2
+    assert pool.acquire("codex")["turns"] == 0
+
+
+def test_sessions_persist_until_they_age_out(tmp_path, pool, monkeypatch):
+    s = pool.acquire("codex")
+    pool.release(s, ok=True, tokens=100, chars=0)
+    again = overnight_builder.SessionPool(tmp_path / "sessions.json")
+    assert [x["id"] for x in again.sessions] == [s["id"]]
+
+    monkeypatch.setattr(overnight_builder, "SESSION_MAX_AGE_S", 0)
+    assert overnight_builder.SessionPool(tmp_path / "sessions.json").sessions == []
+
+
+def _fake(tmp_path: Path, *args: str) -> subprocess.CompletedProcess:
+    env = {**os.environ, "FAKE_OPENCLAW_STATE": str(tmp_path / "fake"), "FAKE_OPENCLAW_CLI_MS": "0", "FAKE_OPENCLAW_BOOTSTRAP_MS": "0", "FAKE_OPENCLAW_WARM_MS": "0"}
+    return subprocess.run([sys.executable, str(FAKE), *args], env=env, capture_output=True, text=True, timeout=60)
+
+
+def test_fake_openclaw_sessions_warm_up(tmp_path):
+    assert _fake(tmp_path, "agent", "--agent", "codex", "--session-id", "s", "--message", "hi", "--json").returncode == 1
+    assert _fake(tmp_path, "agents", "add", "codex", "--model", "m").returncode == 0
+    assert _fake(tmp_path, "agents", "list").stdout.split() == ["-", "main", "-", "codex"]
+
+    turns = [json.loads(_fake(tmp_path, "agent", "--agent", "codex", "--session-id", "s", "--message", "hi", "--json").stdout) for _ in range(2)]
+    assert [t["meta"]["warm"] for t in turns] == [False, True]
+    assert turns[1]["usage"]["total_tokens"] > turns[0]["usage"]["total_tokens"] > 5000
+    reply = json.loads(turns[0]["result"]["payloads"][0]["text"])
+    assert reply["success"] is True
+    assert _fake(tmp_path, "bogus").returncode == 2
+
+
+@pytest.mark.skipif(shutil.which("git") is None, reason="git not installed")
+def test_builder_runs_the_queue_with_pooled_sessions(tmp_path):
+    env = {
+        **os.environ,
+        "HOME": str(tmp_path / "home"),
+        "OPENCLAW_WORKSPACE": str(tmp_path / "ws"),
+        "PATH": f"{tmp_path / 'bin'}{os.pathsep}{os.environ.get('PATH', '')}",
+        "FAKE_OPENCLAW_STATE": str(tmp_path / "fake"),
+        "FAKE_OPENCLAW_COMMIT": "1",
+        "FAKE_OPENCLAW_CLI_MS": "0",
+        "FAKE_OPENCLAW_BOOTSTRAP_MS": "0",
+        "FAKE_OPENCLAW_WARM_MS": "0",
+        "GIT_AUTHOR_NAME": "t",
+        "GIT_AUTHOR_EMAIL": "t@example.com",
+        "GIT_COMMITTER_NAME": "t",
+        "GIT_COMMITTER_EMAIL": "t@example.com",
+        "GIT_CONFIG_GLOBAL": os.devnull,
+        "GIT_CONFIG_NOSYSTEM": "1",
+    }
+    (tmp_path / "bin").mkdir()
+    shim = tmp_path / "bin" / "openclaw"
+    shim.write_text(f'#!/bin/sh\nexec "{sys.executable}" "{FAKE}" "$@"\n')
+    shim.chmod(0o755)
+    ws = tmp_path / "ws"
+    state = ws / "state"
+    state.mkdir(parents=True)
+    subprocess.run(["git", "init", "-q", "-b", "main"], cwd=ws, env=env, check=True)
+    (ws / ".git" / "info" / "exclude").write_text("state/\n")
+    subprocess.run(["git", "commit", "-q", "--allow-empty", "-m", "init"], cwd=ws, env=env, check=True)
+    (state / "codex_status.json").write_text(json.dumps({"available": True}))
+    items = [{"id": f"t{i}", "spec": f"do {i}", "priority": i} for i in (1, 2, 3)]
+    (state / "overnight_queue.json").write_text(json.dumps({"items": items}))
+
+    p = subprocess.run(
+        [sys.executable, str(ADVANCED / "overnight_builder.py"), "--max-concurrency", "2", "--no-fallback"],
+        cwd=str(ws), env=env, capture_output=True, text=True, timeout=180,
+    )
+    assert p.returncode == 0, p.stdout + p.stderr
+    assert "Tasks: 3 (✅ 3 / ❌ 0)" in p.stdout
+
+    log = subprocess.run(["git", "log", "--format=%s"], cwd=ws, env=env, capture_output=True, text=True).stdout.splitlines()
+    assert {"task t1", "task t2", "task t3"} <= set(log)
+    assert sorted(x.name for x in ws.glob("t*.txt")) == ["t1.txt", "t2.txt", "t3.txt"]
+    assert json.loads((state / "overnight_queue.json").read_text())["items"] == []
+
+    sessions = json.loads((state / "overnight_sessions.json").read_text())["sessions"]
+    # Two slots, three items: one session served two turns.
+    assert sorted(s["turns"] for s in sessions) == [1, 2]
@@ -0,0 +1,69 @@
+"""Smoke test: overnight_sim.py simulates whole nights on a virtual clock.
+
+Run: python3 -m pytest tests/
+"""
+
+from __future__ import annotations
+
+import json
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+SIM = Path(__file__).resolve().parents[1] / "scripts" / "advanced" / "overnight_sim.py"
+
+QUEUE = {
+    "config": {"max_parallel": 1, "max_tokens": 500_000, "timezone": "UTC", "start_hour": 22, "stop_hour": 5},
+    "tasks": [
+        {"id": "lint", "type": "local", "cmd": ["true"], "effort": 5, "priority": 1},
+        {"id": "docs", "type": "codex", "effort": 15, "priority": 2, "est_tokens": 20_000},
+        {"id": "refactor", "type": "codex", "effort": 20, "priority": 3, "est_tokens": 40_000},
+    ],
+}
+
+
+def _sim(tmp_path: Path, *args: str) -> subprocess.CompletedProcess:
+    queue = tmp_path / "queue.json"
+    queue.write_text(json.dumps(QUEUE))
+    env = {**os.environ, "HOME": str(tmp_path / "home"), "OPENCLAW_WORKSPACE": str(tmp_path / "ws")}
+    return subprocess.run(
+        [sys.executable, str(SIM), "--queue", str(queue), "--start", "2026-10-20T22:00", *args],
+        env=env,
+        cwd=str(tmp_path),
+        capture_output=True,
+        text=True,
+        timeout=120,
+    )
+
+
+def test_json_report_per_variant(tmp_path):
+    p = _sim(tmp_path, "--source", "synthetic", "--fail-rate", "0", "--spread", "0.1", "--runs", "2", "--json", "--variant", "max_parallel=1", "--variant", "max_parallel=3")
+    assert p.returncode == 0, p.stderr
+    report = json.loads(p.stdout)
+    assert report["start"] == "2026-10-20T22:00:00Z"
+    serial, parallel = report["variants"]["max_parallel=1"], report["variants"]["max_parallel=3"]
+    for m in (serial, parallel):
+        assert m["completed"] == 3 and m["failed"] == 0 and m["not_started"] == 0
+        assert m["value_fraction"] == 1.0
+        assert 0 < m["budget_used"] < 1
+    assert parallel["makespan_h"] < serial["makespan_h"]
+    # Nothing touched the real workspace.
+    assert not (tmp_path / "ws" / "state" / "overnight_progress.jsonl").exists()
+
+
+def test_table_output_and_failures(tmp_path):
+    p = _sim(tmp_path, "--source", "synthetic", "--fail-rate", "1", "--runs", "1")
+    assert p.returncode == 0, p.stderr
+    lines = p.stdout.splitlines()
+    assert lines[0] == "3 tasks, 1 runs per variant, source=synthetic"
+    assert lines[3].split()[:1] == ["baseline"]
+    assert lines[3].split()[3:5] == ["0.0", "3.0"]  # done, fail
+
+
+def test_empty_queue_is_an_error(tmp_path):
+    queue = tmp_path / "empty.json"
+    queue.write_text("{}")
+    p = subprocess.run([sys.executable, str(SIM), "--queue", str(queue)], env={**os.environ, "HOME": str(tmp_path)}, capture_output=True, text=True, timeout=60)
+    assert p.returncode == 1
+    assert "No tasks found" in p.stderr
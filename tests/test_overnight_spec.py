@@ -0,0 +1,76 @@
+"""Spec trimming, caching and per-session dedup in build_openclaw_message.
+
+Run: python3 -m pytest tests/
+"""
+
+from __future__ import annotations
+
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "scripts" / "advanced"))
+
+import overnight_queue as oq  # noqa: E402
+
+SPEC = "intro line\n\n# One\n" + "a" * 40 + "\n# Two\n" + "b" * 40 + "\n# Three\nc\n"
+
+
+def test_small_spec_is_untouched():
+    assert oq.trim_spec(SPEC, 1000) == SPEC
+    assert oq.trim_spec(SPEC, 0) == SPEC
+
+
+def test_sections_past_the_budget_become_headings():
+    out = oq.trim_spec(SPEC, 20)  # ~80 bytes
+    assert out.startswith("intro line\n\n# One\n" + "a" * 40 + "\n")
+    assert "b" * 40 not in out
+    assert "# Two\n[... section trimmed ...]" in out
+    # Order is kept: a later section that would fit is still only a heading.
+    assert "# Three\n[... section trimmed ...]" in out
+    assert "\nc\n" not in out
+
+
+def test_oversized_preamble_is_cut_hard():
+    out = oq.trim_spec("x" * 100 + "\n# A\nbody\n", 10)
+    assert out == "x" * 40 + "\n[... spec truncated; read the file for the rest ...]\n"
+
+
+@pytest.fixture
+def spec_file(tmp_path, monkeypatch):
+    monkeypatch.setattr(oq, "CLAWD", tmp_path)
+    (tmp_path / "spec.md").write_text(SPEC)
+    return tmp_path / "spec.md"
+
+
+def test_spec_cache_rereads_only_on_change(spec_file):
+    specs = oq.SpecCache()
+    assert specs.load(spec_file) == SPEC
+    assert specs.load(spec_file) == SPEC
+    assert specs.stats["spec_reads"] == 1 and specs.stats["spec_cache_hits"] == 1
+    spec_file.write_text(SPEC + "more\n")
+    assert specs.load(spec_file).endswith("more\n")
+    assert specs.stats["spec_reads"] == 2
+    assert specs.load(spec_file.with_name("missing.md")) is None
+
+
+def test_spec_is_inlined_once_per_session(spec_file):
+    sent: set = set()
+    specs = oq.SpecCache()
+    saved: list = []
+    first = oq.build_openclaw_message({"id": "a", "spec": "spec.md"}, {"spec_max_tokens": 0}, sent, specs, saved)
+    second = oq.build_openclaw_message({"id": "b", "spec": "spec.md"}, {"spec_max_tokens": 0}, sent, specs, saved)
+
+    assert "--- SPEC ---" in first and "a" * 40 in first
+    assert "--- SPEC ---" not in second
+    assert "Spec already provided earlier in this session" in second
+    assert saved == [0, len(SPEC)]
+    assert sent == {str(spec_file.resolve())}
+    specs.credit(saved)
+    assert specs.summary()["spec_tokens_saved"] == (len(SPEC) + 3) // 4
+
+
+def test_without_a_session_set_every_prompt_inlines(spec_file):
+    msg = oq.build_openclaw_message({"id": "a", "spec": "spec.md"}, {"spec_max_tokens": 20})
+    assert "# Two\n[... section trimmed ...]" in msg